@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from benchmarks.synthetic_web import SiteConfig, render_page
+
+
+@pytest.fixture(scope='session')
+def urls():
+    """
+    Links like the ones found while crawling, over 100 domains.
+    """
+    return [f'https://www.example{i % 100}.com/category/{i % 7}/page-{i}?ref=home'
+            for i in range(1000)]
+
+
+@pytest.fixture(scope='session')
+def small_page():
+    return render_page(SiteConfig(fanout=20, page_size=8 * 1024), 0, 1)
+
+
+@pytest.fixture(scope='session')
+def large_page():
+    """
+    A listing page, many links and a big body.
+    """
+    return render_page(SiteConfig(fanout=300, cross_domain_ratio=.5, page_size=256 * 1024), 0, 1)
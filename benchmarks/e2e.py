@@ -0,0 +1,277 @@
+"""
+End to end benchmark, crawls a local synthetic web (see `benchmarks.synthetic_web`) with `Crawler`
+and `AsyncCrawler` and reports pages/sec, p50/p99 latency, CPU time and peak RSS.
+
+Every crawler runs in a fresh process (so peak RSS is its own) and the web is served from
+another one. Results are appended to benchmarks/results/e2e.jsonl with the current commit, runs
+with the same configuration can be compared between commits with `--compare`.
+
+Usage:
+    python -m benchmarks.e2e
+    python -m benchmarks.e2e --crawlers sync --domains 8 --max-pages 2000 --latency .01
+    python -m benchmarks.e2e --compare  # Compares with the last run of a different commit.
+    python -m benchmarks.e2e --compare --max-regression 10  # Exits with 1 if >10% worse.
+"""
+import argparse
+import dataclasses
+import json
+import multiprocessing
+import pathlib
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+from benchmarks.synthetic_web import SiteConfig, serve
+
+RESULTS_PATH = pathlib.Path(__file__).parent / 'results' / 'e2e.jsonl'
+
+# Metric: True if higher is better.
+COMPARED_METRICS = {
+    'pages_per_second': True,
+    'latency_p50': False,
+    'latency_p99': False,
+    'cpu_seconds': False,
+    'peak_rss_mb': False,
+}
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
+
+
+def peak_rss_mb() -> float:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _make_crawlers(max_pages: int):
+    from scrupy.crawler import AsyncCrawler, Crawler
+
+    class LinkFollower:
+        """
+        Follows every absolute link until `max_pages` urls were queued.
+        """
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self.seen = set(self.start_urls)
+            self.latencies = []
+            self.statuses = {}
+
+        def new_links(self, response) -> list[str]:
+            if response.timings and response.timings.total is not None:
+                self.latencies.append(response.timings.total)
+            status = str(response.status_code)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+            if not response.ok or not response.is_html:
+                return []
+
+            links = []
+            for link in response.html.absolute_links:
+                if len(self.seen) >= max_pages:
+                    break
+                if link not in self.seen:
+                    self.seen.add(link)
+                    links.append(link)
+            return links
+
+    class SyncBenchCrawler(LinkFollower, Crawler):
+        def on_crawled(self, response):
+            if links := self.new_links(response):
+                self.add_to_queue(links)
+
+    class AsyncBenchCrawler(LinkFollower, AsyncCrawler):
+        async def on_crawled(self, response):
+            if links := self.new_links(response):
+                await self.add_to_queue(links)
+
+    return {'sync': SyncBenchCrawler, 'async': AsyncBenchCrawler}
+
+
+def _run_crawler(name: str, start_urls: list[str], max_pages: int, retention: str, result):
+    from scrupy.crawler.history import CrawlHistory
+
+    crawler_cls = _make_crawlers(max_pages)[name]
+    crawler = crawler_cls(start_urls=start_urls, delay_per_request=0,
+                          history=CrawlHistory(retention=retention))
+
+    cpu_started = cpu_seconds()
+    started = time.perf_counter()
+    crawler.run()
+    elapsed = time.perf_counter() - started
+
+    pages = len(crawler.latencies)
+    result.send({
+        'pages': pages,
+        'elapsed': elapsed,
+        'pages_per_second': pages / elapsed if elapsed else None,
+        'latency_p50': percentile(crawler.latencies, .5),
+        'latency_p99': percentile(crawler.latencies, .99),
+        'latency_mean': statistics.fmean(crawler.latencies) if crawler.latencies else None,
+        'cpu_seconds': cpu_seconds() - cpu_started,
+        'peak_rss_mb': peak_rss_mb(),
+        'statuses': crawler.statuses,
+    })
+
+
+def run_crawler(name: str, start_urls: list[str], max_pages: int,
+                retention: str = 'full') -> dict:
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_crawler,
+                              args=(name, start_urls, max_pages, retention, sender))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=pathlib.Path(__file__).parent
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_results(path: pathlib.Path = RESULTS_PATH) -> list[dict]:
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_result(result: dict, path: pathlib.Path = RESULTS_PATH) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+def find_baseline(result: dict, previous: list[dict]) -> Optional[dict]:
+    """
+    The last result of the same crawler and configuration from a different commit.
+    """
+    for candidate in reversed(previous):
+        if (
+                candidate['crawler'] == result['crawler']
+                and candidate['config'] == result['config']
+                and candidate['commit'] != result['commit']
+        ):
+            return candidate
+    return None
+
+
+def compare(result: dict, baseline: dict) -> dict[str, float]:
+    """
+    Change of every compared metric in %, positive is better.
+    """
+    changes = {}
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        new, old = result['metrics'].get(metric), baseline['metrics'].get(metric)
+        if not new or not old:
+            continue
+        change = (new - old) / old * 100
+        changes[metric] = change if higher_is_better else -change
+    return changes
+
+
+def format_result(result: dict) -> str:
+    m = result['metrics']
+
+    def ms(value):
+        return f'{value * 1000:.1f}ms' if value is not None else '-'
+
+    return (f'{result["crawler"]:>5}: {m["pages"]} pages in {m["elapsed"]:.2f}s, '
+            f'{m["pages_per_second"]:.1f} pages/s, p50={ms(m["latency_p50"])} '
+            f'p99={ms(m["latency_p99"])}, cpu={m["cpu_seconds"]:.2f}s, '
+            f'peak rss={m["peak_rss_mb"]:.1f}MB, statuses={m["statuses"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--crawlers', nargs='+', choices=('sync', 'async'),
+                        default=['sync', 'async'])
+    parser.add_argument('--max-pages', type=int, default=500)
+    parser.add_argument('--retention', default='full', choices=('full', 'metadata', 'ring'))
+    for field in dataclasses.fields(SiteConfig):
+        parser.add_argument(f'--{field.name.replace("_", "-")}', type=type(field.default),
+                            default=field.default)
+    parser.add_argument('--results', type=pathlib.Path, default=RESULTS_PATH)
+    parser.add_argument('--no-save', action='store_true')
+    parser.add_argument('--compare', action='store_true',
+                        help='Compare with the last run of the same configuration.')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='Fail if any compared metric is this % worse than the baseline.')
+    args = parser.parse_args()
+
+    site_config = SiteConfig(**{field.name: getattr(args, field.name)
+                                for field in dataclasses.fields(SiteConfig)})
+    config = {'max_pages': args.max_pages, 'retention': args.retention,
+              'site': dataclasses.asdict(site_config)}
+
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    server = context.Process(target=serve, args=(site_config, sender), daemon=True)
+    server.start()
+    start_urls = receiver.recv()
+
+    previous = load_results(args.results)
+    commit = git_commit()
+    regressions = []
+
+    try:
+        for name in args.crawlers:
+            result = {
+                'crawler': name,
+                'commit': commit,
+                'timestamp': time.time(),
+                'python': platform.python_version(),
+                'config': config,
+                'metrics': run_crawler(name, start_urls, args.max_pages, args.retention),
+            }
+            print(format_result(result))
+
+            if not args.no_save:
+                save_result(result, args.results)
+
+            if args.compare:
+                baseline = find_baseline(result, previous)
+                if baseline is None:
+                    print('       no previous run with this configuration to compare with')
+                    continue
+
+                changes = compare(result, baseline)
+                print(f'       vs {baseline["commit"]}: ' + ', '.join(
+                    f'{metric} {change:+.1f}%' for metric, change in changes.items()))
+
+                if args.max_regression is not None:
+                    regressions.extend(f'{name} {metric} {change:+.1f}%'
+                                       for metric, change in changes.items()
+                                       if change < -args.max_regression)
+    finally:
+        server.terminate()
+        server.join()
+
+    if regressions:
+        print('Regressions: ' + ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
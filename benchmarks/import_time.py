@@ -0,0 +1,65 @@
+"""
+Measures how long `import scrupy` (or any other import statement) takes in a fresh interpreter.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --statement "from scrupy.crawler import Crawler" --runs 20
+    python -m benchmarks.import_time --max-ms 60  # Exits with 1 if the median goes over budget.
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+def measure_import(statement: str) -> tuple[float, list[tuple[str, int]]]:
+    """
+    Returns the wall time of `statement` in milliseconds and the (module, cumulative us) pairs
+    reported by `-X importtime`, slowest first.
+    """
+    code = f'import time; _t = time.perf_counter(); {statement}; print(time.perf_counter() - _t)'
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True
+    )
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        modules.append((name.strip(), int(cumulative)))
+
+    return float(proc.stdout) * 1000, sorted(modules, key=lambda m: m[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--statement', default='import scrupy')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10, help='Show the N slowest modules.')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='Fail if the median import time is higher than this.')
+    args = parser.parse_args()
+
+    timings = []
+    modules = []
+    for _ in range(args.runs):
+        total_ms, modules = measure_import(args.statement)
+        timings.append(total_ms)
+
+    median = statistics.median(timings)
+    print(f'{args.statement!r}: median={median:.1f}ms min={min(timings):.1f}ms '
+          f'max={max(timings):.1f}ms ({args.runs} runs)')
+
+    for name, us in modules[:args.top]:
+        print(f'  {us / 1000:8.1f}ms  {name}')
+
+    if args.max_ms is not None and median > args.max_ms:
+        print(f'Import time regression: {median:.1f}ms > {args.max_ms}ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Memory used per object by the objects built once per discovered link.
+
+Usage:
+    python -m benchmarks.memory
+"""
+import gc
+import tracemalloc
+from typing import Callable
+
+
+def bytes_per_object(factory: Callable[[int], object], n: int = 10_000) -> float:
+    """
+    Average bytes allocated (and still alive) per object built by `factory(i)`, including
+    everything the object references that was allocated while building it, ie: a CrawlRequest
+    and its Url, headers dict...
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        objects = [factory(i) for i in range(n)]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    # The list holding them is not part of the objects.
+    list_size = objects.__sizeof__()
+    del objects
+    return (after - before - list_size) / n
+
+
+def request_factories() -> dict[str, Callable[[int], object]]:
+    from scrupy import CrawlRequest
+    from scrupy.crawler.crawler import Crawler
+    from scrupy.utils import Url
+
+    crawler = Crawler(delay_per_request=0)
+
+    return {
+        'Url': lambda i: Url(f'https://www.example{i % 100}.com/page/{i}'),
+        'CrawlRequest': lambda i: CrawlRequest(f'https://www.example{i % 100}.com/page/{i}'),
+        'Crawler._build_request': lambda i: crawler._build_request(
+            f'https://www.example{i % 100}.com/page/{i}'),
+    }
+
+
+def main():
+    for name, factory in request_factories().items():
+        print(f'{name:>24}: {bytes_per_object(factory):8.1f} bytes per object')
+
+
+if __name__ == '__main__':
+    main()
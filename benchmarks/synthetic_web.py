@@ -0,0 +1,184 @@
+"""
+A deterministic, local, synthetic web to benchmark crawlers against.
+
+Every domain is served by its own server on its own loopback address (127.0.0.2, 127.0.0.3...)
+so crawlers see them as different domains, pages link to `fanout` other pages, some of them
+in other domains.
+
+Usage:
+    python -m benchmarks.synthetic_web --domains 4 --pages-per-domain 1000
+"""
+import argparse
+import dataclasses
+import hashlib
+import http.server
+import random
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+
+@dataclasses.dataclass
+class SiteConfig:
+    domains: int = 4
+    pages_per_domain: int = 250
+    fanout: int = 10
+    cross_domain_ratio: float = .2
+    page_size: int = 16 * 1024
+    latency: float = 0.0
+    latency_jitter: float = 0.0
+    error_rate: float = 0.0
+    seed: int = 0
+
+    def page_seed(self, domain: int, page: int) -> int:
+        digest = hashlib.blake2b(f'{self.seed}:{domain}:{page}'.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def is_error(self, domain: int, page: int) -> bool:
+        # Page 0 is the entrypoint, it never fails.
+        return page and random.Random(self.page_seed(domain, page)).random() < self.error_rate
+
+    def links(self, domain: int, page: int) -> list[tuple[int, int]]:
+        rng = random.Random(self.page_seed(domain, page) ^ 0x5EED)
+        links = []
+        for _ in range(self.fanout):
+            target = domain
+            if self.domains > 1 and rng.random() < self.cross_domain_ratio:
+                target = rng.randrange(self.domains)
+            links.append((target, rng.randrange(self.pages_per_domain)))
+        return links
+
+
+def fake_url(domain: int, page: int) -> str:
+    return f'http://domain{domain}.test/p/{page}'
+
+
+def render_page(config: SiteConfig, domain: int, page: int,
+                url: Callable[[int, int], str] = fake_url) -> str:
+    """
+    The html of a page, its links and padding up to `config.page_size`.
+    """
+    links = ''.join(f'<li><a href="{url(d, p)}">page {d}-{p}</a></li>'
+                    for d, p in config.links(domain, page))
+    body = f'<html><head><title>{domain}-{page}</title></head><body><ul>{links}</ul>'
+    padding = max(0, config.page_size - len(body) - len('<p></p></body></html>'))
+    return body + f'<p>{"lorem ipsum " * (padding // 12)}</p></body></html>'
+
+
+class SyntheticWeb:
+    """
+    Serves `config` from background threads, one server per domain.
+    """
+
+    def __init__(self, config: SiteConfig, port: int = 0):
+        self.config = config
+        self.servers: list[http.server.ThreadingHTTPServer] = []
+        self._threads: list[threading.Thread] = []
+        self._port = port
+
+    def _bind(self, domain: int) -> http.server.ThreadingHTTPServer:
+        handler = self._handler(domain)
+        host = f'127.0.0.{domain + 2}'
+        try:
+            server = http.server.ThreadingHTTPServer((host, self._port), handler)
+        except OSError:
+            # Only 127.0.0.1 is routed (ie: macOS), domains are told apart by port only.
+            server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        return server
+
+    def url(self, domain: int, page: int = 0) -> str:
+        host, port = self.servers[domain].server_address[:2]
+        return f'http://{host}:{port}/p/{page}'
+
+    def _handler(self, domain: int):
+        web = self
+        config = self.config
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                try:
+                    page = int(self.path.removeprefix('/p/'))
+                except ValueError:
+                    page = -1
+
+                if config.latency or config.latency_jitter:
+                    time.sleep(config.latency + random.random() * config.latency_jitter)
+
+                if not 0 <= page < config.pages_per_domain:
+                    return self._send(404, b'not found')
+
+                if config.is_error(domain, page):
+                    return self._send(500, b'synthetic error')
+
+                body = render_page(config, domain, page, web.url)
+                self._send(200, body.encode(), 'text/html; charset=utf-8')
+
+            def _send(self, status: int, body: bytes, content_type: str = 'text/plain'):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    @property
+    def start_urls(self) -> list[str]:
+        return [self.url(domain) for domain in range(self.config.domains)]
+
+    def start(self) -> 'SyntheticWeb':
+        self.servers = [self._bind(domain) for domain in range(self.config.domains)]
+        for server in self.servers:
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def serve(config: SiteConfig, ready: Optional['multiprocessing.connection.Connection'] = None):
+    """
+    Serves the web until the process is killed, sends the start urls through `ready`.
+    """
+    web = SyntheticWeb(config).start()
+    if ready is not None:
+        ready.send(web.start_urls)
+    threading.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    for field in dataclasses.fields(SiteConfig):
+        parser.add_argument(f'--{field.name.replace("_", "-")}', type=type(field.default),
+                            default=field.default)
+    config = SiteConfig(**vars(parser.parse_args()))
+
+    with SyntheticWeb(config) as web:
+        print('Serving, start urls:', *web.start_urls, sep='\n  ')
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    socket.setdefaulttimeout(30)
+    main()
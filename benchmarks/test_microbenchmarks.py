@@ -0,0 +1,144 @@
+"""
+Microbenchmarks of the code run once per discovered link, run them with:
+
+    python -m pytest benchmarks
+    python -m pytest benchmarks --benchmark-save=baseline
+    python -m pytest benchmarks --benchmark-compare=0001 --benchmark-compare-fail=mean:10%
+
+Memory per object is stored in the `extra_info` of every benchmark and checked against
+`MEMORY_BUDGETS`, lower a budget after making an object smaller so it stays that way. Budgets
+are relative to the same urls parsed by `urllib.parse.urlsplit`, measured in the same run, so
+they hold across Python versions and platforms.
+"""
+import functools
+import itertools
+import urllib.parse
+
+import anyio
+import pytest
+
+from benchmarks.memory import bytes_per_object
+from scrupy import CrawlRequest
+from scrupy.crawler.crawler import Crawler
+from scrupy.crawler.frontier import AsyncFrontier, SyncFrontier
+from scrupy.crawler.rules import UrlRules
+from scrupy.request import HtmlParser
+from scrupy.utils import Url
+
+# Bytes per object, as a multiple of the bytes of an `urlsplit` result of the same url.
+MEMORY_BUDGETS = {
+    'Url': 1.4,
+    'CrawlRequest': 2.5,
+    'Crawler._build_request': 2.9,
+    'SyncFrontier entry': 3.2,  # The request plus its url fingerprint, counted while queued.
+    'AsyncFrontier entry': 3.2,
+}
+
+
+@functools.cache
+def reference_size(urls: tuple[str, ...]) -> float:
+    return bytes_per_object(lambda i: urllib.parse.urlsplit(urls[i % len(urls)]))
+
+
+def check_memory(benchmark, name: str, urls: list[str], factory) -> None:
+    size = bytes_per_object(factory)
+    ratio = size / reference_size(tuple(urls))
+    benchmark.extra_info['bytes_per_object'] = size
+    benchmark.extra_info['urlsplit_ratio'] = ratio
+    assert ratio <= MEMORY_BUDGETS[name], \
+        f'{name} uses {size:.0f} bytes per object, {ratio:.2f} times an urlsplit result'
+
+
+@pytest.fixture
+def crawler():
+    return Crawler(delay_per_request=0)
+
+
+def test_url(benchmark, urls):
+    url_iter = itertools.cycle(urls)
+    benchmark(lambda: Url(next(url_iter)))
+    check_memory(benchmark, 'Url', urls, lambda i: Url(urls[i % len(urls)]))
+
+
+def test_url_domain(benchmark, urls):
+    parsed = [Url(url) for url in urls]
+    parsed[0].domain  # Loads tldextract's suffix list.
+    url_iter = itertools.cycle(parsed)
+    benchmark(lambda: next(url_iter).domain)
+
+
+def test_crawl_request(benchmark, urls):
+    url_iter = itertools.cycle(urls)
+    benchmark(lambda: CrawlRequest(next(url_iter)))
+    check_memory(benchmark, 'CrawlRequest', urls, lambda i: CrawlRequest(urls[i % len(urls)]))
+
+
+def test_inject_http_attrs_from(benchmark, crawler, urls):
+    requests = [CrawlRequest(url) for url in urls]
+    request_iter = itertools.cycle(requests)
+    benchmark(lambda: next(request_iter).inject_http_attrs_from(crawler))
+
+
+def test_build_request(benchmark, crawler, urls):
+    url_iter = itertools.cycle(urls)
+    benchmark(lambda: crawler._build_request(next(url_iter)))
+    check_memory(benchmark, 'Crawler._build_request', urls,
+                 lambda i: crawler._build_request(urls[i % len(urls)]))
+
+
+def test_url_rules_filter(benchmark, urls):
+    rules = UrlRules(allow_domains=[f'example{i}.com' for i in range(0, 100, 2)],
+                     deny_paths=['/category/3/'], deny_patterns=[r'page-\d*7\?'])
+    benchmark(rules.filter, urls)
+
+
+def test_sync_frontier_add_to_queue(benchmark, crawler, urls):
+    requests = [crawler._build_request(url) for url in urls]
+
+    def setup():
+        return (SyncFrontier(),), {}
+
+    benchmark.pedantic(lambda frontier: frontier.add_to_queue(requests), setup=setup,
+                       rounds=200)
+    benchmark.extra_info['requests_per_round'] = len(requests)
+
+    frontier = SyncFrontier()
+    check_memory(benchmark, 'SyncFrontier entry', urls,
+                 lambda i: frontier.add_to_queue([crawler._build_request(urls[i % len(urls)])]))
+
+
+def test_async_frontier_add_to_queue(benchmark, crawler, urls):
+    requests = [crawler._build_request(url) for url in urls]
+
+    def setup():
+        return (AsyncFrontier(),), {}
+
+    benchmark.pedantic(lambda frontier: anyio.run(frontier.add_to_queue, requests), setup=setup,
+                       rounds=50)
+    benchmark.extra_info['requests_per_round'] = len(requests)
+
+    def add(frontier, request):
+        # Like `add_to_queue` without the event loop, which would be measured too.
+        if frontier._add_to_queue(request):
+            frontier.send_channel.send_nowait(request)
+
+    frontier = AsyncFrontier()
+    check_memory(benchmark, 'AsyncFrontier entry', urls,
+                 lambda i: add(frontier, crawler._build_request(urls[i % len(urls)])))
+
+
+@pytest.mark.parametrize('page', ['small_page', 'large_page'])
+def test_html_links(benchmark, page, request):
+    html = request.getfixturevalue(page)
+    # A new parser every time, as every response gets its own.
+    links = benchmark(lambda: HtmlParser(html, html).links)
+    assert links
+
+
+@pytest.mark.parametrize('page', ['small_page', 'large_page'])
+@pytest.mark.parametrize('selector', ['a', 'li a', 'title'])
+def test_html_find(benchmark, page, selector, request):
+    html = request.getfixturevalue(page)
+    found = benchmark(lambda: HtmlParser(html, html).find(selector))
+    assert found
+
@@ -1,29 +1,27 @@
-from scrupy import HttpxCrawler
+from scrupy.crawler.crawler import Crawler as BaseCrawler
+from scrupy.crawler.pipeline import ItemPipeline, JsonLinesSink
 from scrupy.request import CrawlResponse
 
 
-class Crawler(HttpxCrawler):
-    def on_crawled(self, response: CrawlResponse) -> None:
+class Crawler(BaseCrawler):
+    def on_crawled(self, response: CrawlResponse):
         # Set up the next iteration
-        links = response.html.links
-        if links:
-            self.add_many_to_queue(links, ignore_repeated=True)
+        if response.html:
+            self.add_to_queue(response.html.absolute_links, ignore_repeated=True,
+                              parent=response.request)
 
-        # Save the html
-        filename = response.request.url.replace('/', '_')
-
-        with open(f'crawled/{filename}.html', 'w') as f:
-            f.write(response.html.text)
+            # Saved by the pipeline, in the background
+            yield {'url': str(response.request.url), 'html': response.html.text}
 
 
 crawler = Crawler(
-    delay_per_request_ms=1000,
-    urls=['https://wiki.python.org/moin/', ],
-
+    delay_per_request=1000,
+    start_urls=['https://wiki.python.org/moin/', ],
+    pipeline=ItemPipeline([JsonLinesSink('crawled.jsonl.gz', compression='gzip')]),
 )
 
 try:
     crawler.run()
 except KeyboardInterrupt as e:
     print(crawler.history)
-    raise e
\ No newline at end of file
+    raise e
@@ -0,0 +1,144 @@
+import hashlib
+import re
+import urllib.parse
+from typing import Iterable
+
+FINGERPRINT_SIZE = 16
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track where the visit comes from, the page is the same without them.
+DEFAULT_TRACKING_PARAMS = frozenset({
+    'gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'yclid', 'igshid', 'twclid', 'mc_cid',
+    'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok', 'oly_anon_id', 'oly_enc_id', 'vero_id',
+})
+DEFAULT_TRACKING_PREFIXES = ('utm_',)
+
+_UNRESERVED = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~')
+_PERCENT_ENCODED = re.compile(r'%([0-9a-fA-F]{2})')
+
+# Characters left as they are when quoting, everything else (spaces, non ascii...) is encoded.
+_PATH_SAFE = "/:@!$&'()*+,;=%-._~"
+_QUERY_SAFE = "/?:@!$'()*+,;=%-._~"
+
+
+def _normalize_escape(match: re.Match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else f'%{match.group(1).upper()}'
+
+
+def normalize_percent_encoding(value: str, safe: str) -> str:
+    """
+    Decodes escaped unreserved characters, uppercases the rest of the escapes and encodes what
+    should have been, ie: '/%7euser/a%2fb c' -> '/~user/a%2Fb%20c'.
+    """
+    return urllib.parse.quote(_PERCENT_ENCODED.sub(_normalize_escape, value), safe=safe)
+
+
+def remove_dot_segments(path: str) -> str:
+    """
+    Resolves '.' and '..' segments of `path` (RFC 3986 5.2.4), ie: '/a/./b/../c' -> '/a/c'.
+    """
+    if '.' not in path:
+        return path
+
+    segments = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+
+    if path.endswith(('/.', '/..')):
+        segments.append('')
+    return '/'.join(segments) or '/'
+
+
+class UrlCanonicalizer:
+    """
+    Rewrites urls that point to the same page to the same url, ie:
+    'HTTP://Example.com:80/a/../x?b=1&utm_source=x&a=2#top' -> 'http://example.com/x?a=2&b=1'.
+
+    Scheme and host are lowercased, default ports, fragments and tracking params (`remove_params`
+    and the params that start with `remove_param_prefixes`) dropped, query params sorted, dot
+    segments resolved and percent-encoding normalized.
+
+    `fingerprint` is a fixed-size digest of the canonical url, urls are compared and looked up by
+    it in the history and the frontier, see `scrupy.utils.Url.canonicalizer`.
+    """
+
+    def __init__(self,
+                 remove_params: Iterable[str] = DEFAULT_TRACKING_PARAMS,
+                 remove_param_prefixes: Iterable[str] = DEFAULT_TRACKING_PREFIXES,
+                 sort_query: bool = True,
+                 strip_fragment: bool = True,
+                 strip_default_port: bool = True,
+                 lowercase_path: bool = False):
+        self.remove_params = frozenset(param.lower() for param in remove_params)
+        self.remove_param_prefixes = tuple(prefix.lower() for prefix in remove_param_prefixes)
+        self.sort_query = sort_query
+        self.strip_fragment = strip_fragment
+        self.strip_default_port = strip_default_port
+        self.lowercase_path = lowercase_path
+
+    def _keep_param(self, param: str) -> bool:
+        name = urllib.parse.unquote_plus(param.partition('=')[0]).lower()
+        return name not in self.remove_params and not name.startswith(self.remove_param_prefixes)
+
+    def _netloc(self, parsed: urllib.parse.SplitResult) -> str:
+        host = (parsed.hostname or '').rstrip('.')
+        try:
+            host = host.encode('idna').decode('ascii')
+        except UnicodeError:
+            pass
+
+        if ':' in host:  # IPv6
+            host = f'[{host}]'
+
+        try:
+            port = parsed.port
+        except ValueError:  # Not a number, left as it is.
+            port = None
+        if port is not None and not (
+                self.strip_default_port and DEFAULT_PORTS.get(parsed.scheme.lower()) == port):
+            host = f'{host}:{port}'
+
+        userinfo, at, _ = parsed.netloc.rpartition('@')
+        return f'{userinfo}{at}{host}'
+
+    def host(self, parsed: urllib.parse.SplitResult) -> str:
+        """
+        The host of the canonical form of the parsed url, with its port if it is not the default
+        one, ie: 'example.com' for 'https://Example.com:443/a'.
+        """
+        return self._netloc(parsed).rpartition('@')[2]
+
+    def canonicalize(self, url: str) -> str:
+        parsed = urllib.parse.urlsplit(url.strip())
+
+        path = remove_dot_segments(normalize_percent_encoding(parsed.path, _PATH_SAFE)) or '/'
+        if self.lowercase_path:
+            path = path.lower()
+
+        params = [normalize_percent_encoding(param, _QUERY_SAFE)
+                  for param in parsed.query.split('&') if param]
+        params = [param for param in params if self._keep_param(param)]
+        if self.sort_query:
+            params.sort()
+
+        fragment = '' if self.strip_fragment else parsed.fragment
+
+        return urllib.parse.urlunsplit(
+            (parsed.scheme.lower(), self._netloc(parsed), path, '&'.join(params), fragment)
+        )
+
+    def fingerprint(self, url: str) -> bytes:
+        """
+        `FINGERPRINT_SIZE` bytes digest of the canonical `url`.
+        """
+        return hashlib.blake2b(self.canonicalize(url).encode(),
+                               digest_size=FINGERPRINT_SIZE).digest()
+
+
+DEFAULT_CANONICALIZER = UrlCanonicalizer()
@@ -1,4 +1,12 @@
-import collections
-
 from ..request import CrawlRequest, CrawlResponse
-from .crawler import AsyncCrawler, Crawler
+
+# The crawlers pull in their http/async backends, they are imported on first access so that
+# `import scrupy` does not pay for them.
+_lazy_crawlers = ('AsyncCrawler', 'Crawler')
+
+
+def __getattr__(name):
+    if name in _lazy_crawlers:
+        from . import crawler
+        return getattr(crawler, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1,27 +1,51 @@
 import abc
 import functools
+import inspect
 import logging
+import time
+from collections.abc import AsyncIterable, Collection, Iterable, Iterator
 from typing import Optional
 
-from fake_useragent import UserAgent
-
 from scrupy import CrawlRequest
-from scrupy.crawler.history import CrawlHistory
+from scrupy.crawler.history import CrawlHistory, get_response_body
 from scrupy.mixins import HTTPSettingAwareMixin
 from scrupy.request import CrawlResponse
 from scrupy.typing import MILLISECONDS, SECONDS
+from scrupy.utils import LazyModule
 
-ua = UserAgent()
+fake_useragent = LazyModule('fake_useragent')
 
 logger = logging.getLogger(__name__)
 
 
+@functools.cache
+def get_user_agent_generator():
+    """
+    Returns the shared `fake_useragent.UserAgent`, it is only built (and `fake_useragent` imported)
+    the first time a user-agent is randomized.
+    """
+    return fake_useragent.UserAgent()
+
+
+def is_lazy_source(urls) -> bool:
+    """
+    Whether `urls` is an iterator, async iterable or any iterable that is not a collection, ie:
+    a generator or a `scrupy.crawler.sitemaps.SitemapSource`, that should be consumed lazily.
+    """
+    return isinstance(urls, (Iterator, AsyncIterable)) or not isinstance(urls, Collection)
+
+
 class CrawlerBase(HTTPSettingAwareMixin, abc.ABC):
     method: str = 'GET'
 
+    # Lazy `start_urls` are added to the frontier in batches of this size, when it has less
+    # requests than this.
+    seed_batch_size: int = 1000
+
     def __init__(self,
                  *,
-                 start_urls: Optional[list[str]] = None,
+                 start_urls: Optional[Iterable[str | CrawlRequest]
+                                     | AsyncIterable[str | CrawlRequest]] = None,
                  delay_per_request: MILLISECONDS = 1000,
                  follow_redirects: Optional[bool] = False,
                  min_delay_per_tick: MILLISECONDS = 0,
@@ -29,7 +53,20 @@ class CrawlerBase(HTTPSettingAwareMixin, abc.ABC):
                  user_agent: str = 'scrupy',
                  randomize_user_agent_per_request: bool = False,
                  headers: Optional[dict] = None,
-                 timeout: Optional[SECONDS] = 5
+                 timeout: Optional[SECONDS] = 5,
+                 history: Optional[CrawlHistory] = None,
+                 crawl_client: Optional['CrawlerClientBase'] = None,
+                 crawl_clients: Optional[dict[str, 'CrawlerClientBase']] = None,
+                 recorder=None,
+                 metrics: Optional['CrawlMetrics'] = None,
+                 profiler: Optional['HookProfiler'] = None,
+                 robots: 'bool | RobotsCacheBase' = False,
+                 dedup: Optional['NearDuplicateDetector'] = None,
+                 rules: Optional['UrlRules'] = None,
+                 budget: Optional['CrawlBudget'] = None,
+                 recrawl: Optional['RecrawlScheduler'] = None,
+                 graph: Optional['LinkGraph'] = None,
+                 pipeline: Optional['ItemPipeline'] = None,
                  ):
         self.start_urls = start_urls
         self.user_agent = user_agent
@@ -45,22 +82,75 @@ class CrawlerBase(HTTPSettingAwareMixin, abc.ABC):
         self.min_delay_per_tick_s = min_delay_per_tick // 1000
 
         self._force_stop = False
+        self._drain = False
         self.client = client
+        self._history = history
+
+        # The CrawlerClientBase that runs the requests, each crawler has its default one.
+        self.crawl_client = crawl_client
+
+        # Clients for other `CrawlRequest.type`s, ie: {'browser': AsyncBrowserClient()}.
+        self.crawl_clients = crawl_clients or {}
+
+        # Gets every response right after it is built, ie: a `scrupy.crawler.warc.WarcWriter`.
+        self.recorder = recorder
+
+        # A `scrupy.crawler.metrics.CrawlMetrics` to keep metrics of the crawl in.
+        self.metrics = metrics
+
+        # A `scrupy.crawler.profiling.HookProfiler` to time the hooks with.
+        self.profiler = profiler
+
+        # Urls disallowed by robots.txt are dropped when added to the queue, True to use the
+        # default cache of the crawler, or a `scrupy.crawler.robots` cache.
+        self.robots = None if robots is False else robots
+
+        # A `scrupy.crawler.dedup.NearDuplicateDetector` that flags near-duplicate pages.
+        self.dedup = dedup
+
+        # A `scrupy.crawler.rules.UrlRules`, urls it rejects are dropped in `add_to_queue`.
+        self.rules = rules
+
+        # A `scrupy.crawler.frontier.CrawlBudget` of pages and bytes per domain.
+        self.budget = budget
+
+        # A `scrupy.crawler.recrawl.RecrawlScheduler`, it gets every response and its due urls
+        # are crawled.
+        self.recrawl = recrawl
+
+        # A `scrupy.crawler.graph.LinkGraph` the links of every page are added to, its scores are
+        # the priorities of the requests if it `prioritize`s.
+        self.graph = graph
+
+        # A `scrupy.crawler.pipeline.ItemPipeline` that gets the items `on_crawled` yields, it is
+        # closed after `on_finish`.
+        self.pipeline = pipeline
 
     @abc.abstractmethod
-    def add_to_queue(self, urls: list[str] | str) -> None:
+    def add_to_queue(self, urls: list[str] | str, ignore_repeated: bool = False,
+                     depth: Optional[int] = None, parent: Optional[CrawlRequest] = None) -> None:
         ...
 
+    @staticmethod
+    def _link_depth(depth: Optional[int], parent: Optional[CrawlRequest]) -> int:
+        if depth is not None:
+            return depth
+        return (parent.depth or 0) + 1 if parent is not None else 0
+
     @abc.abstractmethod
     def get_next(self):
         ...
 
     @functools.cached_property
     def history(self) -> CrawlHistory:
-        return CrawlHistory()
+        """
+        The history of the crawl, pass `history` to use a different retention, ie:
+        `Crawler(history=CrawlHistory(retention='metadata'))`.
+        """
+        return self._history if self._history is not None else CrawlHistory()
 
     def generate_user_agent(self, request) -> str:
-        return ua.chrome
+        return get_user_agent_generator().chrome
 
     @abc.abstractmethod
     def on_crawled(self, response: CrawlResponse) -> None:
@@ -80,29 +170,164 @@ class CrawlerBase(HTTPSettingAwareMixin, abc.ABC):
     def on_check_if_allowed(self, request):
         return True
 
-    def _build_request(self, url: str) -> CrawlRequest:
-        if not isinstance(url, str):
-            raise TypeError(f'Expected `str` got {type(url)}')
-
-        request = CrawlRequest(url)
+    def _build_request(self, url: str | CrawlRequest, depth: int = 0,
+                       parent: Optional[str] = None) -> CrawlRequest:
+        match url:
+            case CrawlRequest():
+                request = url
+                if request.depth is None:
+                    request.depth = depth
+                    if request.parent is None:
+                        request.parent = parent
+            case str():
+                request = CrawlRequest(url, depth=depth, parent=parent)
+            case _:
+                raise TypeError(f'Expected `str` or `CrawlRequest` got {type(url)}')
 
         # We put user_agent generation here since it might make sense to have
         # the request context when generating a request
-        self.user_agent = self.generate_user_agent(
-            request) if self.randomize_user_agent_per_request else self.user_agent
+        if self.randomize_user_agent_per_request:
+            hook_started = time.perf_counter()
+            self.user_agent = self.generate_user_agent(request)
+            self._observe_hook('generate_user_agent', time.perf_counter() - hook_started, request)
 
         if self.client:
             request.inject_http_attrs_from(self.client, user_agent=self.user_agent)
         else:
             request.inject_http_attrs_from(self)
 
+        if self.prioritized:
+            request.priority = self._priority(request)
+
         return request
 
+    @property
+    def prioritized(self) -> bool:
+        return self.graph is not None and self.graph.prioritize
+
+    def _priority(self, request: CrawlRequest) -> float:
+        return self.graph.score(request.url)
+
+    def _drop_repeated(self, requests: list[CrawlRequest]) -> list[CrawlRequest]:
+        """
+        Drops the requests whose canonical url is already queued or crawled, and the repeated
+        ones within `requests`.
+        """
+        fresh = {}
+        for request in requests:
+            fingerprint = request.url.fingerprint
+            if (fingerprint not in fresh and not self.frontier.has_queued(request.url)
+                    and not self.history.exists(request.url)):
+                fresh[fingerprint] = request
+        return list(fresh.values())
+
+    def _check_robots(self, request: CrawlRequest, rules: 'RobotsRules') -> bool:
+        """
+        Whether `rules` allow `request`, their `Crawl-delay` becomes the delay of the domain.
+        """
+        if rules.crawl_delay is not None:
+            domain = request.url.domain
+            delay_rules = self.frontier.delay_rules
+            if rules.crawl_delay > delay_rules.get_delay(domain):
+                delay_rules.set_delay(domain, rules.crawl_delay)
+
+        if rules.allowed_url(request.url):
+            return True
+
+        logger.debug(f'{request.url} is disallowed by robots.txt')
+        self.history.skipped_disallowed += 1
+        return False
+
+    def _spend_budget(self, request: CrawlRequest, response: CrawlResponse) -> None:
+        body = get_response_body(response)
+        if body is not None:
+            self.frontier.record_download(request, len(body))
+
+    def _check_duplicate(self, response: CrawlResponse) -> None:
+        started = time.perf_counter()
+        self.dedup.check(response)
+        self._observe_processing('dedup', time.perf_counter() - started, response.request)
+
+    @staticmethod
+    def _items(result) -> Iterable:
+        """
+        The items yielded or returned (a dict, or a list or tuple of them) by `on_crawled`.
+        """
+        if isinstance(result, dict):
+            return (result,)
+        if isinstance(result, (Iterator, list, tuple)):
+            return result
+        return ()
+
+    def _add_to_graph(self, response: CrawlResponse) -> None:
+        started = time.perf_counter()
+        self.graph.add_response(response)
+        # The scores are updated in the background, the frontier is reordered once they are.
+        if self.prioritized and self.graph.scores_changed():
+            self.frontier.reprioritize(self._priority)
+        self._observe_processing('graph', time.perf_counter() - started, response.request)
+
+    def _observe_hook(self, hook: str, seconds: float,
+                      request: Optional[CrawlRequest] = None) -> None:
+        timings = getattr(request, 'timings', None)
+        if timings is not None:
+            timings.add('hooks', seconds)
+
+        if self.metrics:
+            self.metrics.observe_hook(hook, seconds)
+
+        if self.profiler:
+            self.profiler.observe(hook, seconds, getattr(request, 'url', None))
+
+    def _observe_processing(self, step: str, seconds: float, request: CrawlRequest) -> None:
+        """
+        Records the time of the crawler's own work on a response, apart from the user hooks.
+        """
+        if request.timings is not None:
+            request.timings.add('processing', seconds)
+
+        if self.metrics:
+            self.metrics.observe_processing(step, seconds)
+
+    def _get_crawl_client(self, request: CrawlRequest) -> tuple['CrawlerClientBase', object]:
+        """
+        The CrawlerClientBase for the type of `request` and the client to run it with.
+        """
+        crawl_client = self.crawl_clients.get(request.type)
+        if crawl_client is None:
+            if request.type != 'httpx':
+                raise ValueError(f'No crawl client for requests of type {request.type!r}, '
+                                 f'add one to `crawl_clients`')
+            return self._crawl_client, self.client or self._crawl_client.get_new_client()
+        return crawl_client, crawl_client.get_new_client()
+
+    def _check_crawl_clients(self, asynchronous: bool) -> None:
+        """
+        Raises if a crawl client can't be run by this crawler, ie: an async one by `Crawler`.
+        """
+        for crawl_client in (self._crawl_client, *self.crawl_clients.values()):
+            if inspect.iscoroutinefunction(crawl_client.run_request) != asynchronous:
+                crawler = 'AsyncCrawler' if not asynchronous else 'Crawler'
+                raise TypeError(f'{self.__class__.__name__} cannot run '
+                                f'{crawl_client.__class__.__name__}, use it with {crawler}')
+
+    def _cleanup_crawl_clients(self) -> list:
+        """
+        Cleans up every client, returns what their `cleanup` returned, awaitables for async ones.
+        """
+        return [crawl_client.cleanup()
+                for crawl_client in (self._crawl_client, *self.crawl_clients.values())]
+
     @abc.abstractmethod
     def _crawl(self, request: CrawlRequest) -> None:
         ...
 
-    def force_stop(self) -> None:
+    def force_stop(self, drain: bool = False) -> None:
+        """
+        Stops the crawler after the request being crawled, with `drain` the requests already in
+        the queue are crawled first but no new ones are waited for. Can be called from any thread.
+        """
+        self._drain = drain
         self._force_stop = True
 
     @abc.abstractmethod
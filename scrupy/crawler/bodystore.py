@@ -0,0 +1,249 @@
+import collections
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import struct
+import threading
+from typing import NamedTuple, Optional
+
+from scrupy.crawler.history import MetadataStore
+from scrupy.crawler.writers import get_zstandard
+
+logger = logging.getLogger(__name__)
+
+HASH_SIZE = MetadataStore.hash_size
+
+# hash, segment, offset, stored size, dictionary id (0 for none), size.
+_INDEX_ENTRY = struct.Struct(f'<{HASH_SIZE}sIQIIQ')
+
+
+def body_hash(body: bytes) -> bytes:
+    """
+    The key of `body` in a `BodyStore`, the same as the `content_hash` of the history.
+    """
+    return hashlib.blake2b(body, digest_size=HASH_SIZE).digest()
+
+
+class BlobLocation(NamedTuple):
+    segment: int
+    offset: int
+    stored_size: int
+    dictionary: int
+    size: int
+
+
+class BodyStore:
+    """
+    Response bodies on disk, zstd compressed and stored once by content hash, however many urls
+    return them, ie: error pages, boilerplate or mirrors.
+
+        store = BodyStore('bodies')
+        Crawler(history=CrawlHistory(body_store=store))
+
+    Bodies are appended to segment files of up to `segment_size` bytes, `segment-00000.bin`...,
+    and their location to `index.bin`, which is loaded when the store is opened again.
+
+    With `train_dictionaries`, the first `dictionary_samples` bodies of every domain train a zstd
+    dictionary of `dictionary_size` bytes that compresses the rest of them, pages of the same
+    site share most of their markup so they compress several times better. Needs `zstandard`.
+    Samples are kept in memory until there are enough, at most `max_sample_bytes` of them, the
+    samples of the domains that were not seen for the longest are dropped first, they start
+    over if they are seen again.
+    """
+
+    def __init__(self,
+                 directory: str | pathlib.Path,
+                 level: int = 3,
+                 segment_size: int = 64 * 1024 * 1024,
+                 train_dictionaries: bool = False,
+                 dictionary_samples: int = 100,
+                 dictionary_size: int = 64 * 1024,
+                 max_sample_bytes: int = 32 * 1024 * 1024):
+        self.zstandard = get_zstandard()
+
+        self.directory = pathlib.Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self.segment_size = segment_size
+        self.train_dictionaries = train_dictionaries
+        self.dictionary_samples = dictionary_samples
+        self.dictionary_size = dictionary_size
+        self.max_sample_bytes = max_sample_bytes
+
+        self.index: dict[bytes, BlobLocation] = {}
+
+        # Domain: its dictionary id, 0 if it could not be trained, and domain: its samples until
+        # there are enough of them, the most recently sampled last.
+        self.domain_dictionaries: dict[str, int] = {}
+        self._samples: collections.OrderedDict[str, list[bytes]] = collections.OrderedDict()
+        self._sample_bytes = 0
+        self._dictionaries: dict[int, object] = {}
+        self._compressors: dict[int, object] = {}
+        self._decompressors: dict[int, object] = {}
+
+        # Bytes put, bodies already stored included, and bytes written.
+        self.size = 0
+        self.stored_size = 0
+
+        self._lock = threading.Lock()
+        self._readers: dict[int, int] = {}
+        self._load()
+
+        self._index_file = open(self.directory / 'index.bin', 'ab')
+        self._segment = max((location.segment for location in self.index.values()), default=0)
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+
+    def _segment_path(self, segment: int) -> pathlib.Path:
+        return self.directory / f'segment-{segment:05d}.bin'
+
+    def _load(self) -> None:
+        dictionaries = self.directory / 'dictionaries.json'
+        if dictionaries.exists():
+            self.domain_dictionaries = json.loads(dictionaries.read_text())
+
+        index = self.directory / 'index.bin'
+        if not index.exists():
+            return
+
+        data = index.read_bytes()
+        # A partially written entry, from a crash, is ignored.
+        for entry in _INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % _INDEX_ENTRY.size]):
+            self.index[entry[0]] = BlobLocation(*entry[1:])
+            self.stored_size += entry[3]
+
+    def _dictionary(self, dictionary_id: int):
+        dictionary = self._dictionaries.get(dictionary_id)
+        if dictionary is None:
+            data = (self.directory / f'dictionary-{dictionary_id:05d}.zdict').read_bytes()
+            dictionary = self._dictionaries[dictionary_id] = \
+                self.zstandard.ZstdCompressionDict(data)
+        return dictionary
+
+    def _compressor(self, dictionary_id: int):
+        compressor = self._compressors.get(dictionary_id)
+        if compressor is None:
+            options = {'dict_data': self._dictionary(dictionary_id)} if dictionary_id else {}
+            compressor = self._compressors[dictionary_id] = self.zstandard.ZstdCompressor(
+                level=self.level, **options)
+        return compressor
+
+    def _decompressor(self, dictionary_id: int):
+        decompressor = self._decompressors.get(dictionary_id)
+        if decompressor is None:
+            options = {'dict_data': self._dictionary(dictionary_id)} if dictionary_id else {}
+            decompressor = self._decompressors[dictionary_id] = \
+                self.zstandard.ZstdDecompressor(**options)
+        return decompressor
+
+    def _dictionary_for(self, domain: Optional[str], body: bytes) -> int:
+        if not self.train_dictionaries or domain is None:
+            return 0
+
+        dictionary_id = self.domain_dictionaries.get(domain)
+        if dictionary_id is not None:
+            return dictionary_id
+
+        samples = self._samples.setdefault(domain, [])
+        self._samples.move_to_end(domain)
+        samples.append(body)
+        self._sample_bytes += len(body)
+
+        if len(samples) >= self.dictionary_samples:
+            self._drop_samples(domain)
+            return self._train(domain, samples)
+
+        while self._sample_bytes > self.max_sample_bytes:
+            self._drop_samples(next(iter(self._samples)))
+        return 0
+
+    def _drop_samples(self, domain: str) -> None:
+        self._sample_bytes -= sum(map(len, self._samples.pop(domain)))
+
+    def _train(self, domain: str, samples: list[bytes]) -> int:
+        try:
+            dictionary = self.zstandard.train_dictionary(self.dictionary_size, samples)
+        except self.zstandard.ZstdError as e:  # Too few or too small samples.
+            logger.debug(f'Could not train a dictionary for {domain}: {e}')
+            dictionary_id = 0
+        else:
+            dictionary_id = max(self.domain_dictionaries.values(), default=0) + 1
+            (self.directory / f'dictionary-{dictionary_id:05d}.zdict').write_bytes(
+                dictionary.as_bytes())
+
+        self.domain_dictionaries[domain] = dictionary_id
+        (self.directory / 'dictionaries.json').write_text(json.dumps(self.domain_dictionaries))
+        return dictionary_id
+
+    def put(self, body: bytes, domain: Optional[str] = None) -> bytes:
+        """
+        Stores `body`, of a page of `domain`, unless it is already stored, returns its hash.
+        """
+        key = body_hash(body)
+
+        with self._lock:
+            self.size += len(body)
+            if key in self.index:
+                return key
+
+            dictionary_id = self._dictionary_for(domain, body)
+            data = self._compressor(dictionary_id).compress(body)
+
+            if self._segment_file.tell() + len(data) > self.segment_size \
+                    and self._segment_file.tell():
+                self._segment_file.close()
+                self._segment += 1
+                self._segment_file = open(self._segment_path(self._segment), 'ab')
+
+            location = BlobLocation(self._segment, self._segment_file.tell(), len(data),
+                                    dictionary_id, len(body))
+            self._segment_file.write(data)
+            self._segment_file.flush()
+
+            # The entry goes after its blob, an entry always points to a complete one.
+            self._index_file.write(_INDEX_ENTRY.pack(key, *location))
+            self._index_file.flush()
+
+            self.index[key] = location
+            self.stored_size += len(data)
+        return key
+
+    def get(self, key: bytes) -> bytes:
+        """
+        The body stored with the hash `key`, raises `KeyError` if there is none.
+        """
+        location = self.index[key]
+
+        with self._lock:
+            fd = self._readers.get(location.segment)
+            if fd is None:
+                fd = self._readers[location.segment] = os.open(
+                    self._segment_path(location.segment), os.O_RDONLY)
+
+        data = os.pread(fd, location.stored_size, location.offset)
+
+        # Decompressors are not thread-safe.
+        with self._lock:
+            return self._decompressor(location.dictionary).decompress(
+                data, max_output_size=location.size)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self) -> None:
+        with self._lock:
+            self._segment_file.close()
+            self._index_file.close()
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,287 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import itertools
+import logging
+from typing import Iterable, Optional
+
+from scrupy import CrawlRequest
+from scrupy.crawler.base import CrawlerClientBase
+from scrupy.request import CrawlResponse, RequestTimings
+from scrupy.utils import LazyModule
+
+playwright_api = LazyModule('playwright.async_api')
+
+logger = logging.getLogger(__name__)
+
+# Browser contexts (cookies, cache, storage) are shared by...
+CONTEXT_PER_DOMAIN = 'domain'  # the requests of the same domain.
+CONTEXT_SHARED = 'shared'  # all the requests.
+CONTEXT_PER_REQUEST = 'request'  # nothing, every request gets a new one.
+
+# Playwright resource types that are not needed to render the html.
+DEFAULT_BLOCKED_RESOURCES = ('image', 'font', 'media')
+
+
+def fill_timings(timings: RequestTimings, resource_timing: dict) -> None:
+    """
+    Fills `timings` from the Resource Timing of the main document, milliseconds since it started,
+    -1 if it didn't happen (ie: connection reused).
+    """
+
+    def span(start: str, end: str) -> Optional[float]:
+        start, end = resource_timing.get(start, -1), resource_timing.get(end, -1)
+        return (end - start) / 1000 if start >= 0 and end >= start else None
+
+    timings.dns = span('domainLookupStart', 'domainLookupEnd')
+    timings.connect = span('connectStart', 'connectEnd')
+    timings.tls = span('secureConnectionStart', 'connectEnd')
+    timings.ttfb = span('requestStart', 'responseStart')
+    timings.download = span('responseStart', 'responseEnd')
+
+
+class BrowserPool:
+    """
+    Pool of browser contexts and pages of a single browser, launched on first use.
+
+    At most `max_pages` pages render at the same time, pages are reused once done. Contexts are
+    reused according to `context_policy` (`CONTEXT_PER_DOMAIN`, `CONTEXT_SHARED` or
+    `CONTEXT_PER_REQUEST`), at most `max_contexts` are kept open, the least recently used idle
+    one is closed first, and a context is recycled after `max_requests_per_context` requests.
+
+    Requests for `block_resources` types (images, fonts and media by default) are aborted.
+
+    Playwright only runs on asyncio, ie: `AsyncCrawler(backend='asyncio')`.
+    """
+
+    def __init__(self,
+                 browser: str = 'chromium',
+                 max_pages: int = 4,
+                 max_contexts: int = 8,
+                 context_policy: str = CONTEXT_PER_DOMAIN,
+                 max_requests_per_context: Optional[int] = None,
+                 block_resources: Iterable[str] = DEFAULT_BLOCKED_RESOURCES,
+                 launch_options: Optional[dict] = None,
+                 context_options: Optional[dict] = None):
+        if context_policy not in (CONTEXT_PER_DOMAIN, CONTEXT_SHARED, CONTEXT_PER_REQUEST):
+            raise ValueError(f'Unknown context policy {context_policy!r}')
+
+        self.browser_name = browser
+        self.max_pages = max_pages
+        self.max_contexts = max_contexts
+        self.context_policy = context_policy
+        self.max_requests_per_context = max_requests_per_context
+        self.block_resources = frozenset(block_resources)
+        self.launch_options = launch_options or {}
+        self.context_options = context_options or {}
+
+        self._playwright = None
+        self.browser = None
+
+        # Least recently used first.
+        self.contexts: collections.OrderedDict[str, object] = collections.OrderedDict()
+        self._idle_pages: dict[str, list] = collections.defaultdict(list)
+        self._busy_pages: collections.Counter = collections.Counter()
+        self._context_requests: collections.Counter = collections.Counter()
+        self._request_ids = itertools.count()
+
+        self._start_lock = asyncio.Lock()
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(max_pages)
+
+    def context_key(self, request: CrawlRequest) -> str:
+        if self.context_policy == CONTEXT_PER_DOMAIN:
+            return request.url.domain
+        if self.context_policy == CONTEXT_SHARED:
+            return CONTEXT_SHARED
+        return f'{CONTEXT_PER_REQUEST}-{next(self._request_ids)}'
+
+    async def start(self) -> None:
+        if self.browser is not None:
+            return
+
+        async with self._start_lock:
+            if self.browser is not None:  # Launched while waiting for the lock.
+                return
+
+            try:
+                async_playwright = playwright_api.async_playwright
+            except ImportError:
+                raise Exception('playwright is not installed')
+
+            self._playwright = await async_playwright().start()
+            browser_type = getattr(self._playwright, self.browser_name)
+            self.browser = await browser_type.launch(**self.launch_options)
+            logger.debug(f'Launched {self.browser_name} {self.browser.version}')
+
+    async def _block_resources(self, route) -> None:
+        if route.request.resource_type in self.block_resources:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def _new_context(self, key: str):
+        context = await self.browser.new_context(**self.context_options)
+        if self.block_resources:
+            await context.route('**/*', self._block_resources)
+        self.contexts[key] = context
+        return context
+
+    async def _close_context(self, key: str) -> None:
+        context = self.contexts.pop(key)
+        self._idle_pages.pop(key, None)
+        self._context_requests.pop(key, None)
+        self._busy_pages.pop(key, None)
+        await context.close()
+
+    async def _evict_contexts(self) -> None:
+        for key in list(self.contexts):
+            if len(self.contexts) <= self.max_contexts:
+                break
+            if not self._busy_pages[key]:
+                await self._close_context(key)
+
+    async def _acquire(self, key: str):
+        async with self._lock:
+            context = self.contexts.get(key)
+            self._busy_pages[key] += 1  # Before evicting, so it is not evicted.
+
+            if context is None:
+                context = await self._new_context(key)
+                await self._evict_contexts()
+
+            self.contexts.move_to_end(key)
+
+            idle_pages = self._idle_pages[key]
+            while idle_pages:
+                page = idle_pages.pop()
+                if not page.is_closed():
+                    return page
+
+        try:
+            return await context.new_page()
+        except BaseException:
+            self._busy_pages[key] -= 1
+            raise
+
+    async def _release(self, key: str, page) -> None:
+        async with self._lock:
+            self._busy_pages[key] -= 1
+            self._context_requests[key] += 1
+
+            recycle = self.context_policy == CONTEXT_PER_REQUEST or (
+                    self.max_requests_per_context
+                    and self._context_requests[key] >= self.max_requests_per_context
+            )
+
+            if recycle:
+                if not self._busy_pages[key]:
+                    await self._close_context(key)
+                return
+
+            if not page.is_closed():
+                self._idle_pages[key].append(page)
+
+            await self._evict_contexts()
+
+    @contextlib.asynccontextmanager
+    async def page(self, request: CrawlRequest):
+        """
+        A page of the context of `request`, waits until less than `max_pages` are being used.
+        """
+        await self.start()
+
+        async with self._slots:
+            key = self.context_key(request)
+            page = await self._acquire(key)
+            try:
+                yield page
+            finally:
+                await self._release(key, page)
+
+    async def close(self) -> None:
+        for key in list(self.contexts):
+            await self._close_context(key)
+
+        if self.browser is not None:
+            await self.browser.close()
+            self.browser = None
+
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+@dataclasses.dataclass
+class BrowserResponse:
+    """
+    The rendered page, `text` is the html of the DOM once loaded, not the html that was received.
+    """
+    url: str
+    status_code: Optional[int]
+    headers: dict
+    text: str
+
+
+class AsyncBrowserClient(CrawlerClientBase):
+    """
+    Renders requests in a headless browser through a `BrowserPool`, route a request type to it
+    to mix JavaScript heavy sites with plain requests in the same crawl, ie:
+
+        class MyCrawler(AsyncCrawler):
+            def on_before_crawl(self, request):
+                if request.url.domain == 'spa-site':
+                    request.type = 'browser'
+                return request
+
+        MyCrawler(backend='asyncio', crawl_clients={'browser': AsyncBrowserClient(max_pages=8)})
+
+    Pages are considered loaded on `wait_until` ('load', 'domcontentloaded', 'networkidle'...).
+    """
+
+    def __init__(self, pool: Optional[BrowserPool] = None, wait_until: str = 'load',
+                 **pool_options):
+        self.pool = pool or BrowserPool(**pool_options)
+        self.wait_until = wait_until
+
+    def get_new_client(self) -> BrowserPool:
+        return self.pool
+
+    async def run_request(self, request: CrawlRequest, client: BrowserPool) -> BrowserResponse:
+        async with client.page(request) as page:
+            # Pages are reused, headers of a previous request must not stay around.
+            await page.set_extra_http_headers({k: str(v) for k, v in request.headers.items()})
+
+            timeout = getattr(request, 'timeout', None)
+            response = await page.goto(str(request.url), wait_until=self.wait_until,
+                                       timeout=timeout * 1000 if timeout else 0)
+
+            if response is not None and request.timings is not None:
+                fill_timings(request.timings, response.request.timing)
+
+            return BrowserResponse(
+                url=page.url,
+                status_code=response.status if response is not None else None,
+                headers=await response.all_headers() if response is not None else {},
+                text=await page.content(),
+            )
+
+    def build_response(self,
+                       request: CrawlRequest,
+                       raw_response: Optional[BrowserResponse],
+                       exception: Optional[Exception] = None) -> CrawlResponse:
+        return CrawlResponse(
+            request=request,
+            raw_response=raw_response,
+            exception=exception,
+            status_code=getattr(raw_response, 'status_code', None),
+            method=request.method,
+            http_version=None,
+            headers=getattr(raw_response, 'headers', None),
+            text=getattr(raw_response, 'text', None),
+            timings=request.timings,
+        )
+
+    async def cleanup(self) -> None:
+        await self.pool.close()
@@ -1,10 +1,62 @@
+import time
 from typing import Optional
 
 import httpx
 
 from scrupy import CrawlRequest
 from scrupy.crawler.base import CrawlerClientBase
-from scrupy.request import CrawlResponse
+from scrupy.request import CrawlResponse, RequestTimings
+
+
+class RequestTracer:
+    """
+    httpx `trace` extension that fills the network timings of a `RequestTimings`.
+
+    httpx reports events like 'connection.connect_tcp.started' or
+    'http11.receive_response_body.complete', see https://www.encode.io/httpcore/extensions/#trace
+    """
+    steps = {
+        'connect_tcp': 'connect',
+        'start_tls': 'tls',
+        'receive_response_body': 'download',
+    }
+
+    def __init__(self, timings: RequestTimings):
+        self.timings = timings
+        self.started = {}
+
+    def trace(self, name: str) -> None:
+        now = time.perf_counter()
+
+        step, _, phase = name.rpartition('.')
+        step = step.partition('.')[2]  # Drop the 'connection.', 'http11.'... prefix.
+
+        if phase == 'started':
+            self.started[step] = now
+            return
+
+        if phase != 'complete':
+            return
+
+        if step == 'receive_response_headers' and 'send_request_headers' in self.started:
+            self.timings.add('ttfb', now - self.started['send_request_headers'])
+
+        elif step in self.steps and step in self.started:
+            self.timings.add(self.steps[step], now - self.started[step])
+
+    def __call__(self, name: str, info: dict) -> None:
+        self.trace(name)
+
+
+class AsyncRequestTracer(RequestTracer):
+    async def __call__(self, name: str, info: dict) -> None:
+        self.trace(name)
+
+
+def get_extensions(request: CrawlRequest, tracer_type: type[RequestTracer]) -> dict:
+    if request.timings is None:
+        return {}
+    return {'trace': tracer_type(request.timings)}
 
 
 class HttpxClient(CrawlerClientBase):
@@ -18,6 +70,7 @@ class HttpxClient(CrawlerClientBase):
             follow_redirects=request.follow_redirects,
             headers=request.headers,
             timeout=request.timeout,
+            extensions=get_extensions(request, RequestTracer),
         )
 
     def build_response(self,
@@ -34,6 +87,7 @@ class HttpxClient(CrawlerClientBase):
             headers=getattr(raw_response, 'headers', None),
             encoding=getattr(raw_response, 'default_encoding', None),
             text=getattr(raw_response, 'text', None),
+            timings=request.timings,
         )
 
     def get_new_client(self):
@@ -58,8 +112,9 @@ class AsyncHttpxClient(CrawlerClientBase):
             method=request.method,
             url=str(request.url),
             follow_redirects=request.follow_redirects,
-            headers=self.headers,
-            timeout=self.timeout,
+            headers=request.headers,
+            timeout=request.timeout,
+            extensions=get_extensions(request, AsyncRequestTracer),
         )
 
     def build_response(self,
@@ -76,4 +131,5 @@ class AsyncHttpxClient(CrawlerClientBase):
             headers=getattr(raw_response, 'headers', None),
             encoding=getattr(raw_response, 'default_encoding', None),
             text=getattr(raw_response, 'text', None),
+            timings=request.timings,
         )
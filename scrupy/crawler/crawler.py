@@ -1,17 +1,23 @@
 import abc
 import datetime
+import inspect
+import itertools
 import logging
+import threading
 import time
+from collections.abc import AsyncIterable, AsyncIterator, Iterable, Iterator
 from typing import Optional
 
-import httpx
-import trio
-
 from scrupy import CrawlRequest
-from scrupy.crawler.base import CrawlerBase, CrawlerClientBase
-from scrupy.crawler.clients import HttpxClient
+from scrupy.crawler.base import CrawlerBase, CrawlerClientBase, is_lazy_source
+from scrupy.crawler.clients import AsyncHttpxClient, HttpxClient
 from scrupy.crawler.frontier import AsyncFrontier, SyncFrontier
-from scrupy.request import CrawlResponse
+from scrupy.crawler.robots import AsyncRobotsCache, RobotsCache
+from scrupy.request import CrawlResponse, RequestTimings
+from scrupy.typing import SECONDS
+from scrupy.utils import LazyModule
+
+anyio = LazyModule('anyio')
 
 logger = logging.getLogger(__name__)
 
@@ -19,49 +25,149 @@ logger = logging.getLogger(__name__)
 class Crawler(CrawlerBase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.frontier = SyncFrontier()
-        self._crawl_client = HttpxClient()
+        self.frontier = SyncFrontier(budget=self.budget, prioritized=self.prioritized)
+        self._crawl_client = self.crawl_client or HttpxClient()
+        self._check_crawl_clients(asynchronous=False)
+
+        if self.robots is True:
+            self.robots = RobotsCache(user_agent=self.user_agent)
+
+        if self.metrics:
+            self.metrics.bind_frontier(self.frontier)
+
+        # Lazy start urls, consumed as the frontier has room for them.
+        self._seed: Optional[Iterator] = None
+
+        if isinstance(self.start_urls, AsyncIterable):
+            raise TypeError('Crawler cannot consume async iterables, use AsyncCrawler')
 
-        if self.start_urls:
+        if self.start_urls and is_lazy_source(self.start_urls):
+            self._seed = iter(self.start_urls)
+        elif self.start_urls:
             self.add_to_queue(self.start_urls)
 
     def add_to_queue(self,
-                     urls: list[str] | str | CrawlRequest,
-                     ignore_repeated: bool = False) -> None:
+                     urls: Iterable[str | CrawlRequest] | str,
+                     ignore_repeated: bool = False,
+                     depth: Optional[int] = None,
+                     parent: Optional[CrawlRequest] = None) -> None:
+        """
+        Queues `urls`, found in the page of `parent`, if any, their depth is one more than its
+        depth unless `depth` is given.
+        """
         match urls:
             case str():
                 urls = (urls,)
 
-        requests = [self._build_request(url) for url in urls]
+        depth = self._link_depth(depth, parent)
+        if self.rules is not None:
+            urls = self.rules.filter(urls, depth)
+
+        parent_url = str(parent.url) if parent is not None else None
+        requests = [self._build_request(url, depth, parent_url) for url in urls]
+
+        if self.robots is not None:
+            requests = [request for request in requests
+                        if self._check_robots(request, self.robots.get(request.url))]
 
         if ignore_repeated:
-            requests = set(urls) - set(map(lambda x: x.request.url, self.history))
+            requests = self._drop_repeated(requests)
 
         self.frontier.add_to_queue(requests)
 
     def _crawl(self, request: CrawlRequest) -> None:
+        timings = RequestTimings(queue_wait=time.perf_counter() - request.queued_at)
+
+        hook_started = time.perf_counter()
         request = self.on_before_crawl(request)
+        request.timings = timings
+        self._observe_hook('on_before_crawl', time.perf_counter() - hook_started, request)
 
         raw_response = exception = None
-        client = self.client or self._crawl_client.get_new_client()
+        crawl_client, client = self._get_crawl_client(request)
 
-        try:
-            raw_response = self._crawl_client.run_request(request, client)
+        if self.metrics:
+            self.metrics.request_started()
 
+        started = time.perf_counter()
+        try:
+            raw_response = crawl_client.run_request(request, client)
         except Exception as e:
             exception = e
+        finally:
+            if self.metrics:
+                self.metrics.request_finished()
+        timings.total = time.perf_counter() - started
 
-        response = self._crawl_client.build_response(
+        response = crawl_client.build_response(
             request=request,
             raw_response=raw_response,
             exception=exception,
         )
 
+        if self.budget is not None:
+            self._spend_budget(request, response)
+
+        if self.dedup is not None:
+            self._check_duplicate(response)
+
+        if self.graph is not None:
+            self._add_to_graph(response)
+
+        if self.metrics:
+            self.metrics.observe_response(response)
+
+        if self.recorder:
+            self.recorder.record(response)
+
+        if self.recrawl is not None:
+            self.recrawl.record(response)
+
         self.history.add(request, response, datetime.datetime.now())
-        self.on_crawled(response)
 
-    def get_next(self):
-        return self.frontier.get_next()
+        hook_started = time.perf_counter()
+        for item in self._items(self.on_crawled(response)):
+            if self.pipeline is not None:
+                self.pipeline.put(item)
+        self._observe_hook('on_crawled', time.perf_counter() - hook_started, request)
+
+    def _seed_frontier(self) -> None:
+        if self._seed is None or len(self.frontier) >= self.seed_batch_size:
+            return
+
+        batch = list(itertools.islice(self._seed, self.seed_batch_size))
+        if len(batch) < self.seed_batch_size:
+            self._seed = None  # Exhausted.
+
+        if batch:
+            self.add_to_queue(batch)
+
+    def _feed_recrawl(self) -> None:
+        # Leasing the due urls is a write transaction, only when there are any.
+        if self.recrawl is None or len(self.frontier) >= self.seed_batch_size \
+                or self.recrawl.seconds_until_due():
+            return
+
+        due = self.recrawl.due(limit=self.seed_batch_size)
+        if due:
+            self.add_to_queue(due)
+
+    def _wait_for_domain_delay(self, request: CrawlRequest) -> None:
+        delay_rules = self.frontier.delay_rules
+        if not delay_rules.default and not delay_rules.delays:
+            return
+
+        domain = request.url.domain
+        last_crawled = self.frontier.last_crawled.get(domain)
+        if last_crawled is not None:
+            remaining = last_crawled + delay_rules.get_delay(domain) - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+
+        self.frontier.last_crawled[domain] = time.monotonic()
+
+    def get_next(self, block: bool = False, timeout: Optional[float] = None):
+        return self.frontier.get_next(block, timeout)
 
     def on_crawled(self, response: CrawlResponse) -> None:
         pass
@@ -72,58 +178,156 @@ class Crawler(CrawlerBase):
     def on_start(self) -> None:
         pass
 
-    def run(self, run_forever: bool = False) -> None:
+    def force_stop(self, drain: bool = False) -> None:
+        super().force_stop(drain)
+        self.frontier.wake()
+
+    def run(self, run_forever: bool = False, idle_timeout: Optional[SECONDS] = None) -> None:
         """
         Initiates the crawling process:
+
+        With `run_forever` the crawler waits for new requests when the queue is empty, without
+        using any CPU, until `force_stop` is called or, if given, `idle_timeout` seconds pass
+        without new requests. Requests can be added from other threads.
+
+        The urls due in `recrawl`, if any, are crawled too, with `run_forever` as they become due.
         """
         logger.debug(f'Start Crawler {self.__class__.__name__}')
+
+        if self.profiler:
+            self.profiler.crawler_thread_id = threading.get_ident()
+
         self.on_start()
+        try:
+            if self.recrawl is not None and not run_forever:
+                self.add_to_queue(self.recrawl.due())
+
+            while run_forever or len(self.frontier) or self._seed is not None:
+                if self._force_stop and not (self._drain and len(self.frontier)):
+                    break
+
+                self._seed_frontier()
+                if run_forever:
+                    self._feed_recrawl()
 
-        while run_forever or len(self.frontier):
-            now = time.time()
-            next = self.get_next()
+                now = time.time()
+                waits = run_forever and not self._force_stop
 
-            if next:
-                is_allowed = self.on_check_if_allowed(next)
+                timeout, recrawl_wait = idle_timeout, False
+                if waits and self.recrawl is not None:
+                    until_due = self.recrawl.seconds_until_due()
+                    if idle_timeout is None or until_due < idle_timeout:
+                        timeout, recrawl_wait = until_due, True
 
-                if is_allowed:
-                    self._crawl(next)
+                next = self.get_next(block=waits, timeout=timeout)
 
-                else:
-                    self.history.skipped_disallowed += 1
-                    continue  # Skip the delays
+                if next is None and waits:
+                    if self._force_stop or recrawl_wait:
+                        continue  # Woken up by `force_stop` or to add the due urls.
+                    logger.debug(f'No new requests in {idle_timeout}s, stopping')
+                    break
 
-            if self.delay_per_request_s:
-                time.sleep(self.delay_per_request_s)
+                if next:
+                    hook_started = time.perf_counter()
+                    is_allowed = self.on_check_if_allowed(next)
+                    self._observe_hook('on_check_if_allowed', time.perf_counter() - hook_started,
+                                       next)
 
-            if self._force_stop:
-                break
+                    if is_allowed:
+                        self._wait_for_domain_delay(next)
+                        self._crawl(next)
 
-            run_time = time.time() - now
+                    else:
+                        self.history.skipped_disallowed += 1
+                        continue  # Skip the delays
 
-            if run_time < self.min_delay_per_tick_s:
-                time.sleep(self.min_delay_per_tick_s - run_time)
+                if self.delay_per_request_s:
+                    time.sleep(self.delay_per_request_s)
 
-        self.on_finish()
+                if self._force_stop and not (self._drain and len(self.frontier)):
+                    break
+
+                run_time = time.time() - now
+
+                if run_time < self.min_delay_per_tick_s:
+                    time.sleep(self.min_delay_per_tick_s - run_time)
+
+            self.on_finish()
+        finally:
+            if self.pipeline is not None:
+                self.pipeline.close()
+            self.history.close()
+            self._cleanup_crawl_clients()
 
 
 class AsyncCrawler(CrawlerBase):
+    """
+    Crawls concurrently on anyio, `run()` starts its own event loop of `backend` ('trio' or
+    'asyncio', with `backend_options` ie: {'use_uvloop': True}), inside a running loop of any
+    of them use `await crawler.run_async()`.
+    """
+
     def __init__(
             self,
-            start_urls: Optional[list[str | CrawlRequest]] = None,
-            randomize_user_agent_per_request: bool = False,
-            user_agent: str = 'scrupy',
+            start_urls: Optional[Iterable[str | CrawlRequest]
+                                 | AsyncIterable[str | CrawlRequest]] = None,
+            backend: str = 'trio',
+            backend_options: Optional[dict] = None,
+            **kwargs
     ):
-        super().__init__()
-        self.start_urls = start_urls
-        self.randomize_user_agent_per_request = randomize_user_agent_per_request
-        self.user_agent = user_agent
-        self.frontier = AsyncFrontier()
-        self._crawl_client = HttpxClient()
-
-    async def add_to_queue(self, urls: list[CrawlRequest | str],
-                           ignore_repeated: bool = False) -> None:
-        requests = [self._build_request(req_or_str) for req_or_str in self.start_urls]
+        super().__init__(start_urls=start_urls, **kwargs)
+        self.backend = backend
+        self.backend_options = backend_options
+        self.frontier = AsyncFrontier(budget=self.budget, prioritized=self.prioritized)
+        self._crawl_client = self.crawl_client or AsyncHttpxClient()
+        self._check_crawl_clients(asynchronous=True)
+
+        if self.robots is True:
+            self.robots = AsyncRobotsCache(user_agent=self.user_agent)
+
+        # Requests being crawled, the crawl is finished when there are none and the frontier
+        # is empty, `_finished` is set then.
+        self.in_flight = 0
+        self._finished: Optional['anyio.Event'] = None
+        self._run_forever = False
+
+        # Whether lazy start urls are still being added, and the event that wakes up the task
+        # adding them when the frontier has room for more.
+        self._seeding = False
+        self._seed_wanted: Optional['anyio.Event'] = None
+
+        # Wakes up the task adding the urls due in `recrawl` when a crawl finishes.
+        self._recrawl_wanted: Optional['anyio.Event'] = None
+
+        if self.metrics:
+            self.metrics.bind_frontier(self.frontier)
+
+    async def add_to_queue(self, urls: Iterable[CrawlRequest | str] | str,
+                           ignore_repeated: bool = False, depth: Optional[int] = None,
+                           parent: Optional[CrawlRequest] = None) -> None:
+        """
+        Queues `urls`, found in the page of `parent`, if any, their depth is one more than its
+        depth unless `depth` is given.
+        """
+        match urls:
+            case str():
+                urls = (urls,)
+
+        depth = self._link_depth(depth, parent)
+        if self.rules is not None:
+            urls = self.rules.filter(urls, depth)
+
+        parent_url = str(parent.url) if parent is not None else None
+        requests = [self._build_request(req_or_str, depth, parent_url) for req_or_str in urls]
+
+        if self.robots is not None:
+            requests = [request for request in requests
+                        if self._check_robots(request, await self.robots.get(request.url))]
+
+        # After the last checkpoint, no other task can add the same url in between.
+        if ignore_repeated:
+            requests = self._drop_repeated(requests)
+
         logger.debug(f'Adding {requests} to frontier')
         await self.frontier.add_to_queue(requests)
 
@@ -139,49 +343,218 @@ class AsyncCrawler(CrawlerBase):
     def get_next(self):
         raise Exception('Async does not use get_next')
 
-    async def crawl_task(self, nursery, receive_channel):
+    async def crawl_task(self, task_group, receive_channel):
         async for request in receive_channel:
-            nursery.start_soon(self._crawl, request)
+            if not self.frontier.dequeued(request):  # Its domain ran out of budget.
+                self._check_finished()
+                continue
+
+            # Counted before leaving the channel's count, no checkpoint in between.
+            self.in_flight += 1
+            task_group.start_soon(self._crawl, request)
+
+    def _check_finished(self) -> None:
+        if (
+                self._finished is not None
+                and not self._run_forever
+                and not self._seeding
+                and not self.in_flight
+                and not len(self.frontier)
+        ):
+            self._finished.set()
+
+    def force_stop(self, drain: bool = False) -> None:
+        """
+        Stops the crawl, cancelling the requests being crawled, or with `drain` once the queued
+        and running requests are done. Call it from a task of the loop running the crawler.
+        """
+        super().force_stop(drain)
+        self._run_forever = False
+
+        if drain:
+            self._check_finished()
+        elif self._finished is not None:
+            self._finished.set()
 
     async def _crawl(self, request: CrawlRequest):
-        client = self.client or self._crawl_client.get_new_client()
+        try:
+            await self._crawl_request(request)
+        finally:
+            self.in_flight -= 1
+
+            if self._seed_wanted is not None and len(self.frontier) < self.seed_batch_size:
+                self._seed_wanted.set()
+
+            if self._recrawl_wanted is not None:
+                self._recrawl_wanted.set()
+
+            self._check_finished()
+
+    async def _batches(self, source) -> AsyncIterator[list]:
+        if isinstance(source, AsyncIterable):
+            batch = []
+            async for item in source:
+                batch.append(item)
+                if len(batch) >= self.seed_batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+            return
+
+        # Sync iterables may block, ie: a `SitemapSource` downloading, they run in a thread.
+        iterator = iter(source)
+        while batch := await anyio.to_thread.run_sync(
+                list, itertools.islice(iterator, self.seed_batch_size)):
+            yield batch
+
+    async def _seed_frontier(self, source) -> None:
+        try:
+            async for batch in self._batches(source):
+                await self.add_to_queue(batch)
+
+                while len(self.frontier) >= self.seed_batch_size:
+                    self._seed_wanted = anyio.Event()
+                    await self._seed_wanted.wait()
+        finally:
+            self._seeding = False
+            self._seed_wanted = None
+            self._check_finished()
+
+    async def _feed_recrawl(self) -> None:
+        while True:
+            wait = self.recrawl.poll_interval
+            if len(self.frontier) < self.seed_batch_size:
+                due = self.recrawl.due(limit=self.seed_batch_size)
+                if due:
+                    await self.add_to_queue(due)
+                    continue
+                wait = self.recrawl.seconds_until_due()
+
+            # Until the next url is due or a crawl finishes, which reschedules its url.
+            self._recrawl_wanted = anyio.Event()
+            with anyio.move_on_after(wait):
+                await self._recrawl_wanted.wait()
+
+    async def _crawl_request(self, request: CrawlRequest):
+        timings = RequestTimings(queue_wait=time.perf_counter() - request.queued_at)
+
+        hook_started = time.perf_counter()
+        request = self.on_before_crawl(request)
+        request.timings = timings
+        self._observe_hook('on_before_crawl', time.perf_counter() - hook_started, request)
+
+        crawl_client, client = self._get_crawl_client(request)
 
         raw_response = exception = None
 
         if self.frontier.delay_rules.get_delay(request.url.domain):
             self.frontier.queue[request.url.domain]['last_crawled'] = time.time()
 
+        if self.metrics:
+            self.metrics.request_started()
+
+        started = time.perf_counter()
         try:
-            raw_response = await self._crawl_client.run_request(request, client)
+            raw_response = await crawl_client.run_request(request, client)
         except Exception as e:
             exception = e
+        finally:
+            if self.metrics:
+                self.metrics.request_finished()
+        timings.total = time.perf_counter() - started
 
-        response = self._crawl_client.build_response(
+        response = crawl_client.build_response(
             request=request,
             raw_response=raw_response,
             exception=exception,
         )
 
+        if self.budget is not None:
+            self._spend_budget(request, response)
+
+        if self.dedup is not None:
+            self._check_duplicate(response)
+
+        if self.graph is not None:
+            self._add_to_graph(response)
+
+        if self.metrics:
+            self.metrics.observe_response(response)
+
+        if self.recorder:
+            self.recorder.record(response)
+
+        if self.recrawl is not None:
+            self.recrawl.record(response)
+
         self.history.add(request, response, datetime.datetime.now())
-        await self.on_crawled(response)
 
-    def run(self, run_forever: bool = False) -> None:
-        async def _run():
-            if self.start_urls:
+        hook_started = time.perf_counter()
+        await self._put_items(self.on_crawled(response))
+        self._observe_hook('on_crawled', time.perf_counter() - hook_started, request)
+
+    async def _put_items(self, result) -> None:
+        # `on_crawled` is a coroutine, or an async generator when it yields items.
+        if inspect.isasyncgen(result):
+            async for item in result:
+                if self.pipeline is not None:
+                    await self.pipeline.put_async(item)
+            return
+
+        for item in self._items(await result):
+            if self.pipeline is not None:
+                await self.pipeline.put_async(item)
+
+    async def run_async(self, run_forever: bool = False) -> None:
+        """
+        Runs the crawl in the current event loop, until there is nothing left to crawl or, with
+        `run_forever`, until `force_stop` is called. Requests can be added meanwhile from any
+        task with `add_to_queue`.
+
+        The urls due in `recrawl`, if any, are crawled too, with `run_forever` as they become due.
+        """
+        try:
+            self._finished = anyio.Event()
+            self._run_forever = run_forever
+
+            lazy_start_urls = self.start_urls and is_lazy_source(self.start_urls)
+            if self.start_urls and not lazy_start_urls:
                 await self.add_to_queue(self.start_urls)
 
-            async with trio.open_nursery() as nursery:
-                nursery.start_soon(self.frontier.run)
-                nursery.start_soon(self.crawl_task, nursery, self.frontier.receive_channel)
-
-                while True:
-                    await trio.sleep(.75)
-                    if (
-                            not run_forever
-                            and len(nursery.child_tasks) == 2  # No current running crawl requests
-                            and self.frontier.pending_requests == 0  # No pending crawl requests
-                    ):
-                        nursery.cancel_scope.cancel()
-                        await self.on_finish()
-
-        trio.run(_run)
+            if self.recrawl is not None and not run_forever:
+                await self.add_to_queue(self.recrawl.due())
+
+            async with anyio.create_task_group() as task_group:
+                task_group.start_soon(self.frontier.run)
+                task_group.start_soon(self.crawl_task, task_group, self.frontier.receive_channel)
+
+                if lazy_start_urls:
+                    self._seeding = True
+                    task_group.start_soon(self._seed_frontier, self.start_urls)
+
+                if self.recrawl is not None and run_forever:
+                    task_group.start_soon(self._feed_recrawl)
+
+                if self.profiler:
+                    self.profiler.crawler_thread_id = threading.get_ident()
+                    task_group.start_soon(self.profiler.watch_loop)
+
+                self._check_finished()  # Nothing to crawl.
+                await self._finished.wait()
+                task_group.cancel_scope.cancel()
+
+            await self.on_finish()
+        finally:
+            with anyio.CancelScope(shield=True):
+                if self.pipeline is not None:
+                    await anyio.to_thread.run_sync(self.pipeline.close)
+                self.history.close()
+
+                for cleanup in self._cleanup_crawl_clients():
+                    if inspect.isawaitable(cleanup):
+                        await cleanup
+
+    def run(self, run_forever: bool = False) -> None:
+        anyio.run(self.run_async, run_forever, backend=self.backend,
+                  backend_options=self.backend_options)
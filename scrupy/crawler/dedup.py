@@ -0,0 +1,185 @@
+import collections
+import hashlib
+import logging
+import re
+from typing import Hashable, Iterable, Iterator, Optional
+
+from scrupy.request import CrawlResponse, HtmlParser
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+
+_WORDS = re.compile(r'\w+')
+
+# Not part of the content of the page.
+NON_CONTENT_TAGS = ('script', 'style', 'noscript', 'template')
+
+
+def _feature_hash(feature: str) -> int:
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """
+    64 bits SimHash of the word shingles of `text`, similar texts get fingerprints that differ in
+    a few bits, ie: `(simhash(a) ^ simhash(b)).bit_count()` is small.
+    """
+    words = _WORDS.findall(text.lower())
+    if len(words) > shingle_size:
+        features = collections.Counter(
+            ' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)
+        )
+    else:
+        features = collections.Counter(words)
+
+    # Bit i is set when the features with bit i set weigh more than half of all of them, only
+    # the set bits of every feature are visited.
+    weights = [0] * FINGERPRINT_BITS
+    total = 0
+    for feature, weight in features.items():
+        total += weight
+        feature_hash = _feature_hash(feature)
+        while feature_hash:
+            lowest = feature_hash & -feature_hash
+            weights[lowest.bit_length() - 1] += weight
+            feature_hash ^= lowest
+
+    return sum(1 << i for i, weight in enumerate(weights) if 2 * weight > total)
+
+
+def extract_text(html: HtmlParser) -> str:
+    """
+    The text of the body of the page, without scripts and styles.
+    """
+    tree = html.selectolax()
+    node = tree.body or tree.root
+    if node is None:
+        return ''
+
+    for tag in NON_CONTENT_TAGS:
+        for element in node.css(tag):
+            element.decompose()
+    return node.text(separator=' ')
+
+
+class SimHashIndex:
+    """
+    Fingerprints split into `max_distance + 1` bands, two fingerprints that differ in at most
+    `max_distance` bits have at least one band equal, so only the fingerprints that share a band
+    with the one looked up are compared, not all of them.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        if not 0 <= max_distance < FINGERPRINT_BITS:
+            raise ValueError(f'max_distance must be between 0 and {FINGERPRINT_BITS - 1}')
+
+        self.max_distance = max_distance
+
+        bands = max_distance + 1
+        width, extra = divmod(FINGERPRINT_BITS, bands)
+        self._bands: list[tuple[int, int]] = []  # (shift, mask)
+        shift = 0
+        for band in range(bands):
+            band_width = width + (band < extra)
+            self._bands.append((shift, (1 << band_width) - 1))
+            shift += band_width
+
+        # One table per band, band value: [(fingerprint, key)].
+        self._tables: list[dict[int, list]] = [collections.defaultdict(list) for _ in self._bands]
+        self._size = 0
+
+    def _band_values(self, fingerprint: int) -> Iterable[int]:
+        return ((fingerprint >> shift) & mask for shift, mask in self._bands)
+
+    def matches(self, fingerprint: int) -> Iterator[Hashable]:
+        """
+        Yields the keys of the fingerprints at most `max_distance` bits away from `fingerprint`,
+        a key can be yielded more than once.
+        """
+        for table, value in zip(self._tables, self._band_values(fingerprint)):
+            for candidate, key in table.get(value, ()):
+                if (candidate ^ fingerprint).bit_count() <= self.max_distance:
+                    yield key
+
+    def find(self, fingerprint: int) -> Optional[Hashable]:
+        """
+        The key of a fingerprint at most `max_distance` bits away from `fingerprint`, if any.
+        """
+        return next(self.matches(fingerprint), None)
+
+    def add(self, fingerprint: int, key: Hashable) -> None:
+        for table, value in zip(self._tables, self._band_values(fingerprint)):
+            table[value].append((fingerprint, key))
+        self._size += 1
+
+    def __len__(self):
+        return self._size
+
+
+class NearDuplicateDetector:
+    """
+    Flags html responses whose text is a near-duplicate of a page already crawled, ie: the same
+    article under session params, print views or sort orders. `response.fingerprint` gets the
+    SimHash of the page and `response.duplicate_of` the url of the page it duplicates.
+
+    With `drop_links` the links of duplicates are dropped, `response.html.links` is empty, so
+    the crawl does not follow duplicated subtrees. Pages with less than `min_words` words
+    (error pages, redirects...) are not fingerprinted.
+
+        Crawler(dedup=NearDuplicateDetector(max_distance=3, drop_links=True))
+    """
+
+    def __init__(self,
+                 max_distance: int = 3,
+                 shingle_size: int = 3,
+                 min_words: int = 20,
+                 drop_links: bool = False,
+                 index: Optional[SimHashIndex] = None):
+        self.shingle_size = shingle_size
+        self.min_words = min_words
+        self.drop_links = drop_links
+        self.index = index if index is not None else SimHashIndex(max_distance)
+
+        self.duplicates = 0
+
+    def fingerprint(self, response: CrawlResponse) -> Optional[int]:
+        if not response.text or not response.is_html:
+            return None
+
+        text = extract_text(response.html)
+        if len(_WORDS.findall(text)) < self.min_words:
+            return None
+        return simhash(text, self.shingle_size)
+
+    def check(self, response: CrawlResponse) -> Optional[str]:
+        """
+        Fingerprints `response`, returns the url of the page it duplicates, if any.
+        """
+        fingerprint = self.fingerprint(response)
+        if fingerprint is None:
+            return None
+
+        response.fingerprint = fingerprint
+        url = str(response.request.url)
+
+        # A page crawled again matches itself, ie: recrawls.
+        duplicate_of = None
+        indexed = False
+        for key in self.index.matches(fingerprint):
+            if response.request.url == key:
+                indexed = True
+            else:
+                duplicate_of = key
+                break
+
+        if duplicate_of is None:
+            if not indexed:
+                self.index.add(fingerprint, url)
+            return None
+
+        logger.debug(f'{url} is a near-duplicate of {duplicate_of}')
+        self.duplicates += 1
+        response.duplicate_of = duplicate_of
+        response.links_dropped = self.drop_links
+        return duplicate_of
@@ -1,15 +1,121 @@
 import abc
 import collections
+import heapq
+import itertools
 import logging
 import math
+import threading
 import time
 import typing
 
-import trio
-
 from ..request import CrawlRequest
+from ..utils import LazyModule, Url
+
+anyio = LazyModule('anyio')
+
+
+class DelayRules:
+    """
+    Seconds to wait between two requests to the same domain, `default` unless set for the domain,
+    ie: from the `Crawl-delay` of its robots.txt.
+    """
+
+    def __init__(self, default: float = 1, delays: typing.Optional[dict[str, float]] = None):
+        self.default = default
+        self.delays = delays or {}
+
+    def get_delay(self, domain: str) -> float:
+        return self.delays.get(domain, self.default)
+
+    def set_delay(self, domain: str, seconds: float) -> None:
+        self.delays[domain] = seconds
+
+
+# Former name.
+RoutingRules = DelayRules
+
+
+class CrawlBudget:
+    """
+    Pages and bytes each domain can take from the crawl, so one huge site cannot starve the rest.
+
+    Once a domain has been crawled `max_pages_per_domain` times or downloaded
+    `max_bytes_per_domain` bytes, its queued requests are dropped at once and new ones are
+    refused, ie: `Crawler(budget=CrawlBudget(max_pages_per_domain=1000))`.
+    """
+
+    def __init__(self,
+                 max_pages_per_domain: typing.Optional[int] = None,
+                 max_bytes_per_domain: typing.Optional[int] = None):
+        self.max_pages_per_domain = max_pages_per_domain
+        self.max_bytes_per_domain = max_bytes_per_domain
+
+        self.pages: collections.Counter[str] = collections.Counter()
+        self.bytes: collections.Counter[str] = collections.Counter()
+        self.exhausted: set[str] = set()
+
+        # Requests refused or dropped because their domain was out of budget.
+        self.dropped = 0
+
+    def is_exhausted(self, domain: str) -> bool:
+        return domain in self.exhausted
+
+    def spend(self, domain: str, pages: int = 0, size: int = 0) -> bool:
+        """
+        Spends `pages` and `size` bytes of the budget of `domain`, returns whether it just ran out.
+        """
+        self.pages[domain] += pages
+        self.bytes[domain] += size
+
+        if domain in self.exhausted:
+            return False
+
+        if (
+                (self.max_pages_per_domain is not None
+                 and self.pages[domain] >= self.max_pages_per_domain)
+                or (self.max_bytes_per_domain is not None
+                    and self.bytes[domain] >= self.max_bytes_per_domain)
+        ):
+            self.exhausted.add(domain)
+            return True
+        return False
+
+
+class PriorityQueue:
+    """
+    Requests by `CrawlRequest.priority`, highest first, in the order they were added when equal.
+    A drop-in for the deques of the frontiers, `[0]` peeks the next one.
+    """
+    __slots__ = ('_heap', '_counter')
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, CrawlRequest]] = []
+        self._counter = itertools.count()
+
+    def append(self, request: CrawlRequest) -> None:
+        heapq.heappush(self._heap, (-request.priority, next(self._counter), request))
+
+    def popleft(self) -> CrawlRequest:
+        return heapq.heappop(self._heap)[2]
+
+    def __getitem__(self, index: int) -> CrawlRequest:
+        if index != 0:
+            raise IndexError('only the next request can be peeked')
+        return self._heap[0][2]
+
+    def reprioritize(self) -> None:
+        """
+        Reorders the requests after their priorities changed.
+        """
+        self._heap = [(-request.priority, order, request) for _, order, request in self._heap]
+        heapq.heapify(self._heap)
+
+    def __iter__(self) -> typing.Iterator[CrawlRequest]:
+        return (request for _, _, request in sorted(self._heap))
+
+    def __len__(self):
+        return len(self._heap)
 
-RoutingRules = type('RoutingRules', (), {})
 
 logger = logging.getLogger('Frontier')
 
@@ -28,42 +134,241 @@ class FrontierBase(abc.ABC):
     def exists_in_queue(self, domain: str):
         ...
 
+    @abc.abstractmethod
+    def evict(self, domain: str) -> None:
+        """
+        Drops every queued request of `domain`.
+        """
+        ...
 
-class SyncFrontier(FrontierBase):
-    def __init__(self, requests: list[CrawlRequest] = None):
-        if not requests:
-            requests = []
+    def _new_queue(self) -> 'collections.deque[CrawlRequest] | PriorityQueue':
+        return PriorityQueue() if self.prioritized else collections.deque()
 
-        self.queue = collections.deque(requests)
+    def _queues(self) -> typing.Iterable['collections.deque[CrawlRequest] | PriorityQueue']:
+        return self.queue.values()
 
-    def get_next(self) -> typing.Optional[CrawlRequest]:
-        el = None
+    def reprioritize(self, priority: typing.Callable[[CrawlRequest], float]) -> None:
+        """
+        Sets the priority of every queued request to `priority(request)` and reorders them, only
+        prioritized frontiers take requests by priority.
+        """
+        if not self.prioritized:
+            return
 
-        try:
-            el = self.queue.popleft()
-        except IndexError:  # Empty deque
-            pass
+        for requests in self._queues():
+            for request in requests:
+                request.priority = priority(request)
+            requests.reprioritize()
 
-        return el
+    def _key(self, url: Url) -> str:
+        """
+        Requests are queued by this part of their url.
+        """
+        return url.domain
+
+    def _accepts(self, request: CrawlRequest) -> bool:
+        if self.budget is not None and self.budget.is_exhausted(request.url.domain):
+            self.budget.dropped += 1
+            return False
+        return True
+
+    def _queued(self, request: CrawlRequest) -> None:
+        # By queue, so they are dropped with the requests of the queue when it is evicted.
+        self.queued_fingerprints[self._key(request.url)][request.url.fingerprint] += 1
+
+    def dequeued(self, request: CrawlRequest) -> bool:
+        """
+        `request` left the queue to be crawled, returns False if it should not be crawled because
+        its domain ran out of budget meanwhile.
+        """
+        key = self._key(request.url)
+        fingerprints = self.queued_fingerprints.get(key)
+        if fingerprints is not None:
+            fingerprint = request.url.fingerprint
+            fingerprints[fingerprint] -= 1
+            if fingerprints[fingerprint] <= 0:
+                del fingerprints[fingerprint]
+            if not fingerprints:
+                del self.queued_fingerprints[key]
+
+        if self.budget is None:
+            return True
+
+        domain = request.url.domain
+
+        if self.budget.is_exhausted(domain):
+            self.budget.dropped += 1
+            return False
+
+        if self.budget.spend(domain, pages=1):
+            self.evict(domain)
+        return True
+
+    def record_download(self, request: CrawlRequest, size: int) -> None:
+        """
+        Spends `size` bytes of the budget of the domain of `request`.
+        """
+        if self.budget is not None and self.budget.spend(request.url.domain, size=size):
+            self.evict(request.url.domain)
+
+    def has_queued(self, url: 'str | Url') -> bool:
+        """
+        Whether `url`, or any url with the same canonical form, is waiting in the queue.
+        """
+        url = url if isinstance(url, Url) else Url(url)
+        return url.fingerprint in self.queued_fingerprints.get(self._key(url), ())
+
+
+class SyncFrontier(FrontierBase):
+    """
+    Requests queued by host, `get_next` takes them from one host after the other, so every site
+    is crawled a bit at a time instead of one after the other.
+    """
+
+    def __init__(self, requests: list[CrawlRequest] = None,
+                 delay_rules: typing.Optional[DelayRules] = None,
+                 budget: typing.Optional[CrawlBudget] = None,
+                 prioritized: bool = False):
+        # Host: its requests, only hosts with requests are in it, by priority if `prioritized`.
+        self.queue: dict[str, collections.deque[CrawlRequest] | PriorityQueue] = {}
+        self.prioritized = prioritized
+
+        # Hosts in the order they are taken from, a host goes back to the end after each request.
+        # Evicted hosts are skipped when their turn comes.
+        self._hosts: collections.deque[str] = collections.deque()
+        self._size = 0
+
+        # Budgets are by domain, domain: its hosts, only kept with a budget.
+        self._hosts_by_domain: dict[str, set[str]] = collections.defaultdict(set)
+
+        # No delays by default, `Crawler.delay_per_request` applies to every request.
+        self.delay_rules = delay_rules or DelayRules(default=0)
+        self.last_crawled: dict[str, float] = {}
+        self.budget = budget
+
+        # Host: how many times each url (by fingerprint) is in the queue, see `has_queued`.
+        self.queued_fingerprints: dict[str, collections.Counter[bytes]] = \
+            collections.defaultdict(collections.Counter)
+
+        # Requests can be added from other threads, `get_next(block=True)` waits on it.
+        self._condition = threading.Condition()
+        self._woken = False
+
+        if requests:
+            self.add_to_queue(requests)
+
+    def _key(self, url: Url) -> str:
+        # Unlike the domain, the host does not need `tldextract`. The canonical one, urls of the
+        # same page are found in the same queue whatever the case of the host or its port.
+        return url.host
+
+    def _pop(self) -> typing.Optional[CrawlRequest]:
+        while self._hosts:
+            host = self._hosts.popleft()
+            requests = self.queue.get(host)
+            if not requests:  # Evicted.
+                continue
+
+            request = requests.popleft()
+            self._size -= 1
+            if requests:
+                self._hosts.append(host)
+            else:
+                del self.queue[host]
+
+            if self.dequeued(request):
+                return request
+        return None
+
+    def get_next(self, block: bool = False,
+                 timeout: typing.Optional[float] = None) -> typing.Optional[CrawlRequest]:
+        """
+        Pops the next request, with `block` waits until there is one, `timeout` seconds pass or
+        `wake` is called, None is returned in the last two cases.
+        """
+        with self._condition:
+            if block:
+                self._condition.wait_for(lambda: self._size or self._woken, timeout)
+                self._woken = False
+
+            return self._pop()
 
     def add_to_queue(self, requests: list[CrawlRequest]):
-        self.queue.extend(requests)
+        with self._condition:
+            for request in requests:
+                if not self._accepts(request):
+                    continue
 
-    def exists_in_queue(self, domain: str):
-        return domain in self.queue
+                host = self._key(request.url)
+                host_requests = self.queue.get(host)
+                if host_requests is None:
+                    host_requests = self.queue[host] = self._new_queue()
+                    self._hosts.append(host)
+
+                if self.budget is not None:
+                    self._hosts_by_domain[request.url.domain].add(host)
+
+                host_requests.append(request)
+                self._queued(request)
+                self._size += 1
+
+            self._condition.notify_all()
+
+    def evict(self, domain: str) -> None:
+        with self._condition:
+            for host in self._hosts_by_domain.pop(domain, ()):
+                requests = self.queue.pop(host, ())
+                self.queued_fingerprints.pop(host, None)
+                self._size -= len(requests)
+                if self.budget is not None:
+                    self.budget.dropped += len(requests)
+
+    def record_download(self, request: CrawlRequest, size: int) -> None:
+        with self._condition:
+            super().record_download(request, size)
+
+    def reprioritize(self, priority: typing.Callable[[CrawlRequest], float]) -> None:
+        with self._condition:
+            super().reprioritize(priority)
+
+    def wake(self) -> None:
+        """
+        Wakes up `get_next(block=True)` even if there are no requests, ie: to stop the crawler.
+        """
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def exists_in_queue(self, host: str):
+        return host in self.queue
+
+    def __iter__(self) -> typing.Iterator[CrawlRequest]:
+        for requests in list(self.queue.values()):
+            yield from requests
 
     def __len__(self):
-        return len(self.queue)
+        return self._size
 
 
 class AsyncFrontier(FrontierBase):
-    def __init__(self, delay_rules: typing.Optional[RoutingRules] = None):
-        if not delay_rules:
-            RoutingRules.get_delay = lambda a, _: 1
-
-        self.delay_rules = RoutingRules()
-        self._send_channel, self._receive_channel = trio.open_memory_channel(math.inf)
+    def __init__(self, delay_rules: typing.Optional[DelayRules] = None,
+                 budget: typing.Optional[CrawlBudget] = None, prioritized: bool = False):
+        self.delay_rules = delay_rules or DelayRules()
+        self.budget = budget
+
+        # Requests waiting for the delay of their domain are sent by priority, the channel is
+        # still first in, first out.
+        self.prioritized = prioritized
+        self._send_channel, self._receive_channel = anyio.create_memory_object_stream(math.inf)
         self.pending_requests = 0
+        # Sent to the channel and not `dequeued` yet. A request sent to a waiting receiver skips
+        # the channel's buffer, it would not be counted anywhere until the receiver runs.
+        self.sent_requests = 0
+
+        # Domain: how many times each url (by fingerprint) is in the queue or the channel,
+        # requests leave it when the crawler calls `dequeued`, see `has_queued`.
+        self.queued_fingerprints: dict[str, collections.Counter[bytes]] = \
+            collections.defaultdict(collections.Counter)
         """
         Queue is structured by domain, ie:
         
@@ -94,24 +399,55 @@ class AsyncFrontier(FrontierBase):
 
         self.queue[request.url.domain] = {
             'last_crawled': None,
-            'requests': collections.deque()
+            'requests': self._new_queue()
         }
         return True
 
     async def add_to_queue(self, requests: list[CrawlRequest]):
+        # The channel is unbounded so sending never blocks, `send_nowait` moves the request
+        # without a checkpoint in between, `len(self)` is always exact.
         for request in requests:
+            if not self._accepts(request):
+                continue
+
+            self._queued(request)
             delay = self.delay_rules.get_delay(request.url.domain)
             if delay:
                 first_added = self._add_to_queue(request)
                 if first_added:
                     self.pending_requests -= 1
-                    await self.send_channel.send(request)
+                    self._send(request)
             else:
-                await self.send_channel.send(request)
+                self._send(request)
+
+    def _send(self, request: CrawlRequest) -> None:
+        self.sent_requests += 1
+        self.send_channel.send_nowait(request)
+
+    def dequeued(self, request: CrawlRequest) -> bool:
+        self.sent_requests -= 1
+        return super().dequeued(request)
+
+    def evict(self, domain: str) -> None:
+        # Requests already sent to the channel are not crawled, see `dequeued`.
+        entry = self.queue.get(domain)
+        if entry is not None:
+            self.pending_requests -= len(entry['requests'])
+            if self.budget is not None:
+                self.budget.dropped += len(entry['requests'])
+            entry['requests'] = self._new_queue()
+        self.queued_fingerprints.pop(domain, None)
+
+    def _queues(self) -> typing.Iterable['collections.deque[CrawlRequest] | PriorityQueue']:
+        return (entry['requests'] for entry in self.queue.values())
 
     def exists_in_queue(self, domain: str):
         return domain in self.queue
 
+    def __len__(self):
+        # Waiting for their domain delay + sent but not picked up by the crawler yet.
+        return self.pending_requests + self.sent_requests
+
     def get_next(self) -> typing.Optional[CrawlRequest]:
         raise NotImplementedError(
             '`get_next` can only be used with `SyncCrawler`,'
@@ -128,7 +464,7 @@ class AsyncFrontier(FrontierBase):
 
     async def run(self) -> None:
         while True:
-            await trio.sleep(.1)
+            await anyio.sleep(.1)
 
             for _, v in self.queue.items():
                 queue_by_domain = v.get('requests')
@@ -151,4 +487,4 @@ class AsyncFrontier(FrontierBase):
                         next_request.url.domain):
                     self.pending_requests -= 1
 
-                    await self.send_channel.send(queue_by_domain.pop())
+                    self._send(queue_by_domain.popleft())
@@ -0,0 +1,315 @@
+import array
+import logging
+import mmap
+import pathlib
+import sys
+import tempfile
+import threading
+import urllib.parse
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from scrupy.request import CrawlResponse
+from scrupy.utils import Url, url_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Node ids and edges are stored as unsigned 32 bits ints.
+ID_TYPECODE = 'I'
+assert array.array(ID_TYPECODE).itemsize == 4
+
+# What scores are computed on: the number of nodes, the number of edges in the file and a copy of
+# the edges in memory.
+Snapshot = tuple[int, int, array.array]
+
+
+def page_links(response: CrawlResponse) -> list[str]:
+    """
+    The absolute http(s) urls linked from the page of `response`, none if it is not html.
+    """
+    html = response.html
+    if html is None:
+        return []
+
+    base = str(response.request.url)
+    links = (urllib.parse.urljoin(base, link) for link in html.links)
+    return [link for link in links if link.startswith(('http://', 'https://'))]
+
+
+class LinkGraph:
+    """
+    The links between the crawled pages, ie:
+
+        graph = LinkGraph()
+        Crawler(start_urls=urls, graph=graph).run()
+        graph.pagerank()
+
+    Urls are interned to consecutive int ids, by fingerprint, and every link is a pair of ids in a
+    flat array. Past `max_memory_edges` edges they are moved to `path` (or a temporary file) and
+    read back memory-mapped, links take at most `max_memory_edges` * 8 bytes of RAM however
+    many there are. Pages are still kept in memory, their url and fingerprint, ~200 bytes each,
+    and computing the scores takes ~100 more per page while it runs.
+
+    Every `update_every` new links the scores, `pagerank` or `in_degree` as `score_by`, are
+    computed again in a background thread, PageRank starting from the previous scores, so it
+    converges in a few iterations when the graph barely changed. Without `background` they are
+    computed in `add`, blocking the crawl meanwhile, only worth it for small graphs. With
+    `prioritize`, the frontier of the crawler takes the requests of each host by score, most
+    linked pages first, reordered every time the scores change.
+    """
+
+    def __init__(self,
+                 path: Optional[str | pathlib.Path] = None,
+                 score_by: str = 'pagerank',
+                 update_every: Optional[int] = 10_000,
+                 prioritize: bool = True,
+                 damping: float = .85,
+                 max_iterations: int = 50,
+                 tolerance: float = 1e-6,
+                 max_memory_edges: int = 1 << 20,
+                 background: bool = True):
+        if score_by not in ('pagerank', 'in_degree'):
+            raise ValueError(f"score_by must be 'pagerank' or 'in_degree', got {score_by!r}")
+
+        self.path = path
+        self.score_by = score_by
+        self.update_every = update_every
+        self.prioritize = prioritize
+        self.damping = damping
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.max_memory_edges = max_memory_edges
+        self.background = background
+
+        # Fingerprint: id, and id: url.
+        self.ids: dict[bytes, int] = {}
+        self.urls: list[str] = []
+
+        # Source and target ids of each link, the newest ones, the rest are in `_file`.
+        self._edges = array.array(ID_TYPECODE)
+        self._file: Optional[BinaryIO] = None
+        self._file_edges = 0
+
+        self.scores: array.array = array.array('d')
+        self._edges_at_update = 0
+
+        # The thread updating the scores, if any, and whether they changed since `scores_changed`.
+        self._updater: Optional[threading.Thread] = None
+        self._changed = False
+
+    def intern(self, url: 'str | Url') -> int:
+        """
+        The id of `url`, new urls get the next one.
+        """
+        fingerprint = url_fingerprint(url)
+        node = self.ids.get(fingerprint)
+        if node is None:
+            node = self.ids[fingerprint] = len(self.urls)
+            self.urls.append(str(url))
+        return node
+
+    def id(self, url: 'str | Url') -> Optional[int]:
+        return self.ids.get(url_fingerprint(url))
+
+    def add(self, source: 'str | Url', targets: Iterable['str | Url']) -> bool:
+        """
+        Adds the links from `source` to `targets`, once each, returns whether the scores are being
+        updated, in the background, or were updated.
+        """
+        source_id = self.intern(source)
+        for target_id in dict.fromkeys(map(self.intern, targets)):
+            if target_id != source_id:
+                self._edges.append(source_id)
+                self._edges.append(target_id)
+
+        if len(self._edges) >= 2 * self.max_memory_edges:
+            self._spill()
+
+        if self.update_every is None or self.updating \
+                or self.edge_count - self._edges_at_update < self.update_every:
+            return False
+
+        if self.background:
+            self._start_update()
+        else:
+            self.update_scores()
+        return True
+
+    def add_response(self, response: CrawlResponse) -> bool:
+        """
+        Adds the links of the page of `response`, see `add`.
+        """
+        return self.add(response.request.url, page_links(response))
+
+    def _spill(self) -> None:
+        if self._file is None:
+            self._file = open(self.path, 'w+b') if self.path else tempfile.TemporaryFile()
+        self._file.seek(0, 2)
+        self._edges.tofile(self._file)
+        self._file.flush()
+        self._file_edges += len(self._edges) // 2
+        self._edges = array.array(ID_TYPECODE)
+
+    def _snapshot(self) -> Snapshot:
+        return len(self.urls), self._file_edges, array.array(ID_TYPECODE, self._edges)
+
+    def _edge_views(self, snapshot: Optional[Snapshot] = None) -> Iterator[memoryview]:
+        if snapshot is None:
+            file_edges, edges = self._file_edges, self._edges
+        else:
+            _, file_edges, edges = snapshot
+
+        if file_edges:
+            # Only the edges that were in the file, more may be added meanwhile.
+            with (mmap.mmap(self._file.fileno(), file_edges * 2 * 4, access=mmap.ACCESS_READ)
+                  as mapped, memoryview(mapped) as raw, raw.cast(ID_TYPECODE) as view):
+                yield view
+        with memoryview(edges) as view:
+            yield view
+
+    def edges(self, snapshot: Optional[Snapshot] = None) -> Iterator[tuple[int, int]]:
+        """
+        The (source id, target id) of every link, in the order they were added.
+        """
+        for view in self._edge_views(snapshot):
+            ids = iter(view)
+            yield from zip(ids, ids)
+
+    @property
+    def edge_count(self) -> int:
+        return self._file_edges + len(self._edges) // 2
+
+    def __len__(self):
+        return len(self.urls)
+
+    def in_degree(self, snapshot: Optional[Snapshot] = None) -> array.array:
+        """
+        How many pages link to each page, by id.
+        """
+        nodes = len(self.urls) if snapshot is None else snapshot[0]
+        degrees = array.array(ID_TYPECODE, bytes(4 * nodes))
+        for view in self._edge_views(snapshot):
+            for target in view[1::2]:
+                degrees[target] += 1
+        return degrees
+
+    def pagerank(self, snapshot: Optional[Snapshot] = None) -> array.array:
+        """
+        The PageRank of each page, by id, starting from the last computed scores, new pages
+        start with the average score.
+        """
+        nodes = len(self.urls) if snapshot is None else snapshot[0]
+        if not nodes:
+            return array.array('d')
+
+        out_degree = [0] * nodes
+        for view in self._edge_views(snapshot):
+            for source in view[0::2]:
+                out_degree[source] += 1
+
+        ranks = list(self.scores) if self.score_by == 'pagerank' else []
+        ranks += [1 / nodes] * (nodes - len(ranks))
+        total = sum(ranks)
+        ranks = [rank / total for rank in ranks]
+
+        for _ in range(self.max_iterations):
+            shares = [rank / degree if degree else 0.
+                      for rank, degree in zip(ranks, out_degree)]
+            # Pages without links share their rank with every page.
+            dangling = sum(rank for rank, degree in zip(ranks, out_degree) if not degree)
+            base = (1 - self.damping + self.damping * dangling) / nodes
+
+            new_ranks = [0.] * nodes
+            for source, target in self.edges(snapshot):
+                new_ranks[target] += shares[source]
+            new_ranks = [base + self.damping * rank for rank in new_ranks]
+
+            delta = sum(abs(new - old) for new, old in zip(new_ranks, ranks))
+            ranks = new_ranks
+            if delta < self.tolerance:
+                break
+
+        return array.array('d', ranks)
+
+    def update_scores(self, snapshot: Optional[Snapshot] = None) -> None:
+        """
+        Computes the scores of the pages, in the calling thread.
+        """
+        if snapshot is None:
+            self._edges_at_update = self.edge_count
+
+        if self.score_by == 'pagerank':
+            self.scores = self.pagerank(snapshot)
+        else:
+            self.scores = array.array('d', self.in_degree(snapshot))
+        self._changed = True
+
+    def _update(self, snapshot: Snapshot) -> None:
+        try:
+            self.update_scores(snapshot)
+        except Exception:
+            logger.exception('Could not update the scores of the link graph')
+
+    def _start_update(self) -> None:
+        self._edges_at_update = self.edge_count
+        self._updater = threading.Thread(target=self._update, args=(self._snapshot(),),
+                                         name='LinkGraph', daemon=True)
+        self._updater.start()
+
+    @property
+    def updating(self) -> bool:
+        return self._updater is not None and self._updater.is_alive()
+
+    def wait(self) -> None:
+        """
+        Waits for the update of the scores running in the background, if any.
+        """
+        if self._updater is not None:
+            self._updater.join()
+
+    def scores_changed(self) -> bool:
+        """
+        Whether the scores were updated since the last call.
+        """
+        changed, self._changed = self._changed, False
+        return changed
+
+    def score(self, url: 'str | Url') -> float:
+        """
+        The score of `url` as of the last update, 0 if it was not known then.
+        """
+        node = self.id(url)
+        return self.scores[node] if node is not None and node < len(self.scores) else 0.
+
+    def top(self, n: int = 10) -> list[tuple[str, float]]:
+        """
+        The `n` urls with the highest scores and their scores.
+        """
+        best = sorted(range(len(self.scores)), key=self.scores.__getitem__, reverse=True)[:n]
+        return [(self.urls[node], self.scores[node]) for node in best]
+
+    def export(self, directory: str | pathlib.Path) -> None:
+        """
+        Writes `nodes.txt`, the url of each id, one per line, and `edges.bin`, the links as pairs
+        of little-endian uint32 ids, ie: `numpy.fromfile('edges.bin', '<u4').reshape(-1, 2)`.
+        """
+        directory = pathlib.Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        with open(directory / 'nodes.txt', 'w', encoding='utf-8') as nodes:
+            for url in self.urls:
+                nodes.write(url + '\n')
+
+        with open(directory / 'edges.bin', 'wb') as edges:
+            for view in self._edge_views():
+                if sys.byteorder == 'little':
+                    edges.write(view)
+                else:
+                    ids = array.array(ID_TYPECODE, view)
+                    ids.byteswap()
+                    ids.tofile(edges)
+
+    def close(self) -> None:
+        self.wait()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,48 +1,346 @@
+import array
+import collections
+import copy
 import dataclasses
 import datetime
+import hashlib
 import json
 import pathlib
+from typing import Optional
 
 from scrupy import CrawlRequest
-from scrupy.request import CrawlResponse
+from scrupy.crawler.writers import JsonLinesWriter
+from scrupy.canonical import FINGERPRINT_SIZE
+from scrupy.request import CrawlResponse, RequestTimings
+from scrupy.utils import url_fingerprint
 
+RETENTION_FULL = 'full'
+RETENTION_METADATA = 'metadata'
+RETENTION_RING = 'ring'
+RETENTION_MODES = (RETENTION_FULL, RETENTION_METADATA, RETENTION_RING)
 
-@dataclasses.dataclass
+
+@dataclasses.dataclass(slots=True)
 class HistoryRow:
     id: int
     request: CrawlRequest
     response: CrawlResponse
     crawled_at: datetime.datetime
+    timings: Optional[RequestTimings] = None
+
+    # Set when the body was moved to a `BodyStore`, the response no longer has it.
+    body_hash: Optional[bytes] = None
+    body_store: Optional['BodyStore'] = dataclasses.field(default=None, repr=False,
+                                                          compare=False)
+
+    @property
+    def body(self) -> Optional[bytes]:
+        """
+        The body of the response, read from the `body_store` when it was moved there.
+        """
+        if self.body_hash is not None and self.body_store is not None:
+            return self.body_store.get(self.body_hash)
+        return get_response_body(self.response)
 
     def as_dict(self):
-        obj = dataclasses.asdict(self)
+        # Not `dataclasses.asdict`, it would deep copy the request and the (raw) response.
+        obj = {field.name: getattr(self, field.name) for field in dataclasses.fields(self)
+               if field.name not in ('body_hash', 'body_store')}
         for k, v in obj.items():
             if hasattr(v, 'as_dict'):
                 obj[k] = v.as_dict()
+        if self.body_hash is not None:
+            obj['body_hash'] = self.body_hash.hex()
         return obj
 
 
-class CrawlHistory:
+class HistoryMetadataRow:
+    """
+    A row of a `CrawlHistory` that only keeps the metadata of the crawl, not the response itself.
+    """
+    __slots__ = ('id', 'url', 'status_code', 'elapsed', 'size', 'content_hash', 'crawled_at')
+
+    def __init__(self,
+                 id: int,
+                 url: str,
+                 status_code: Optional[int],
+                 elapsed: Optional[float],
+                 size: Optional[int],
+                 content_hash: Optional[bytes],
+                 crawled_at: datetime.datetime):
+        self.id = id
+        self.url = url
+        self.status_code = status_code
+        self.elapsed = elapsed
+        self.size = size
+        self.content_hash = content_hash
+        self.crawled_at = crawled_at
+
+    def as_dict(self):
+        obj = {k: getattr(self, k) for k in self.__slots__}
+        if self.content_hash is not None:
+            obj['content_hash'] = self.content_hash.hex()
+        return obj
+
+    def __eq__(self, other):
+        if not isinstance(other, HistoryMetadataRow):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(id={self.id}, url={self.url},'
+                f' status_code={self.status_code})')
+
+
+def get_response_body(response) -> Optional[bytes]:
+    """
+    Returns the body of the response as bytes, if there is any.
+    """
+    content = getattr(getattr(response, 'raw_response', None), 'content', None)
+    if isinstance(content, bytes):
+        return content
+
+    text = getattr(response, 'text', None)
+    if isinstance(text, str):
+        return text.encode(getattr(response, 'encoding', None) or 'utf-8', errors='replace')
+    return None
+
+
+def get_response_metadata(response) -> tuple[Optional[int], Optional[float], Optional[int],
+                                              Optional[bytes]]:
+    """
+    Returns the (status_code, elapsed seconds, size in bytes, content hash) of a response,
+    anything that is not known is None.
+    """
+    status_code = getattr(response, 'status_code', None)
+
+    elapsed = None
+    try:
+        elapsed = response.raw_response.elapsed.total_seconds()
+    except (AttributeError, RuntimeError):  # No raw response or not read yet.
+        pass
+
+    size = content_hash = None
+    body = get_response_body(response)
+    if body is not None:
+        size = len(body)
+        content_hash = hashlib.blake2b(body, digest_size=MetadataStore.hash_size).digest()
+
+    return status_code, elapsed, size, content_hash
+
+
+def _without_body(response: CrawlResponse) -> CrawlResponse:
+    # A copy, the response itself still goes to `on_crawled` with its body.
+    response = copy.copy(response)
+    response.raw_response = None
+    response.text = None
+    return response
+
+
+class MetadataStore:
+    """
+    Column/array-backed storage of `HistoryMetadataRow`, every row costs a fixed ~60 bytes,
+    its url fingerprint included, plus the encoded url and ~4-8 bytes per distinct url in the
+    fingerprint table, instead of a whole Python object per row and field.
+
+    Rows are materialized into `HistoryMetadataRow` when they are accessed.
+    """
+    hash_size = 16
+    fingerprint_size = FINGERPRINT_SIZE
+
+    # Sentinels for values that are not known, arrays cannot hold None.
+    _unknown_int = -1
+    _unknown_float = -1.0
+    _no_hash = bytes(hash_size)
+
     def __init__(self):
+        self.urls = bytearray()
+        self.url_offsets = array.array('Q', [0])
+        self.status_codes = array.array('h')
+        self.elapsed = array.array('f')
+        self.sizes = array.array('q')
+        self.crawled_at = array.array('d')
+        self.content_hashes = bytearray()
+        self.fingerprints = bytearray()
+
+        # Open addressing table of the rows, plus 1 as 0 is an empty slot, with a distinct url
+        # fingerprint, by the fingerprint. Kept at most half full.
+        self._table = array.array('I', bytes(8 * 4))
+        self._table_rows = 0
+
+    def _fingerprint(self, i: int) -> bytes:
+        return self.fingerprints[i * self.fingerprint_size:(i + 1) * self.fingerprint_size]
+
+    def _find_slot(self, fingerprint: bytes) -> int:
+        """
+        The slot of the table with the row of `fingerprint`, or the empty slot it would go in.
+        """
+        mask = len(self._table) - 1
+        slot = int.from_bytes(fingerprint[:8], 'little') & mask
+        while (row := self._table[slot]) and self._fingerprint(row - 1) != fingerprint:
+            slot = (slot + 1) & mask
+        return slot
+
+    def _index(self, i: int) -> None:
+        slot = self._find_slot(self._fingerprint(i))
+        if self._table[slot]:
+            return  # Crawled before.
+
+        self._table[slot] = i + 1
+        self._table_rows += 1
+
+        if self._table_rows * 2 > len(self._table):
+            rows = [row for row in self._table if row]
+            self._table = array.array('I', bytes(len(self._table) * 2 * self._table.itemsize))
+            for row in rows:
+                self._table[self._find_slot(self._fingerprint(row - 1))] = row
+
+    def has_fingerprint(self, fingerprint: bytes) -> bool:
+        return bool(self._table[self._find_slot(fingerprint)])
+
+    def append(self, url: str, fingerprint: bytes, status_code, elapsed, size, content_hash,
+               crawled_at):
+        self.urls += url.encode()
+        self.url_offsets.append(len(self.urls))
+        self.status_codes.append(self._unknown_int if status_code is None else status_code)
+        self.elapsed.append(self._unknown_float if elapsed is None else elapsed)
+        self.sizes.append(self._unknown_int if size is None else size)
+        self.crawled_at.append(crawled_at.timestamp())
+        self.content_hashes += content_hash or self._no_hash
+        self.fingerprints += fingerprint
+        self._index(len(self) - 1)
+
+    def url(self, i: int) -> str:
+        return self.urls[self.url_offsets[i]:self.url_offsets[i + 1]].decode()
+
+    def has_url(self, url: str) -> bool:
+        target = url.encode()
+        view = memoryview(self.urls)
+        for i in range(len(self)):
+            start, end = self.url_offsets[i], self.url_offsets[i + 1]
+            if end - start == len(target) and view[start:end] == target:
+                return True
+        return False
+
+    def row(self, i: int) -> HistoryMetadataRow:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('history index out of range')
+
+        status_code = self.status_codes[i]
+        elapsed = self.elapsed[i]
+        size = self.sizes[i]
+        content_hash = bytes(self.content_hashes[i * self.hash_size:(i + 1) * self.hash_size])
+
+        return HistoryMetadataRow(
+            id=i,
+            url=self.url(i),
+            status_code=None if status_code == self._unknown_int else status_code,
+            elapsed=None if elapsed == self._unknown_float else elapsed,
+            size=None if size == self._unknown_int else size,
+            content_hash=None if content_hash == self._no_hash else content_hash,
+            crawled_at=datetime.datetime.fromtimestamp(self.crawled_at[i]),
+        )
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.row(i) for i in range(*item.indices(len(self)))]
+        return self.row(item)
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def __len__(self):
+        return len(self.status_codes)
+
+    def __str__(self):
+        return str(list(self))
+
+
+class CrawlHistory:
+    """
+    Keeps track of what has been crawled.
+
+    What is kept for every crawled page depends on `retention`:
+     - 'full': a `HistoryRow` with the full request and response, forever.
+     - 'metadata': a `HistoryMetadataRow` (url, status code, timings, size and content hash),
+        stored in a compact array-backed layout.
+     - 'ring': a `HistoryRow` for the last `max_rows` crawled pages only.
+
+    If a `writer` is given, every row is also streamed to it as it is added, ie:
+    `CrawlHistory(retention='metadata', writer=JsonLinesWriter('history.jsonl', compression='gzip'))`
+
+    If a `body_store` is given, the bodies of the responses are moved to it, rows keep their
+    `body_hash` and load them on access, see `HistoryRow.body` and `load_body`. The store is not
+    closed with the history, the bodies can be read after the crawl.
+    """
+
+    def __init__(self,
+                 retention: str = RETENTION_FULL,
+                 max_rows: Optional[int] = None,
+                 writer: Optional[JsonLinesWriter] = None,
+                 body_store: Optional['BodyStore'] = None):
+        if retention not in RETENTION_MODES:
+            raise ValueError(f'Unknown retention {retention!r}, expected one of {RETENTION_MODES}')
+
+        if retention == RETENTION_RING and not max_rows:
+            raise ValueError(f'`max_rows` is required with retention {RETENTION_RING!r}')
+
+        self.retention = retention
+        self.max_rows = max_rows
+        self.writer = writer
+        self.body_store = body_store
+        self.skipped_disallowed = 0
+
         # Might want to use something more performant in the future, as lookups on runtime in the
         # history might become relevant to avoid repeated crawls, maybe a 'set' which has
         # Operation x in s
         # Average case O(1)
         # Worst Case O(n)
-        self.skipped_disallowed = 0
-        self.history = []
+        if retention == RETENTION_METADATA:
+            self.history = MetadataStore()
+        elif retention == RETENTION_RING:
+            self.history = collections.deque(maxlen=max_rows)
+        else:
+            self.history = []
 
         self.i = 0
 
+        # Fingerprints of the crawled urls, `exists` is a set lookup instead of a scan. The
+        # metadata store keeps its own, compact, and rows of the ring are dropped, so it is
+        # scanned, it is at most `max_rows` long.
+        self._fingerprints: Optional[set[bytes]] = set() if retention == RETENTION_FULL else None
+
     def add(self, request: CrawlRequest, response: CrawlResponse, crawled_at):
-        self.history.append(
-            HistoryRow(
+        if self._fingerprints is not None:
+            self._fingerprints.add(request.url.fingerprint)
+
+        body_hash = None
+        if self.body_store is not None and (body := get_response_body(response)) is not None:
+            # The domain is only needed, and extracted, to pick its dictionary.
+            domain = request.url.domain if self.body_store.train_dictionaries else None
+            body_hash = self.body_store.put(body, domain)
+
+        if self.retention == RETENTION_METADATA:
+            # The content hash is the key of the body in the store.
+            self.history.append(str(request.url), request.url.fingerprint,
+                                *get_response_metadata(response), crawled_at)
+            row = self.history[-1] if self.writer else None
+        else:
+            row = HistoryRow(
                 self.i,
                 request,
-                response,
-                crawled_at
+                response if body_hash is None else _without_body(response),
+                crawled_at,
+                getattr(response, 'timings', None),
+                body_hash,
+                self.body_store,
             )
-        )
+            self.history.append(row)
+
+        if self.writer:
+            self.writer.write(row.as_dict())
 
         self.i += 1
 
@@ -50,10 +348,24 @@ class CrawlHistory:
         """
         Returns whether the given url exists in the history
         """
-        for history_row in self.history:
-            if history_row.request.url == url:
-                return True
-        return False
+        fingerprint = url_fingerprint(url)
+        if self._fingerprints is not None:
+            return fingerprint in self._fingerprints
+
+        if self.retention == RETENTION_METADATA:
+            return self.history.has_fingerprint(fingerprint)
+
+        return any(row.request.url.fingerprint == fingerprint for row in self.history)
+
+    def load_body(self, row: 'HistoryRow | HistoryMetadataRow') -> Optional[bytes]:
+        """
+        The body of the response of `row`, from the `body_store` if there is one.
+        """
+        if isinstance(row, HistoryRow):
+            return row.body
+        if self.body_store is not None and row.content_hash in self.body_store:
+            return self.body_store.get(row.content_hash)
+        return None
 
     def save(self, path: str) -> None:
         """
@@ -62,10 +374,21 @@ class CrawlHistory:
         :param path:
         :return:
         """
-        data = [
-            row.as_dict() for row in self.history
-        ]
-        pathlib.Path(path).write_text(json.dumps(data, default=lambda o: str(o)))
+        # Rows are encoded and written one by one, the whole history is never built in memory.
+        with pathlib.Path(path).open('w') as f:
+            f.write('[')
+            for i, row in enumerate(self.history):
+                if i:
+                    f.write(', ')
+                f.write(json.dumps(row.as_dict(), default=lambda o: str(o)))
+            f.write(']')
+
+    def close(self) -> None:
+        """
+        Flushes and closes the `writer`, if any.
+        """
+        if self.writer:
+            self.writer.close()
 
     def __getitem__(self, item):
         return self.history[item]
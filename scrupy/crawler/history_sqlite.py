@@ -0,0 +1,251 @@
+import datetime
+import json
+import pathlib
+import sqlite3
+from typing import Iterator, Optional
+
+from scrupy import CrawlRequest
+from scrupy.crawler.history import HistoryMetadataRow, get_response_metadata
+from scrupy.request import CrawlResponse
+from scrupy.utils import url_fingerprint
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    fingerprint BLOB,
+    domain TEXT,
+    status_code INTEGER,
+    elapsed REAL,
+    size INTEGER,
+    content_hash BLOB,
+    crawled_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_url ON history (url);
+CREATE INDEX IF NOT EXISTS history_domain_status ON history (domain, status_code);
+CREATE INDEX IF NOT EXISTS history_status ON history (status_code);
+CREATE INDEX IF NOT EXISTS history_crawled_at ON history (crawled_at);
+"""
+
+# Databases created before urls were fingerprinted lack the column, it is added when opened.
+FINGERPRINT_INDEX = 'CREATE INDEX IF NOT EXISTS history_fingerprint ON history (fingerprint)'
+
+COLUMNS = ('id', 'url', 'status_code', 'elapsed', 'size', 'content_hash', 'crawled_at')
+
+
+def _to_row(record: tuple) -> HistoryMetadataRow:
+    id, url, status_code, elapsed, size, content_hash, crawled_at = record
+    return HistoryMetadataRow(
+        id=id,
+        url=url,
+        status_code=status_code,
+        elapsed=elapsed,
+        size=size,
+        content_hash=content_hash,
+        crawled_at=datetime.datetime.fromtimestamp(crawled_at),
+    )
+
+
+class SqliteCrawlHistory:
+    """
+    `CrawlHistory` backed by SQLite, it keeps the same metadata as
+    `CrawlHistory(retention='metadata')` plus the domain, but on disk and indexed by url, domain,
+    status code and crawl time, so lookups stay fast with tens of millions of rows, ie:
+
+        history = SqliteCrawlHistory('history.db')
+        crawler = Crawler(history=history)
+        ...
+        history.query(domain='example', status_class=5)  # 5xx of 'example'.
+
+    Rows are inserted in batches of `batch_size` in a single transaction, pending rows are
+    written before every read.
+
+    The crawler closes the history when it finishes, a database on disk is opened again by the
+    next read or write, an in-memory one is kept open, it would be gone otherwise.
+    """
+    select = f'SELECT {", ".join(COLUMNS)} FROM history'
+
+    def __init__(self, path: str | pathlib.Path = ':memory:', batch_size: int = 1000):
+        self.path = path
+        self.batch_size = batch_size
+        self.skipped_disallowed = 0
+
+        self.connection: Optional[sqlite3.Connection] = None
+        self._connect()
+
+        self._pending = []
+
+        # Keep numbering if the database already has rows.
+        last_id = self.connection.execute('SELECT MAX(id) FROM history').fetchone()[0]
+        self.i = 0 if last_id is None else last_id + 1
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, isolation_level=None)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('PRAGMA synchronous=NORMAL')
+            self.connection.executescript(SCHEMA)
+            self._add_fingerprints()
+        return self.connection
+
+    def _add_fingerprints(self) -> None:
+        columns = {column[1] for column in self.connection.execute('PRAGMA table_info(history)')}
+        if 'fingerprint' not in columns:
+            self.connection.execute('ALTER TABLE history ADD COLUMN fingerprint BLOB')
+        self.connection.execute(FINGERPRINT_INDEX)
+
+    def add(self, request: CrawlRequest, response: CrawlResponse, crawled_at):
+        status_code, elapsed, size, content_hash = get_response_metadata(response)
+        self._pending.append((
+            self.i,
+            str(request.url),
+            request.url.fingerprint,
+            request.url.domain,
+            status_code,
+            elapsed,
+            size,
+            content_hash,
+            crawled_at.timestamp(),
+        ))
+        self.i += 1
+
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Writes the pending rows in one transaction.
+        """
+        if not self._pending:
+            return
+
+        connection = self._connect()
+        with connection:
+            connection.execute('BEGIN')
+            connection.executemany(
+                'INSERT INTO history (id, url, fingerprint, domain, status_code, elapsed, size,'
+                ' content_hash, crawled_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                self._pending
+            )
+        self._pending = []
+
+    def _execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        self.flush()
+        return self._connect().execute(sql, parameters)
+
+    def exists(self, url: str) -> bool:
+        """
+        Returns whether the given url, or any url with the same canonical form, exists in the
+        history
+        """
+        return self._execute(
+            'SELECT 1 FROM history WHERE fingerprint = ? OR (fingerprint IS NULL AND url = ?)'
+            ' LIMIT 1', (url_fingerprint(url), str(url))
+        ).fetchone() is not None
+
+    def was_crawled_after(self, url: str, when: datetime.datetime) -> bool:
+        """
+        Returns whether the given url, or any url with the same canonical form, was crawled after
+        `when`.
+        """
+        return self._execute(
+            'SELECT 1 FROM history WHERE (fingerprint = ? OR (fingerprint IS NULL AND url = ?))'
+            ' AND crawled_at > ? LIMIT 1', (url_fingerprint(url), str(url), when.timestamp())
+        ).fetchone() is not None
+
+    def query(self,
+              *,
+              url: Optional[str] = None,
+              domain: Optional[str] = None,
+              status_code: Optional[int] = None,
+              status_class: Optional[int] = None,
+              crawled_after: Optional[datetime.datetime] = None,
+              crawled_before: Optional[datetime.datetime] = None,
+              limit: Optional[int] = None) -> Iterator[HistoryMetadataRow]:
+        """
+        Returns the rows matching all the given filters, ordered by id.
+
+        :param status_class: The first digit of the status code, ie: 5 for any 5xx.
+        """
+        conditions, parameters = [], []
+
+        if url is not None:
+            conditions.append('url = ?')
+            parameters.append(str(url))
+
+        if domain is not None:
+            conditions.append('domain = ?')
+            parameters.append(domain)
+
+        if status_code is not None:
+            conditions.append('status_code = ?')
+            parameters.append(status_code)
+
+        if status_class is not None:
+            conditions.append('status_code BETWEEN ? AND ?')
+            parameters.extend((status_class * 100, status_class * 100 + 99))
+
+        if crawled_after is not None:
+            conditions.append('crawled_at > ?')
+            parameters.append(crawled_after.timestamp())
+
+        if crawled_before is not None:
+            conditions.append('crawled_at < ?')
+            parameters.append(crawled_before.timestamp())
+
+        sql = self.select
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id'
+
+        if limit is not None:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+
+        return map(_to_row, self._execute(sql, parameters))
+
+    def save(self, path: str) -> None:
+        """
+        Persist the history as a Json file in the given `path`
+        """
+        with pathlib.Path(path).open('w') as f:
+            f.write('[')
+            for i, row in enumerate(self):
+                if i:
+                    f.write(', ')
+                f.write(json.dumps(row.as_dict(), default=lambda o: str(o)))
+            f.write(']')
+
+    def close(self) -> None:
+        """
+        Writes the pending rows and closes the connection, unless the database is in memory.
+        """
+        self.flush()
+        if self.connection is not None and self.path != ':memory:':
+            self.connection.close()
+            self.connection = None
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+
+        if item < 0:
+            item += len(self)
+
+        # Ids are sequential from 0, the id is the position.
+        record = self._execute(f'{self.select} WHERE id = ?', (item,)).fetchone()
+        if record is None:
+            raise IndexError('history index out of range')
+        return _to_row(record)
+
+    def __iter__(self):
+        return map(_to_row, self._execute(f'{self.select} ORDER BY id'))
+
+    def __len__(self):
+        return self._execute('SELECT COUNT(*) FROM history').fetchone()[0]
+
+    def __str__(self):
+        return f'{self.__class__.__name__}(path={self.path}, rows={len(self)})'
+
+    def __repr__(self):
+        return self.__str__()
@@ -0,0 +1,370 @@
+import bisect
+import collections
+import http.server
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from scrupy.request import CrawlResponse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+DEFAULT_HOOK_BUCKETS = (.0001, .0005, .001, .005, .01, .05, .1, .5, 1, 5)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = '') -> str:
+    labels = [f'{k}="{_escape_label(v)}"' for k, v in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type: str
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(label, '') for label in self.labels)
+
+    def samples(self) -> Iterable[tuple[str, str, float]]:
+        """
+        Yields (suffix, labels, value) of every sample of the metric, from a copy taken under the
+        lock so it can be read while other threads update it.
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        lines.extend(f'{self.name}{suffix}{labels} {_format_value(value)}'
+                     for suffix, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values = collections.defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            self.values[self._key(labels)] += amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self.values.values())
+
+    def samples(self):
+        with self._lock:
+            values = list(self.values.items())
+        for key, value in values:
+            yield '_total', _format_labels(self.labels, key), value
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, if `function` is given the value is read from it.
+    """
+    type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: Optional[Callable] = None):
+        super().__init__(name, documentation)
+        self.value = 0
+        self.function = function
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def get(self) -> float:
+        return self.function() if self.function else self.value
+
+    def samples(self):
+        yield '', '', self.get()
+
+
+class Histogram(Metric):
+    """
+    Observations counted in cumulative `buckets` (upper bounds, in seconds), per labels.
+    """
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.counts: dict[tuple, list[int]] = {}
+        self.sums = collections.defaultdict(float)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            if key not in self.counts:
+                self.counts[key] = [0] * len(self.buckets)
+            self.counts[key][bisect.bisect_left(self.buckets, value)] += 1
+            self.sums[key] += value
+
+    def _merged_counts(self, labels: dict) -> list[int]:
+        """
+        Counts of the series matching `labels`, all of them if no labels are given.
+        """
+        merged = [0] * len(self.buckets)
+        for key, counts, _ in self._copy():
+            if all(key[self.labels.index(k)] == v for k, v in labels.items()):
+                merged = [a + b for a, b in zip(merged, counts)]
+        return merged
+
+    def _copy(self) -> list[tuple[tuple, list[int], float]]:
+        """
+        (labels, counts, sum) of every series, copied under the lock.
+        """
+        with self._lock:
+            return [(key, list(counts), self.sums[key]) for key, counts in self.counts.items()]
+
+    def count(self, **labels) -> int:
+        return sum(self._merged_counts(labels))
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """
+        Estimates the `q` quantile (0 <= q <= 1), interpolating linearly inside the bucket it
+        falls in, like Prometheus' `histogram_quantile`.
+        """
+        counts = self._merged_counts(labels)
+        total = sum(counts)
+        if not total:
+            return None
+
+        rank = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            if seen + count >= rank and count:
+                upper = self.buckets[i]
+                lower = self.buckets[i - 1] if i else 0
+                if upper == float('inf'):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-2]
+
+    def samples(self):
+        for key, counts, total in self._copy():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                yield '_bucket', _format_labels(self.labels, key, le), cumulative
+            yield '_sum', _format_labels(self.labels, key), total
+            yield '_count', _format_labels(self.labels, key), cumulative
+
+
+class RateWindow:
+    """
+    Per second rate of a growing total over the last `window` seconds, the total grows with
+    `add()` and `rate()` only reads it.
+    """
+
+    def __init__(self, window: float = 10):
+        self.window = window
+        self.total = 0
+        self.samples = collections.deque()
+        self._lock = threading.Lock()
+
+    def add(self, amount: float, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.total += amount
+            self.samples.append((now, self.total))
+            # Keeps the last sample before the window as its start.
+            while len(self.samples) > 1 and self.samples[1][0] <= now - self.window:
+                self.samples.popleft()
+
+    def rate(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if not self.samples:
+                return 0.0
+            first_time, first_total = self.samples[0]
+            for sample_time, sample_total in self.samples:
+                if sample_time > now - self.window:
+                    break
+                first_time, first_total = sample_time, sample_total
+
+            elapsed = now - first_time
+            return (self.total - first_total) / elapsed if elapsed > 0 else 0.0
+
+
+def status_class(response: CrawlResponse) -> str:
+    """
+    '2xx', '4xx'... or 'error' if no response was received.
+    """
+    if response.status_code is None:
+        return 'error'
+    return f'{response.status_code // 100}xx'
+
+
+class CrawlMetrics:
+    """
+    Metrics of a running crawl, pass it as the `metrics` of a crawler and read them with
+    `snapshot()`, or expose them in the Prometheus text format with `render()` or a `MetricsServer`.
+    """
+
+    def __init__(self, prefix: str = 'scrupy', latency_buckets=DEFAULT_LATENCY_BUCKETS,
+                 hook_buckets=DEFAULT_HOOK_BUCKETS, rate_window: float = 10):
+        self.requests = Counter(f'{prefix}_requests', 'Crawled requests.', ('domain', 'status'))
+        self.response_bytes = Counter(f'{prefix}_response_bytes', 'Received body bytes.',
+                                      ('domain',))
+        self.latency = Histogram(f'{prefix}_request_duration_seconds', 'Duration of requests.',
+                                 ('domain', 'status'), buckets=latency_buckets)
+        self.hooks = Histogram(f'{prefix}_hook_duration_seconds', 'Duration of crawler hooks.',
+                               ('hook',), buckets=hook_buckets)
+        self.processing = Histogram(f'{prefix}_processing_duration_seconds',
+                                    'Duration of the processing of responses by the crawler.',
+                                    ('step',), buckets=hook_buckets)
+        self.in_flight = Gauge(f'{prefix}_requests_in_flight', 'Requests being crawled.')
+        self.frontier_depth = Gauge(f'{prefix}_frontier_depth', 'Requests waiting in the frontier.')
+
+        self.metrics: list[Metric] = [
+            self.requests, self.response_bytes, self.latency, self.hooks, self.processing,
+            self.in_flight, self.frontier_depth
+        ]
+
+        self._requests_rate = RateWindow(rate_window)
+        self._bytes_rate = RateWindow(rate_window)
+
+    def bind_frontier(self, frontier) -> None:
+        """
+        Reads the frontier depth from `len(frontier)`.
+        """
+        self.frontier_depth.function = lambda: len(frontier)
+
+    def request_started(self) -> None:
+        self.in_flight.inc()
+
+    def request_finished(self) -> None:
+        self.in_flight.dec()
+
+    def observe_response(self, response: CrawlResponse) -> None:
+        domain = response.request.url.domain
+        status = status_class(response)
+
+        self.requests.inc(domain=domain, status=status)
+        self._requests_rate.add(1)
+
+        content = getattr(response.raw_response, 'content', None)
+        if isinstance(content, bytes):
+            self.response_bytes.inc(len(content), domain=domain)
+            self._bytes_rate.add(len(content))
+
+        if response.timings and response.timings.total is not None:
+            self.latency.observe(response.timings.total, domain=domain, status=status)
+
+    def observe_hook(self, hook: str, seconds: float) -> None:
+        self.hooks.observe(seconds, hook=hook)
+
+    def observe_processing(self, step: str, seconds: float) -> None:
+        self.processing.observe(seconds, step=step)
+
+    def snapshot(self) -> dict:
+        """
+        Current throughput, latency percentiles (overall) and queue state, reading it changes
+        nothing.
+        """
+        return {
+            'requests': self.requests.total(),
+            'requests_per_second': self._requests_rate.rate(),
+            'bytes_per_second': self._bytes_rate.rate(),
+            'latency_p50': self.latency.quantile(.5),
+            'latency_p90': self.latency.quantile(.9),
+            'latency_p99': self.latency.quantile(.99),
+            'in_flight': self.in_flight.get(),
+            'frontier_depth': self.frontier_depth.get(),
+        }
+
+    def render(self) -> str:
+        """
+        All the metrics in the Prometheus text exposition format.
+        """
+        return '\n'.join(metric.render() for metric in self.metrics) + '\n'
+
+
+class MetricsServer:
+    """
+    Serves `CrawlMetrics.render()` at `http://host:port/metrics` from a background thread.
+
+        metrics = CrawlMetrics()
+        with MetricsServer(metrics, port=9100):
+            Crawler(start_urls=urls, metrics=metrics).run()
+    """
+
+    def __init__(self, metrics: CrawlMetrics, host: str = '127.0.0.1', port: int = 9100):
+        self.metrics = metrics
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+
+                body = metrics.render().encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                logger.debug(format % args)
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/metrics'
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.server.serve_forever, name='MetricsServer',
+                                        daemon=True)
+        self._thread.start()
+        logger.debug(f'Serving metrics at {self.url}')
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
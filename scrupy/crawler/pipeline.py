@@ -0,0 +1,287 @@
+import abc
+import csv
+import json
+import logging
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from scrupy.crawler.writers import JsonLinesWriter
+from scrupy.utils import LazyModule
+
+anyio = LazyModule('anyio')
+
+logger = logging.getLogger(__name__)
+
+# A processor gets an item and returns it, changed or not, or None to drop it.
+Processor = Callable[[Any], Any]
+
+
+class SinkBase(abc.ABC):
+    """
+    Where the items of an `ItemPipeline` end up, it gets them in batches, from the pipeline's
+    thread.
+    """
+
+    @abc.abstractmethod
+    def write_batch(self, items: list) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class JsonLinesSink(SinkBase):
+    """
+    Writes the items to a JSON Lines file with a `JsonLinesWriter`, `writer_options` are its
+    options, ie: `JsonLinesSink('items.jsonl', compression='gzip')`.
+    """
+
+    def __init__(self, path: str | pathlib.Path, **writer_options):
+        self.writer = JsonLinesWriter(path, **writer_options)
+
+    def write_batch(self, items: list) -> None:
+        for item in items:
+            self.writer.write(item)
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class CsvSink(SinkBase):
+    """
+    Writes the items (dicts) to a CSV file, with the keys of the first item as columns unless
+    `fieldnames` are given, keys that are not columns are ignored.
+    """
+
+    def __init__(self, path: str | pathlib.Path, fieldnames: Optional[list[str]] = None):
+        self.path = pathlib.Path(path)
+        self.fieldnames = fieldnames
+        self._file = None
+        self._writer: Optional[csv.DictWriter] = None
+
+    def write_batch(self, items: list) -> None:
+        if self._writer is None:
+            self.fieldnames = self.fieldnames or list(items[0])
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.DictWriter(self._file, self.fieldnames, extrasaction='ignore')
+            self._writer.writeheader()
+
+        self._writer.writerows(items)
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SqliteSink(SinkBase):
+    """
+    Inserts the items (dicts) in `table`, one transaction per batch, with the keys of the first
+    item as columns unless `columns` are given. Lists and dicts are stored as JSON.
+    """
+
+    def __init__(self, path: str | pathlib.Path, table: str = 'items',
+                 columns: Optional[list[str]] = None):
+        self.path = path
+        self.table = table
+        self.columns = columns
+        self.connection: Optional[sqlite3.Connection] = None
+
+    @staticmethod
+    def _value(value):
+        if isinstance(value, (dict, list, tuple)):
+            return json.dumps(value, default=str)
+        if value is None or isinstance(value, (str, int, float, bytes)):
+            return value
+        return str(value)
+
+    def _connect(self, items: list) -> None:
+        self.columns = self.columns or list(items[0])
+
+        # Opened here, in the thread of the pipeline that uses it.
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+
+        columns = ', '.join(f'"{column}"' for column in self.columns)
+        self.connection.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({columns})')
+        self._insert = (f'INSERT INTO "{self.table}" ({columns})'
+                        f' VALUES ({", ".join("?" * len(self.columns))})')
+
+    def write_batch(self, items: list) -> None:
+        if self.connection is None:
+            self._connect(items)
+
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(self._insert, (
+                [self._value(item.get(column)) for column in self.columns] for item in items
+            ))
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class CallableSink(SinkBase):
+    """
+    Calls `function` with every batch, ie: to send them to a queue or an API.
+    """
+
+    def __init__(self, function: Callable[[list], Any]):
+        self.function = function
+
+    def write_batch(self, items: list) -> None:
+        self.function(items)
+
+
+class ItemPipeline:
+    """
+    Takes the items of the crawl off the crawler's hands, ie:
+
+        pipeline = ItemPipeline([JsonLinesSink('items.jsonl'), SqliteSink('items.db')],
+                                processors=[drop_empty, add_timestamp])
+
+        class MyCrawler(Crawler):
+            def on_crawled(self, response):
+                yield {'url': str(response.request.url), 'title': ...}
+
+        MyCrawler(pipeline=pipeline).run()
+
+    Every item, yielded (or returned as a list) by `on_crawled` or given to `put`, goes through
+    the `processors`, in order, and then to every sink in batches of `batch_size`, or whatever
+    there is every `flush_interval` seconds. Processors and sinks run in a background thread,
+    so the crawl never waits on them unless `max_pending` items are waiting, then `put` blocks
+    until there is room. The crawler closes the pipeline after `on_finish`, writing everything
+    that is left.
+
+    A processor that raises drops the item, a sink that raises loses the batch, both are logged
+    and counted in `failed`, items are only counted in `written` once every sink wrote them.
+    """
+    _stop = object()
+
+    def __init__(self,
+                 sinks: Iterable[SinkBase | Callable[[list], Any]],
+                 processors: Iterable[Processor] = (),
+                 batch_size: int = 100,
+                 flush_interval: float = 1.0,
+                 max_pending: int = 10_000):
+        self.sinks = [sink if isinstance(sink, SinkBase) else CallableSink(sink)
+                      for sink in sinks]
+        self.processors = list(processors)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # Items written, dropped by a processor and failed in a processor or sink.
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._pending = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='ItemPipeline', daemon=True)
+        self._thread.start()
+
+    def put(self, item) -> None:
+        """
+        Hands `item` over to the pipeline, blocks while `max_pending` items are waiting.
+        """
+        if self._closed:
+            raise ValueError('Cannot put items in a closed pipeline')
+        self._pending.put(item)
+
+    async def put_async(self, item) -> None:
+        """
+        `put` that waits for room in a worker thread, not blocking the event loop.
+        """
+        if self._closed:
+            raise ValueError('Cannot put items in a closed pipeline')
+        try:
+            self._pending.put_nowait(item)
+        except queue.Full:
+            await anyio.to_thread.run_sync(self._pending.put, item)
+
+    def _process(self, item):
+        for processor in self.processors:
+            try:
+                item = processor(item)
+            except Exception:
+                logger.exception(f'Processor {processor} failed, dropping {item!r}')
+                self.failed += 1
+                return None
+
+            if item is None:
+                self.dropped += 1
+                return None
+        return item
+
+    def _write(self, batch: list) -> None:
+        failed = False
+        for sink in self.sinks:
+            try:
+                sink.write_batch(batch)
+            except Exception:
+                logger.exception(f'{sink.__class__.__name__} could not write {len(batch)} items')
+                failed = True
+
+        # Written only if every sink has them.
+        if failed:
+            self.failed += len(batch)
+        else:
+            self.written += len(batch)
+
+    def _run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            try:
+                item = self._pending.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+            else:
+                if item is not self._stop:
+                    item = self._process(item)
+                    if item is not None:
+                        batch.append(item)
+
+            stopping = item is self._stop
+            if batch and (stopping or len(batch) >= self.batch_size
+                          or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+            if stopping:
+                break
+
+    def close(self) -> None:
+        """
+        Writes the items that are left, waits for it and closes the sinks.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+        self._pending.put(self._stop)
+        self._thread.join()
+
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception:
+                logger.exception(f'Could not close {sink.__class__.__name__}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,163 @@
+import collections
+import logging
+import sys
+import threading
+import time
+from typing import Optional
+
+from scrupy.utils import LazyModule
+
+anyio = LazyModule('anyio')
+
+logger = logging.getLogger(__name__)
+
+
+class HookStats:
+    __slots__ = ('calls', 'total', 'max', 'slow_calls')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow_calls = 0
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+
+class SampledProfile:
+    """
+    Result of `HookProfiler.sample`, how many samples were taken in every function (`own`) and
+    in every function or the functions it called (`cumulative`).
+    """
+
+    def __init__(self, samples: int, own: collections.Counter, cumulative: collections.Counter):
+        self.samples = samples
+        self.own = own
+        self.cumulative = cumulative
+
+    def report(self, top: int = 20) -> str:
+        lines = [f'{self.samples} samples', f'{"own %":>7} {"cum %":>7}  function']
+        if not self.samples:
+            return lines[0]
+
+        for function, count in self.own.most_common(top):
+            lines.append(f'{100 * count / self.samples:6.1f}% '
+                         f'{100 * self.cumulative[function] / self.samples:6.1f}%  {function}')
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.report()
+
+
+class HookProfiler:
+    """
+    Times every hook of a crawler (`on_before_crawl`, `on_crawled`, `on_check_if_allowed`,
+    `generate_user_agent`) and logs the calls that take longer than `slow_hook_threshold`
+    seconds, with the url of the request, pass it as the `profiler` of a crawler.
+
+    With `AsyncCrawler` it also watches how long the event loop is blocked, every time a
+    heartbeat task wakes up more than `loop_block_threshold` seconds late it is logged.
+
+    A sampling profiler can be run on demand with `sample` (blocking) or `start_sampling`.
+    """
+
+    def __init__(self,
+                 slow_hook_threshold: float = .1,
+                 loop_block_threshold: float = .1,
+                 loop_check_interval: float = .05):
+        self.slow_hook_threshold = slow_hook_threshold
+        self.loop_block_threshold = loop_block_threshold
+        self.loop_check_interval = loop_check_interval
+
+        self.hooks: dict[str, HookStats] = collections.defaultdict(HookStats)
+        self.loop_blocked_total = 0.0
+        self.loop_blocked_max = 0.0
+        self.loop_blocks = 0
+
+        self.crawler_thread_id = threading.get_ident()
+
+    def observe(self, hook: str, seconds: float, url=None) -> None:
+        stats = self.hooks[hook]
+        stats.calls += 1
+        stats.total += seconds
+        stats.max = max(stats.max, seconds)
+
+        if seconds >= self.slow_hook_threshold:
+            stats.slow_calls += 1
+            logger.warning(f'Slow hook `{hook}` took {seconds * 1000:.1f}ms'
+                           + (f' for {url}' if url is not None else ''))
+
+    def observe_loop_block(self, seconds: float) -> None:
+        self.loop_blocked_total += seconds
+        self.loop_blocked_max = max(self.loop_blocked_max, seconds)
+
+        if seconds >= self.loop_block_threshold:
+            self.loop_blocks += 1
+            logger.warning(f'Event loop was blocked for {seconds * 1000:.1f}ms')
+
+    async def watch_loop(self) -> None:
+        """
+        Heartbeat task, measures how late it is woken up, that's how long something else was
+        blocking the event loop.
+        """
+        while True:
+            expected = time.perf_counter() + self.loop_check_interval
+            try:
+                await anyio.sleep(self.loop_check_interval)
+            finally:
+                # Also when cancelled, the crawl may end right after the loop was blocked.
+                self.observe_loop_block(max(0.0, time.perf_counter() - expected))
+
+    def stats(self) -> dict:
+        return {
+            'hooks': {hook: stats.as_dict() for hook, stats in self.hooks.items()},
+            'loop_blocked_total': self.loop_blocked_total,
+            'loop_blocked_max': self.loop_blocked_max,
+            'loop_blocks': self.loop_blocks,
+        }
+
+    def sample(self, seconds: float, interval: float = .005,
+               thread_id: Optional[int] = None) -> SampledProfile:
+        """
+        Samples the stack of `thread_id` (by default the thread running the crawler, or the one
+        the profiler was created in if it's not running yet) every `interval` seconds for `seconds`.
+        """
+        thread_id = self.crawler_thread_id if thread_id is None else thread_id
+        own, cumulative = collections.Counter(), collections.Counter()
+        samples = 0
+
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+
+            samples += 1
+            own[stack[0]] += 1
+            cumulative.update(set(stack))
+
+            time.sleep(interval)
+
+        return SampledProfile(samples, own, cumulative)
+
+    def start_sampling(self, seconds: float, interval: float = .005, top: int = 20,
+                       thread_id: Optional[int] = None) -> threading.Thread:
+        """
+        Like `sample` but in a background thread, the report is logged when it's done. Safe to
+        call while the crawler is running, ie: from a signal handler.
+        """
+
+        def run():
+            profile = self.sample(seconds, interval, thread_id)
+            logger.warning(f'Sampled profile of {seconds}s:\n{profile.report(top)}')
+
+        thread = threading.Thread(target=run, name='HookProfiler', daemon=True)
+        thread.start()
+        return thread
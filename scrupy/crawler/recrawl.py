@@ -0,0 +1,216 @@
+import math
+import pathlib
+import sqlite3
+import time
+from typing import Callable, Iterable, Optional
+
+from scrupy.crawler.history import get_response_metadata
+from scrupy.request import CrawlResponse
+from scrupy.typing import SECONDS
+from scrupy.utils import Url
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    fingerprint BLOB PRIMARY KEY,
+    url TEXT NOT NULL,
+    content_hash BLOB,
+    first_crawled REAL,
+    last_crawled REAL,
+    last_changed REAL,
+    checks INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0,
+    checked_time REAL NOT NULL DEFAULT 0,
+    next_due REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_next_due ON pages (next_due);
+"""
+
+DAY = 24 * 60 * 60
+
+
+def estimate_change_rate(checks: int, changes: int, checked_time: float) -> Optional[float]:
+    """
+    Changes per second of a page that changed `changes` times in `checks` crawls spread over
+    `checked_time` seconds, None if it was never checked.
+
+    Crawls only tell whether a page changed since the previous one, not how many times, so the
+    plain `changes / checked_time` underestimates pages that change often, this is the estimator
+    of Cho and Garcia-Molina for changes that follow a Poisson process.
+    """
+    if not checks or checked_time <= 0:
+        return None
+    mean_interval = checked_time / checks
+    return -math.log((checks - changes + .5) / (checks + .5)) / mean_interval
+
+
+class RecrawlScheduler:
+    """
+    Decides when to crawl pages again from how often they changed so far, kept in SQLite, ie:
+
+        scheduler = RecrawlScheduler('recrawl.db')
+        scheduler.add(urls)
+
+        # Crawl what is due now, once.
+        Crawler(recrawl=scheduler).run()
+
+        # Or keep crawling pages as they become due.
+        Crawler(recrawl=scheduler).run(run_forever=True)
+
+    Every crawled page is tracked, its content hash is compared with the one of its previous
+    crawl to count its changes. A page is due again when the chance that it changed since it was
+    crawled, `1 - exp(-rate * elapsed)`, reaches `staleness`. Pages never seen changing yet are
+    due after `initial_interval`, and intervals are kept between `min_interval` and
+    `max_interval`. Pages handed to a crawler are not due again for `lease` seconds, or until
+    they are crawled.
+
+    A crawler running forever checks for due pages at least every `poll_interval` seconds, urls
+    added meanwhile from elsewhere are picked up then.
+    """
+
+    def __init__(self,
+                 path: str | pathlib.Path = ':memory:',
+                 staleness: float = .5,
+                 initial_interval: SECONDS = DAY,
+                 min_interval: SECONDS = 60 * 60,
+                 max_interval: SECONDS = 30 * DAY,
+                 lease: SECONDS = 60 * 60,
+                 poll_interval: SECONDS = 60,
+                 clock: Callable[[], float] = time.time):
+        if not 0 < staleness < 1:
+            raise ValueError('staleness must be between 0 and 1')
+
+        self.path = path
+        self.staleness = staleness
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.clock = clock
+
+        self.connection = sqlite3.connect(path, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(SCHEMA)
+
+    def interval(self, rate: Optional[float]) -> float:
+        """
+        Seconds until a page that changes `rate` times per second is `staleness` likely changed.
+        """
+        if rate is None:
+            interval = self.initial_interval
+        elif rate <= 0:
+            interval = self.max_interval
+        else:
+            interval = -math.log(1 - self.staleness) / rate
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def add(self, urls: Iterable[str], due: Optional[float] = None) -> None:
+        """
+        Tracks `urls`, due at `due` (now by default), urls already tracked are left as they are.
+        """
+        due = self.clock() if due is None else due
+        with self.connection:
+            self.connection.execute('BEGIN')
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO pages (fingerprint, url, next_due) VALUES (?, ?, ?)',
+                ((url.fingerprint, str(url), due) for url in map(Url, urls))
+            )
+
+    def record(self, response: CrawlResponse, crawled_at: Optional[float] = None) -> None:
+        """
+        Records a crawl of the page of `response` and schedules its next one.
+        """
+        now = self.clock() if crawled_at is None else crawled_at
+        url = response.request.url
+        status_code, _, _, content_hash = get_response_metadata(response)
+
+        row = self.connection.execute(
+            'SELECT content_hash, last_crawled, checks, changes, checked_time FROM pages'
+            ' WHERE fingerprint = ?', (url.fingerprint,)
+        ).fetchone()
+        previous_hash, last_crawled, checks, changes, checked_time = row or (None, None, 0, 0, 0)
+
+        failed = response.exception is not None or status_code is None or status_code >= 400
+        if failed or content_hash is None:
+            # Nothing to compare, tried again soon.
+            self._upsert(url, previous_hash, now, None, checks, changes, checked_time,
+                         now + self.min_interval)
+            return
+
+        changed = None
+        if previous_hash is not None and last_crawled is not None:
+            checks += 1
+            checked_time += max(now - last_crawled, 0)
+            changed = previous_hash != content_hash
+            changes += changed
+
+        next_due = now + self.interval(estimate_change_rate(checks, changes, checked_time))
+        self._upsert(url, content_hash, now, now if changed else None, checks, changes,
+                     checked_time, next_due)
+
+    def _upsert(self, url: Url, content_hash, crawled_at, changed_at, checks, changes,
+                checked_time, next_due) -> None:
+        self.connection.execute(
+            'INSERT INTO pages (fingerprint, url, content_hash, first_crawled, last_crawled,'
+            ' last_changed, checks, changes, checked_time, next_due)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (fingerprint) DO UPDATE SET content_hash = excluded.content_hash,'
+            ' first_crawled = coalesce(first_crawled, excluded.first_crawled),'
+            ' last_crawled = excluded.last_crawled,'
+            ' last_changed = coalesce(excluded.last_changed, last_changed),'
+            ' checks = excluded.checks, changes = excluded.changes,'
+            ' checked_time = excluded.checked_time, next_due = excluded.next_due',
+            (url.fingerprint, str(url), content_hash, crawled_at, crawled_at, changed_at, checks,
+             changes, checked_time, next_due)
+        )
+
+    def due(self, limit: Optional[int] = None, now: Optional[float] = None) -> list[str]:
+        """
+        The urls due by `now`, most overdue first, they are leased, not due again until crawled
+        or `lease` seconds pass.
+        """
+        now = self.clock() if now is None else now
+        with self.connection:
+            self.connection.execute('BEGIN IMMEDIATE')
+            rows = self.connection.execute(
+                'SELECT fingerprint, url FROM pages WHERE next_due <= ? ORDER BY next_due LIMIT ?',
+                (now, -1 if limit is None else limit)
+            ).fetchall()
+            self.connection.executemany(
+                'UPDATE pages SET next_due = ? WHERE fingerprint = ?',
+                ((now + self.lease, fingerprint) for fingerprint, _ in rows)
+            )
+        return [url for _, url in rows]
+
+    def next_due(self) -> Optional[float]:
+        """
+        When the next url is due, None if no url is tracked.
+        """
+        return self.connection.execute('SELECT MIN(next_due) FROM pages').fetchone()[0]
+
+    def seconds_until_due(self) -> float:
+        """
+        Seconds to wait for the next due url, at most `poll_interval`.
+        """
+        next_due = self.next_due()
+        if next_due is None:
+            return self.poll_interval
+        return min(max(next_due - self.clock(), 0), self.poll_interval)
+
+    def change_rate(self, url: str) -> Optional[float]:
+        """
+        Estimated changes per day of `url`, None if it is not known yet.
+        """
+        row = self.connection.execute(
+            'SELECT checks, changes, checked_time FROM pages WHERE fingerprint = ?',
+            (Url(url).fingerprint,)
+        ).fetchone()
+        rate = estimate_change_rate(*row) if row else None
+        return rate * DAY if rate is not None else None
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def close(self) -> None:
+        self.connection.close()
@@ -0,0 +1,306 @@
+import array
+import concurrent.futures
+import inspect
+import json
+import mmap
+import pathlib
+import re
+import zlib
+from typing import Any, Iterator, Optional
+
+from scrupy import CrawlRequest
+from scrupy.crawler.base import CrawlerBase
+from scrupy.crawler.clients import HttpxClient
+from scrupy.crawler.warc import _iter_gzip_members, parse_record, to_httpx_response
+from scrupy.crawler.writers import COMPRESSION_SUFFIXES, get_zstandard
+from scrupy.request import CrawlResponse
+from scrupy.utils import LazyModule
+
+anyio = LazyModule('anyio')
+
+FORMAT_WARC = 'warc'
+FORMAT_JSON_LINES = 'jsonl'
+
+_content_length = re.compile(rb'\r\ncontent-length:\s*(\d+)', re.IGNORECASE)
+_response_type = re.compile(rb'\r\nWARC-Type:\s*response\r\n', re.IGNORECASE)
+
+
+def detect_format(path: pathlib.Path) -> tuple[str, Optional[str]]:
+    """
+    Returns the format of a corpus file (`warc` or `jsonl`) and its compression (None, `gzip` or
+    `zstd`), as written by `JsonLinesWriter`.
+    """
+    suffixes = path.suffixes
+    compression = None
+    for name, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and suffixes and suffixes[-1] == suffix:
+            compression = name
+            suffixes = suffixes[:-1]
+
+    if suffixes and suffixes[-1] == '.warc':
+        return FORMAT_WARC, compression
+    if suffixes and suffixes[-1] in ('.jsonl', '.json'):
+        return FORMAT_JSON_LINES, compression
+
+    raise ValueError(f'Unsupported corpus file {path}, expected .warc or .jsonl, optionally'
+                     f' followed by .gz or .zst')
+
+
+def _iter_zstd_frames(f, chunk_size: int = 1 << 16) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields (offset, decompressed data) of every zstd frame of `f`, like `_iter_gzip_members`.
+    """
+    zstandard = get_zstandard()
+    offset = 0
+    pending = b''
+
+    while True:
+        if not pending:
+            pending = f.read(chunk_size)
+            if not pending:
+                return
+
+        start = offset
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        chunks = []
+
+        while not decompressor.eof:
+            if not pending:
+                pending = f.read(chunk_size)
+                if not pending:
+                    raise EOFError(f'Truncated zstd frame at offset {start}')
+
+            chunks.append(decompressor.decompress(pending))
+            offset += len(pending) - len(decompressor.unused_data)
+            pending = decompressor.unused_data
+
+        yield start, b''.join(chunks)
+
+
+def _open_map(path: pathlib.Path) -> Optional[mmap.mmap]:
+    with open(path, 'rb') as f:
+        if not f.seek(0, 2):  # Empty files cannot be mapped.
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def index_file(path: str | pathlib.Path) -> tuple[array.array, array.array]:
+    """
+    Returns the (offsets, lengths) of the records of a corpus file: `response` records for WARC
+    files, lines for JSON Lines files. For compressed files, records are the gzip members or zstd
+    frames.
+
+    Uncompressed files are only scanned, compressed ones have to be decompressed once to find
+    where the members end.
+    """
+    path = pathlib.Path(path)
+    file_format, compression = detect_format(path)
+    offsets, lengths = array.array('Q'), array.array('Q')
+
+    mm = _open_map(path)
+    if mm is None:
+        return offsets, lengths
+
+    with mm:
+        if compression is not None:
+            # A member ends where the next one starts, data is not kept around.
+            members = _iter_gzip_members(mm) if compression == 'gzip' else _iter_zstd_frames(mm)
+            previous = None
+            for start, data in members:
+                if previous is not None:
+                    offsets.append(previous)
+                    lengths.append(start - previous)
+
+                is_record = file_format != FORMAT_WARC or _response_type.search(data)
+                previous = start if is_record else None
+
+            if previous is not None:
+                offsets.append(previous)
+                lengths.append(len(mm) - previous)
+
+        elif file_format == FORMAT_JSON_LINES:
+            position = 0
+            while position < len(mm):
+                end = mm.find(b'\n', position)
+                if end == -1:
+                    end = len(mm)
+                if end > position:
+                    offsets.append(position)
+                    lengths.append(end - position)
+                position = end + 1
+
+        else:
+            position = 0
+            while (header_end := mm.find(b'\r\n\r\n', position)) != -1:
+                header = mm[position:header_end + 2]
+                end = header_end + 4 + int(_content_length.search(header).group(1)) + 4
+
+                if _response_type.search(header):
+                    offsets.append(position)
+                    lengths.append(end - position)
+                position = end
+
+    return offsets, lengths
+
+
+class CorpusIndex:
+    """
+    Offsets of every record of one or more corpus files (WARC files or `CrawlHistory` JSON Lines
+    dumps), records are read from memory-mapped files by offset, files are never read whole.
+    """
+
+    def __init__(self, *paths: str | pathlib.Path,
+                 executor: Optional[concurrent.futures.Executor] = None):
+        self.paths = [pathlib.Path(path) for path in paths]
+
+        for path in self.paths:
+            detect_format(path)  # Fail early on unsupported files.
+
+        indexes = executor.map(index_file, self.paths) if executor else map(index_file, self.paths)
+        self.offsets, self.lengths = zip(*indexes) if self.paths else ((), ())
+
+    def batches(self, batch_size: int) -> Iterator[tuple[pathlib.Path, list[int], list[int]]]:
+        """
+        Yields (path, offsets, lengths) in batches of at most `batch_size` records of the same file.
+        """
+        for path, offsets, lengths in zip(self.paths, self.offsets, self.lengths):
+            for i in range(0, len(offsets), batch_size):
+                yield path, offsets[i:i + batch_size].tolist(), lengths[i:i + batch_size].tolist()
+
+    def __len__(self):
+        return sum(map(len, self.offsets))
+
+
+def _responses_from_warc(data: bytes) -> Iterator[CrawlResponse]:
+    client = HttpxClient()
+    start = 0
+    while start < len(data):
+        record, start = parse_record(data, start)
+        if record.type != 'response':
+            continue
+
+        yield client.build_response(
+            request=CrawlRequest(record.target_uri),
+            raw_response=to_httpx_response(record),
+        )
+
+
+def _response_from_row(line: bytes) -> Optional[CrawlResponse]:
+    row = json.loads(line)
+    response = row.get('response')
+    if not isinstance(response, dict):  # Metadata only row, or nothing was received.
+        return None
+
+    request = row['request']
+    return CrawlResponse(
+        request=CrawlRequest(request['url'], method=request.get('method', 'GET')),
+        exception=None,
+        method=response.get('method'),
+        status_code=response.get('status_code'),
+        http_version=response.get('http_version'),
+        headers=response.get('headers') or {},
+        text=response.get('text'),
+        encoding=response.get('encoding') or 'utf-8',
+    )
+
+
+def iter_record_responses(data: bytes, file_format: str,
+                          compression: Optional[str]) -> Iterator[CrawlResponse]:
+    """
+    Rebuilds the `CrawlResponse`s stored in one record of a corpus file.
+    """
+    if compression == 'gzip':
+        data = zlib.decompressobj(wbits=31).decompress(data)
+    elif compression == 'zstd':
+        data = get_zstandard().ZstdDecompressor().decompressobj().decompress(data)
+
+    if file_format == FORMAT_WARC:
+        yield from _responses_from_warc(data)
+        return
+
+    for line in data.splitlines():
+        if line.strip() and (response := _response_from_row(line)):
+            yield response
+
+
+# Every worker process builds its crawler once.
+_worker_crawler: Optional[CrawlerBase] = None
+
+
+def _init_worker(crawler_cls: type[CrawlerBase], crawler_kwargs: dict) -> None:
+    global _worker_crawler
+    _worker_crawler = crawler_cls(**crawler_kwargs)
+
+
+def _run_on_crawled(crawler: CrawlerBase, response: CrawlResponse) -> list:
+    result = crawler.on_crawled(response)
+
+    if inspect.iscoroutine(result):  # AsyncCrawler
+        async def wait():
+            return await result
+
+        result = anyio.run(wait, backend=getattr(crawler, 'backend', 'trio'))
+
+    elif inspect.isasyncgen(result):  # AsyncCrawler yielding items.
+        async def collect():
+            return [item async for item in result]
+
+        result = anyio.run(collect, backend=getattr(crawler, 'backend', 'trio'))
+
+    if result is None:
+        return []
+    if isinstance(result, (str, bytes, dict)) or not hasattr(result, '__iter__'):
+        return [result]
+    return list(result)
+
+
+def _process_batch(path: pathlib.Path, offsets: list[int], lengths: list[int]) -> list:
+    file_format, compression = detect_format(path)
+    results = []
+
+    with _open_map(path) as mm:
+        for offset, length in zip(offsets, lengths):
+            for response in iter_record_responses(mm[offset:offset + length], file_format,
+                                                  compression):
+                results.extend(_run_on_crawled(_worker_crawler, response))
+
+    return results
+
+
+def reprocess(crawler_cls: type[CrawlerBase],
+              *paths: str | pathlib.Path,
+              processes: Optional[int] = None,
+              batch_size: int = 256,
+              crawler_kwargs: Optional[dict] = None) -> Iterator[Any]:
+    """
+    Runs `crawler_cls.on_crawled` over the responses stored in WARC files or `CrawlHistory`
+    JSON Lines dumps, without fetching anything, ie:
+
+        for item in reprocess(MyCrawler, 'crawl-00000.warc.gz', 'crawl-00001.warc.gz'):
+            ...
+
+    Files are indexed and then memory-mapped by every worker of a pool of `processes` (defaults
+    to the number of cores), which get batches of `batch_size` records. `crawler_cls` is
+    instantiated once per worker with `crawler_kwargs`, so it has to be importable (picklable).
+
+    Yields whatever `on_crawled` returns that is not None, iterables (ie: generators) are
+    flattened, in no particular order. Urls added to the queue while reprocessing are not crawled.
+
+    With `processes=0` everything runs in the current process.
+    """
+    crawler_kwargs = crawler_kwargs or {}
+
+    if processes == 0:
+        _init_worker(crawler_cls, crawler_kwargs)
+        for batch in CorpusIndex(*paths).batches(batch_size):
+            yield from _process_batch(*batch)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+            processes, initializer=_init_worker, initargs=(crawler_cls, crawler_kwargs)
+    ) as executor:
+        index = CorpusIndex(*paths, executor=executor)
+        futures = [executor.submit(_process_batch, *batch) for batch in index.batches(batch_size)]
+
+        for future in concurrent.futures.as_completed(futures):
+            yield from future.result()
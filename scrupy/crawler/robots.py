@@ -0,0 +1,293 @@
+import collections
+import logging
+import re
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+import httpx
+
+from scrupy.utils import LazyModule, Url
+
+anyio = LazyModule('anyio')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_ERROR_TTL = 10 * 60
+
+
+def _compile_pattern(pattern: str) -> str:
+    """
+    A robots.txt path pattern as a regex, `*` matches anything and a trailing `$` the end.
+    """
+    anchored = pattern.endswith('$')
+    if anchored:
+        pattern = pattern[:-1]
+    return '.*'.join(map(re.escape, pattern.split('*'))) + ('$' if anchored else '')
+
+
+def user_agent_token(user_agent: str) -> str:
+    """
+    The product token robots.txt groups are matched against, ie: 'Mozilla/5.0 (...)' -> 'mozilla'.
+    """
+    return user_agent.split('/')[0].split()[0].lower() if user_agent.strip() else '*'
+
+
+class RobotsRules:
+    """
+    The rules of a robots.txt for one user agent, compiled.
+
+    The longest matching pattern decides, `Allow` wins ties, like Google and RFC 9309 do. All the
+    `Disallow` patterns are compiled into a single regex, so urls that don't match any of them,
+    most of them, are checked with one regex match.
+    """
+
+    def __init__(self,
+                 rules: Iterable[tuple[bool, str]] = (),
+                 crawl_delay: Optional[float] = None,
+                 sitemaps: Iterable[str] = ()):
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
+
+        # (allow, pattern) longest first, allow first on ties, the first match decides.
+        rules = sorted({(allow, pattern) for allow, pattern in rules if pattern},
+                       key=lambda rule: (-len(rule[1]), not rule[0]))
+        self.rules = [(allow, re.compile(_compile_pattern(pattern))) for allow, pattern in rules]
+
+        disallowed = [_compile_pattern(pattern) for allow, pattern in rules if not allow]
+        self._any_disallowed = re.compile('|'.join(disallowed)) if disallowed else None
+
+    @classmethod
+    def allow_all(cls) -> 'RobotsRules':
+        return cls()
+
+    @classmethod
+    def disallow_all(cls) -> 'RobotsRules':
+        return cls([(False, '/')])
+
+    @classmethod
+    def parse(cls, text: str, user_agent: str = '*') -> 'RobotsRules':
+        """
+        Parses a robots.txt, keeps the groups of `user_agent` or, if there are none, of `*`.
+        """
+        token = user_agent_token(user_agent)
+        groups: dict[str, list] = collections.defaultdict(list)  # agent: [(field, value)]
+        delays: dict[str, float] = {}
+        sitemaps = []
+
+        agents = []
+        in_rules = False
+        for line in text.splitlines():
+            field, _, value = line.partition('#')[0].partition(':')
+            field, value = field.strip().lower(), value.strip()
+
+            if field == 'user-agent':
+                if in_rules:  # A new group starts.
+                    agents, in_rules = [], False
+                agents.append(value.lower())
+
+            elif field in ('allow', 'disallow'):
+                in_rules = True
+                for agent in agents:
+                    groups[agent].append((field == 'allow', value))
+
+            elif field == 'crawl-delay':
+                in_rules = True
+                try:
+                    for agent in agents:
+                        delays[agent] = float(value)
+                except ValueError:
+                    pass
+
+            elif field == 'sitemap' and value:
+                sitemaps.append(value)
+
+        matching = [agent for agent in groups.keys() | delays.keys()
+                    if agent and agent != '*' and token.startswith(agent)] or ['*']
+
+        return cls(
+            rules=[rule for agent in matching for rule in groups.get(agent, ())],
+            crawl_delay=max((delays[agent] for agent in matching if agent in delays), default=None),
+            sitemaps=sitemaps,
+        )
+
+    def allowed(self, path: str) -> bool:
+        """
+        Whether `path` (with the query, ie: '/search?q=1') can be crawled.
+        """
+        if self._any_disallowed is None or not self._any_disallowed.match(path):
+            return True
+
+        if path == '/robots.txt':
+            return True
+
+        for allow, pattern in self.rules:
+            if pattern.match(path):
+                return allow
+        return True
+
+    def allowed_url(self, url: Url) -> bool:
+        parsed = url.url
+        return self.allowed((parsed.path or '/') + (f'?{parsed.query}' if parsed.query else ''))
+
+
+def robots_url(url: Url) -> str:
+    return f'{url.url.scheme}://{url.netloc}/robots.txt'
+
+
+def rules_from_response(status_code: Optional[int], text: str,
+                        user_agent: str) -> tuple[RobotsRules, bool]:
+    """
+    Returns the rules and whether they come from an error. A missing robots.txt (4xx) allows
+    everything, server errors and unreachable hosts disallow everything, for a while.
+    """
+    if status_code is None or status_code >= 500:
+        return RobotsRules.disallow_all(), True
+    if status_code >= 400:
+        return RobotsRules.allow_all(), False
+    return RobotsRules.parse(text, user_agent), False
+
+
+class RobotsCacheBase:
+    """
+    robots.txt rules by host, kept `ttl` seconds (`error_ttl` when it could not be fetched) for
+    at most `max_hosts` hosts, the least recently used ones are dropped first.
+    """
+
+    def __init__(self,
+                 user_agent: str = 'scrupy',
+                 ttl: float = DEFAULT_TTL,
+                 error_ttl: float = DEFAULT_ERROR_TTL,
+                 max_hosts: int = 10_000,
+                 timeout: float = 10,
+                 clock: Callable[[], float] = time.monotonic):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_hosts = max_hosts
+        self.timeout = timeout
+        self.clock = clock
+
+        self.fetches = 0
+        self._cache: collections.OrderedDict[str, tuple[RobotsRules, float]] = \
+            collections.OrderedDict()
+
+    def _cached(self, host: str) -> Optional[RobotsRules]:
+        entry = self._cache.get(host)
+        if entry is None:
+            return None
+
+        rules, expires = entry
+        if expires <= self.clock():
+            del self._cache[host]
+            return None
+
+        self._cache.move_to_end(host)
+        return rules
+
+    def _store(self, host: str, rules: RobotsRules, is_error: bool) -> None:
+        self._cache[host] = (rules, self.clock() + (self.error_ttl if is_error else self.ttl))
+        self._cache.move_to_end(host)
+        while len(self._cache) > self.max_hosts:
+            self._cache.popitem(last=False)
+
+    def _headers(self) -> dict:
+        return {'User-Agent': self.user_agent}
+
+    def __len__(self):
+        return len(self._cache)
+
+
+class RobotsCache(RobotsCacheBase):
+    """
+    Fetches robots.txt files, once per host even if many threads ask for the same host at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self._fetching: dict[str, threading.Event] = {}
+
+    def fetch(self, url: str) -> tuple[Optional[int], str]:
+        try:
+            with httpx.Client(follow_redirects=True, timeout=self.timeout) as client:
+                response = client.get(url, headers=self._headers())
+            return response.status_code, response.text
+        except httpx.HTTPError as e:
+            logger.debug(f'Could not fetch {url}: {e!r}')
+            return None, ''
+
+    def get(self, url: Url) -> RobotsRules:
+        host = url.netloc
+
+        with self._lock:
+            if (rules := self._cached(host)) is not None:
+                return rules
+
+            fetching = self._fetching.get(host)
+            if fetching is None:
+                self._fetching[host] = threading.Event()
+
+        if fetching is not None:  # Someone else is fetching it.
+            fetching.wait()
+            return self.get(url)
+
+        rules, is_error = RobotsRules.disallow_all(), True
+        try:
+            self.fetches += 1
+            rules, is_error = rules_from_response(*self.fetch(robots_url(url)), self.user_agent)
+        finally:
+            with self._lock:
+                self._store(host, rules, is_error)
+                self._fetching.pop(host).set()
+
+        return rules
+
+    def allowed(self, url: Url) -> bool:
+        return self.get(url).allowed_url(url)
+
+
+class AsyncRobotsCache(RobotsCacheBase):
+    """
+    Fetches robots.txt files, once per host even if many tasks ask for the same host at once.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fetching: dict[str, 'anyio.Event'] = {}
+
+    async def fetch(self, url: str) -> tuple[Optional[int], str]:
+        try:
+            async with httpx.AsyncClient(follow_redirects=True, timeout=self.timeout) as client:
+                response = await client.get(url, headers=self._headers())
+            return response.status_code, response.text
+        except httpx.HTTPError as e:
+            logger.debug(f'Could not fetch {url}: {e!r}')
+            return None, ''
+
+    async def get(self, url: Url) -> RobotsRules:
+        host = url.netloc
+
+        # No checkpoints until the fetch is registered, tasks cannot interleave.
+        if (rules := self._cached(host)) is not None:
+            return rules
+
+        if (fetching := self._fetching.get(host)) is not None:
+            await fetching.wait()
+            return await self.get(url)
+
+        self._fetching[host] = anyio.Event()
+        rules, is_error = RobotsRules.disallow_all(), True
+        try:
+            self.fetches += 1
+            rules, is_error = rules_from_response(*await self.fetch(robots_url(url)),
+                                                  self.user_agent)
+        finally:
+            self._store(host, rules, is_error)
+            self._fetching.pop(host).set()
+
+        return rules
+
+    async def allowed(self, url: Url) -> bool:
+        return (await self.get(url)).allowed_url(url)
@@ -0,0 +1,151 @@
+import re
+from typing import Iterable, Optional
+
+from scrupy import CrawlRequest
+
+# Files that are not worth following from html pages.
+DEFAULT_DENY_EXTENSIONS = (
+    '7z', 'apk', 'avi', 'bin', 'bmp', 'css', 'dmg', 'doc', 'docx', 'exe', 'flac', 'gif', 'gz',
+    'ico', 'iso', 'jpeg', 'jpg', 'js', 'm4a', 'mkv', 'mov', 'mp3', 'mp4', 'mpeg', 'msi', 'ogg',
+    'pdf', 'png', 'ppt', 'pptx', 'rar', 'svg', 'tar', 'tif', 'tiff', 'wav', 'webm', 'webp',
+    'woff', 'woff2', 'xls', 'xlsx', 'zip',
+)
+
+# Host and path of a url, one regex match is several times faster than `urllib.parse.urlsplit`.
+_HOST_AND_PATH = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?(\[[^]/?#]*]|[^:/?#]*)'
+                            r'[^/?#]*([^?#]*)')
+
+_END = object()  # Marks the end of a domain in a `DomainTrie`.
+
+
+class DomainTrie:
+    """
+    Domains and their subdomains, by label from the tld, ie: 'example.com' matches 'example.com'
+    and 'www.example.com' but not 'badexample.com'.
+    """
+
+    def __init__(self, domains: Iterable[str] = ()):
+        self.root: dict = {}
+        self.size = 0
+        for domain in domains:
+            self.add(domain)
+
+    def add(self, domain: str) -> None:
+        node = self.root
+        for label in reversed(domain.lower().strip('.').split('.')):
+            node = node.setdefault(label, {})
+        if _END not in node:
+            node[_END] = True
+            self.size += 1
+
+    def match(self, host: str) -> bool:
+        node = self.root
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def __len__(self):
+        return self.size
+
+
+def _alternation(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    patterns = [f'(?:{pattern})' for pattern in patterns]
+    return re.compile('|'.join(patterns)) if patterns else None
+
+
+class UrlRules:
+    """
+    Which urls to follow, checked in `add_to_queue` on the url strings, before any `CrawlRequest`
+    is built, ie:
+
+        Crawler(rules=UrlRules(allow_domains=['example.com'], deny_paths=['/login'], max_depth=3))
+
+    A url is followed when its host is in (or a subdomain of) `allow_domains`, if any, and not in
+    `deny_domains`, its path starts with one of `allow_paths` or the url matches one of
+    `allow_patterns` (regexes), if any of them is given, its path does not start with one of
+    `deny_paths`, end with one of `deny_extensions` or the url match one of `deny_patterns`, and
+    it is at most `max_depth` links away from the start urls.
+
+    Domains are matched with a `DomainTrie`, and the paths and patterns with one regex each, a url
+    costs the same however many rules there are.
+    """
+
+    def __init__(self,
+                 allow_domains: Iterable[str] = (),
+                 deny_domains: Iterable[str] = (),
+                 allow_paths: Iterable[str] = (),
+                 deny_paths: Iterable[str] = (),
+                 allow_patterns: Iterable[str] = (),
+                 deny_patterns: Iterable[str] = (),
+                 deny_extensions: Iterable[str] = DEFAULT_DENY_EXTENSIONS,
+                 max_depth: Optional[int] = None):
+        self.allow_domains = DomainTrie(allow_domains)
+        self.deny_domains = DomainTrie(deny_domains)
+        self.max_depth = max_depth
+
+        extensions = [re.escape(extension.lower().lstrip('.')) for extension in deny_extensions]
+        self._allow_path = _alternation(re.escape(path) for path in allow_paths)
+        self._allow_url = _alternation(allow_patterns)
+        self._deny_path = _alternation([
+            *(re.escape(path) for path in deny_paths),
+            *([rf'.*\.(?i:{"|".join(extensions)})$'] if extensions else []),
+        ])
+        self._deny_url = _alternation(deny_patterns)
+        self._allow_any = self._allow_path is not None or self._allow_url is not None
+
+        # Urls rejected so far.
+        self.rejected = 0
+
+    def allowed(self, url: str, depth: int = 0) -> bool:
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+
+        match = _HOST_AND_PATH.match(url)
+        if match is None:
+            return False
+
+        host, path = match.groups()
+        host = host.lower().rstrip('.')
+
+        if self.allow_domains and not self.allow_domains.match(host):
+            return False
+        if self.deny_domains and self.deny_domains.match(host):
+            return False
+
+        path = path or '/'
+        if self._deny_path is not None and self._deny_path.match(path):
+            return False
+        if self._deny_url is not None and self._deny_url.search(url):
+            return False
+
+        if self._allow_any:
+            return bool(
+                (self._allow_path is not None and self._allow_path.match(path))
+                or (self._allow_url is not None and self._allow_url.search(url))
+            )
+        return True
+
+    def filter(self, urls: Iterable[str | CrawlRequest],
+               depth: int = 0) -> list[str | CrawlRequest]:
+        """
+        The urls (or requests) of `urls` that are allowed, `depth` links away from the start urls.
+        """
+        urls = list(urls)
+        too_deep = self.max_depth is not None and depth > self.max_depth
+
+        allowed = []
+        for url in urls:
+            if isinstance(url, str):
+                if not too_deep and self.allowed(url, depth):
+                    allowed.append(url)
+
+            # Requests that have their own depth are checked at it.
+            elif self.allowed(str(url.url), url.depth if url.depth is not None else depth):
+                allowed.append(url)
+
+        self.rejected += len(urls) - len(allowed)
+        return allowed
@@ -0,0 +1,189 @@
+import collections
+import logging
+import xml.etree.ElementTree as ElementTree
+import zlib
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+import httpx
+
+from scrupy import CrawlRequest
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_URL = 'url'
+SITEMAP_INDEX = 'sitemap'
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class SitemapParser:
+    """
+    Incremental parser of sitemaps and sitemap indexes, plain or gzipped, fed by chunks, ie:
+
+        parser = SitemapParser()
+        for chunk in chunks:
+            for kind, entry in parser.feed(chunk):
+                ...  # ('url', {'loc': ..., 'lastmod': ..., 'priority': 0.8, 'changefreq': ...})
+        parser.close()
+
+    Entries are dropped from the tree once parsed, memory does not grow with the sitemap.
+    """
+
+    def __init__(self):
+        self._parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        self._root = None
+        self._decompressor = None
+        self._sniffed = b''
+
+    def _decompress(self, chunk: bytes) -> bytes:
+        if self._decompressor is None:
+            # Gzipped sitemaps are detected by their first bytes, whatever their content-type.
+            self._sniffed += chunk
+            if len(self._sniffed) < len(GZIP_MAGIC):
+                return b''
+            chunk, self._sniffed = self._sniffed, b''
+            self._decompressor = zlib.decompressobj(wbits=47) if chunk.startswith(
+                GZIP_MAGIC) else False
+
+        return self._decompressor.decompress(chunk) if self._decompressor else chunk
+
+    def _entries(self) -> list[tuple[str, dict]]:
+        entries = []
+        for event, element in self._parser.read_events():
+            if self._root is None:
+                self._root = element
+                continue
+
+            if event != 'end':
+                continue
+
+            kind = element.tag.rpartition('}')[2]
+            if kind not in (SITEMAP_URL, SITEMAP_INDEX):
+                continue
+
+            entry = {child.tag.rpartition('}')[2]: (child.text or '').strip() for child in element}
+            if entry.get('loc'):
+                if 'priority' in entry:
+                    try:
+                        entry['priority'] = float(entry['priority'])
+                    except ValueError:
+                        del entry['priority']
+                entries.append((kind, entry))
+
+            self._root.clear()  # Parsed, keeps the tree empty.
+        return entries
+
+    def feed(self, chunk: bytes) -> list[tuple[str, dict]]:
+        self._parser.feed(self._decompress(chunk))
+        return self._entries()
+
+    def close(self) -> list[tuple[str, dict]]:
+        if self._sniffed:
+            self._parser.feed(self._sniffed)
+        self._parser.close()
+        return self._entries()
+
+
+class SitemapSourceBase:
+    """
+    Crawl requests from sitemaps, sitemap indexes are followed up to `max_depth` levels deep.
+
+    Sitemaps are streamed and parsed as they arrive, pass it as `start_urls` to seed a crawl,
+    requests are taken as the frontier has room for them. Every request has the `lastmod`,
+    `priority` and `changefreq` of its entry, when given, and the `sitemap` it comes from in
+    its `meta`.
+    """
+
+    def __init__(self,
+                 *urls: str,
+                 follow_indexes: bool = True,
+                 max_depth: int = 5,
+                 headers: Optional[dict] = None,
+                 timeout: float = 30,
+                 chunk_size: int = 64 * 1024):
+        self.urls = urls
+        self.follow_indexes = follow_indexes
+        self.max_depth = max_depth
+        self.headers = headers or {}
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+
+    def _client_options(self) -> dict:
+        return {'follow_redirects': True, 'timeout': self.timeout, 'headers': self.headers}
+
+    def _requests(self, entries: Iterable[tuple[str, dict]], sitemap: str, depth: int,
+                  pending: collections.deque) -> Iterator[CrawlRequest]:
+        for kind, entry in entries:
+            if kind == SITEMAP_INDEX:
+                if self.follow_indexes and depth < self.max_depth:
+                    pending.append((entry['loc'], depth + 1))
+                continue
+
+            meta = {k: v for k, v in entry.items() if k != 'loc'}
+            meta['sitemap'] = sitemap
+            try:
+                yield CrawlRequest(entry['loc'], meta=meta)
+            except ValueError as e:
+                logger.debug(f'Skipping {entry["loc"]!r} of {sitemap}: {e}')
+
+    @staticmethod
+    def _failed(sitemap: str, response: httpx.Response) -> bool:
+        if response.status_code >= 400:
+            logger.warning(f'Could not fetch sitemap {sitemap}: {response.status_code}')
+            return True
+        return False
+
+
+class SitemapSource(SitemapSourceBase):
+    def __iter__(self) -> Iterator[CrawlRequest]:
+        pending = collections.deque((url, 0) for url in self.urls)
+        seen = set()
+
+        with httpx.Client(**self._client_options()) as client:
+            while pending:
+                sitemap, depth = pending.popleft()
+                if sitemap in seen:
+                    continue
+                seen.add(sitemap)
+
+                try:
+                    with client.stream('GET', sitemap) as response:
+                        if self._failed(sitemap, response):
+                            continue
+
+                        parser = SitemapParser()
+                        for chunk in response.iter_bytes(self.chunk_size):
+                            yield from self._requests(parser.feed(chunk), sitemap, depth, pending)
+                        yield from self._requests(parser.close(), sitemap, depth, pending)
+
+                except (httpx.HTTPError, ElementTree.ParseError, zlib.error) as e:
+                    logger.warning(f'Could not read sitemap {sitemap}: {e!r}')
+
+
+class AsyncSitemapSource(SitemapSourceBase):
+    async def __aiter__(self) -> AsyncIterator[CrawlRequest]:
+        pending = collections.deque((url, 0) for url in self.urls)
+        seen = set()
+
+        async with httpx.AsyncClient(**self._client_options()) as client:
+            while pending:
+                sitemap, depth = pending.popleft()
+                if sitemap in seen:
+                    continue
+                seen.add(sitemap)
+
+                try:
+                    async with client.stream('GET', sitemap) as response:
+                        if self._failed(sitemap, response):
+                            continue
+
+                        parser = SitemapParser()
+                        async for chunk in response.aiter_bytes(self.chunk_size):
+                            for request in self._requests(parser.feed(chunk), sitemap, depth,
+                                                          pending):
+                                yield request
+                        for request in self._requests(parser.close(), sitemap, depth, pending):
+                            yield request
+
+                except (httpx.HTTPError, ElementTree.ParseError, zlib.error) as e:
+                    logger.warning(f'Could not read sitemap {sitemap}: {e!r}')
@@ -0,0 +1,367 @@
+import base64
+import dataclasses
+import datetime
+import gzip
+import hashlib
+import logging
+import pathlib
+import uuid
+import zlib
+from typing import Iterator, Optional
+
+import httpx
+
+from scrupy import CrawlRequest
+from scrupy.crawler.clients import AsyncHttpxClient, HttpxClient
+from scrupy.request import CrawlResponse
+
+logger = logging.getLogger(__name__)
+
+WARC_VERSION = b'WARC/1.1'
+
+# httpx gives us the decoded body, these headers would describe the original encoded one.
+SKIPPED_RESPONSE_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+class ReplayMissError(Exception):
+    """
+    Raised when a request is not found in the WARC files being replayed.
+    """
+
+
+@dataclasses.dataclass
+class WarcRecord:
+    headers: dict[str, str]
+    block: bytes
+    path: Optional[pathlib.Path] = None
+    offset: int = 0
+
+    @property
+    def type(self) -> str:
+        return self.headers.get('WARC-Type')
+
+    @property
+    def target_uri(self) -> str:
+        return self.headers.get('WARC-Target-URI')
+
+
+def _warc_date(when: Optional[datetime.datetime] = None) -> str:
+    when = when or datetime.datetime.now(datetime.timezone.utc)
+    return when.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _record_id() -> str:
+    return f'<urn:uuid:{uuid.uuid4()}>'
+
+
+def _payload_digest(payload: bytes) -> str:
+    return 'sha1:' + base64.b32encode(hashlib.sha1(payload).digest()).decode()
+
+
+def _http_headers(headers) -> bytes:
+    return b''.join(f'{k}: {v}\r\n'.encode('latin-1', errors='replace') for k, v in headers)
+
+
+def serialize_record(headers: dict[str, str], block: bytes) -> bytes:
+    headers = {**headers, 'Content-Length': str(len(block))}
+    return (WARC_VERSION + b'\r\n' + _http_headers(headers.items()) + b'\r\n'
+            + block + b'\r\n\r\n')
+
+
+def _split_header(line: str) -> tuple[str, str]:
+    # The space after the colon is optional.
+    name, _, value = line.partition(':')
+    return name.strip(), value.strip()
+
+
+def parse_record(data: bytes, start: int = 0) -> tuple[WarcRecord, int]:
+    """
+    Parses the record that starts at `start` of `data`, returns it and where the next one starts.
+    """
+    header_end = data.index(b'\r\n\r\n', start)
+    version, *lines = data[start:header_end].decode('utf-8').split('\r\n')
+
+    if not version.startswith('WARC/'):
+        raise ValueError(f'Not a WARC record, got {version!r}')
+
+    headers = dict(map(_split_header, lines))
+    block_start = header_end + 4
+    block_end = block_start + int(headers['Content-Length'])
+
+    return WarcRecord(headers, data[block_start:block_end]), block_end + 4
+
+
+def parse_http_response(block: bytes) -> tuple[str, int, list[tuple[str, str]], bytes]:
+    """
+    Parses a `application/http;msgtype=response` block into
+    (http_version, status_code, headers, body).
+    """
+    head, _, body = block.partition(b'\r\n\r\n')
+    status_line, *lines = head.decode('latin-1').split('\r\n')
+    http_version, status_code, *_ = status_line.split(' ', 2)
+    headers = [_split_header(line) for line in lines if line]
+    return http_version, int(status_code), headers, body
+
+
+def _iter_gzip_members(f, chunk_size: int = 1 << 16) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields (offset, decompressed data) of every gzip member of `f`, without reading the
+    whole file in memory.
+    """
+    offset = 0
+    pending = b''
+
+    while True:
+        if not pending:
+            pending = f.read(chunk_size)
+            if not pending:
+                return
+
+        start = offset
+        decompressor = zlib.decompressobj(wbits=31)
+        chunks = []
+
+        while not decompressor.eof:
+            if not pending:
+                pending = f.read(chunk_size)
+                if not pending:
+                    raise EOFError(f'Truncated gzip member at offset {start}')
+
+            chunks.append(decompressor.decompress(pending))
+            offset += len(pending) - len(decompressor.unused_data)
+            pending = decompressor.unused_data
+
+        yield start, b''.join(chunks)
+
+
+def _iter_plain_records(f) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields (offset, raw record) of every record of an uncompressed WARC file.
+    """
+    while True:
+        offset = f.tell()
+        head = []
+
+        while (line := f.readline()) not in (b'\r\n', b''):
+            head.append(line)
+
+        if not head:
+            return
+
+        length = next(
+            int(h.split(b':', 1)[1]) for h in head if h.lower().startswith(b'content-length:')
+        )
+        yield offset, b''.join(head) + b'\r\n' + f.read(length + 4)
+
+
+def iter_warc_records(path: str | pathlib.Path) -> Iterator[WarcRecord]:
+    """
+    Iterates over the records of a, optionally gzipped, WARC file.
+    """
+    path = pathlib.Path(path)
+
+    with open(path, 'rb') as f:
+        chunks = _iter_gzip_members(f) if path.suffix == '.gz' else _iter_plain_records(f)
+
+        for offset, data in chunks:
+            start = 0
+            while start < len(data):
+                record, start = parse_record(data, start)
+                record.path, record.offset = path, offset
+                yield record
+
+
+def read_warc_record(path: str | pathlib.Path, offset: int) -> WarcRecord:
+    """
+    Reads the record that starts at `offset` of the given WARC file.
+    """
+    path = pathlib.Path(path)
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        reader = _iter_gzip_members(f) if path.suffix == '.gz' else _iter_plain_records(f)
+        _, data = next(reader)
+
+    record, _ = parse_record(data)
+    record.path, record.offset = path, offset
+    return record
+
+
+class WarcWriter:
+    """
+    Streaming WARC writer, writes a `request` and a `response` record for every `CrawlResponse`
+    it's given, as soon as it's given. Pass it as the `recorder` of a crawler.
+
+    With `compress=True` (the default if `path` ends with `.gz`) every record is its own gzip
+    member, as usual in `.warc.gz` files, so records can be read individually.
+
+    Bodies are stored decoded, as given by httpx, `Content-Encoding` and `Transfer-Encoding` are
+    dropped from the recorded headers and `Content-Length` is set to the decoded length.
+
+        with WarcWriter('crawl.warc.gz') as recorder:
+            Crawler(start_urls=urls, recorder=recorder).run()
+    """
+
+    def __init__(self, path: str | pathlib.Path, compress: Optional[bool] = None):
+        self.path = pathlib.Path(path)
+        self.compress = self.path.suffix == '.gz' if compress is None else compress
+        self._file = open(self.path, 'ab')
+
+        if not self._file.tell():
+            self._write_warcinfo()
+
+    def _write(self, headers: dict[str, str], block: bytes) -> None:
+        data = serialize_record(headers, block)
+        if self.compress:
+            data = gzip.compress(data)
+        self._file.write(data)
+
+    def _write_warcinfo(self) -> None:
+        self._write({
+            'WARC-Type': 'warcinfo',
+            'WARC-Record-ID': _record_id(),
+            'WARC-Date': _warc_date(),
+            'WARC-Filename': self.path.name,
+            'Content-Type': 'application/warc-fields',
+        }, b'software: scrupy\r\nformat: WARC File Format 1.1\r\n')
+
+    def record(self, response: CrawlResponse) -> None:
+        raw_response = response.raw_response
+        if not isinstance(raw_response, httpx.Response):
+            # Nothing was received (ie: connection errors), there is nothing to replay.
+            return
+
+        url = str(response.request.url)
+        date = _warc_date()
+        response_id = _record_id()
+
+        body = raw_response.content
+        # Repeated headers, ie: Set-Cookie, are recorded one by one, as they were received.
+        headers = [(k, v) for k, v in raw_response.headers.multi_items()
+                   if k.lower() not in SKIPPED_RESPONSE_HEADERS]
+        headers.append(('Content-Length', str(len(body))))
+        status_line = (f'{raw_response.http_version} {raw_response.status_code}'
+                       f' {raw_response.reason_phrase}\r\n')
+
+        self._write({
+            'WARC-Type': 'response',
+            'WARC-Record-ID': response_id,
+            'WARC-Date': date,
+            'WARC-Target-URI': url,
+            'WARC-Payload-Digest': _payload_digest(body),
+            'Content-Type': 'application/http;msgtype=response',
+        }, status_line.encode('latin-1') + _http_headers(headers) + b'\r\n' + body)
+
+        raw_request = raw_response.request
+        request_line = (f'{raw_request.method} {raw_request.url.raw_path.decode()}'
+                        f' {raw_response.http_version}\r\n')
+        self._write({
+            'WARC-Type': 'request',
+            'WARC-Record-ID': _record_id(),
+            'WARC-Date': date,
+            'WARC-Target-URI': url,
+            'WARC-Concurrent-To': response_id,
+            'Content-Type': 'application/http;msgtype=request',
+        }, request_line.encode('latin-1') + _http_headers(raw_request.headers.multi_items())
+           + b'\r\n' + raw_request.content)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class WarcIndex:
+    """
+    Index of the `response` records of one or more WARC files, by url. Only the location of every
+    record is kept in memory, records are read from disk when they are requested.
+
+    If a url was recorded more than once, the last one is used.
+    """
+
+    def __init__(self, *paths: str | pathlib.Path):
+        self.paths = [pathlib.Path(path) for path in paths]
+        self.index: dict[str, tuple[pathlib.Path, int]] = {}
+
+        for path in self.paths:
+            for record in iter_warc_records(path):
+                if record.type == 'response':
+                    self.index[record.target_uri] = (record.path, record.offset)
+
+        logger.debug(f'Indexed {len(self.index)} responses from {len(self.paths)} WARC files')
+
+    def get(self, url: str) -> WarcRecord:
+        try:
+            path, offset = self.index[url]
+        except KeyError:
+            raise ReplayMissError(f'{url} was not recorded')
+        return read_warc_record(path, offset)
+
+    def __contains__(self, url: str):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+
+def to_httpx_response(record: WarcRecord, method: str = 'GET') -> httpx.Response:
+    """
+    Builds an `httpx.Response` from a `response` record.
+    """
+    http_version, status_code, headers, body = parse_http_response(record.block)
+
+    return httpx.Response(
+        status_code,
+        headers=headers,
+        content=body,
+        request=httpx.Request(method, record.target_uri),
+        extensions={'http_version': http_version.encode()},
+    )
+
+
+def replay_response(index: WarcIndex, request: CrawlRequest) -> httpx.Response:
+    """
+    Builds the `httpx.Response` that was recorded for `request`.
+    """
+    return to_httpx_response(index.get(str(request.url)), method=request.method)
+
+
+class WarcReplayClient(HttpxClient):
+    """
+    Serves responses from WARC files instead of the network, pass it as the `crawl_client` of
+    a `Crawler`. Requests that were not recorded end up with a `ReplayMissError` exception.
+
+        index = WarcIndex('crawl.warc.gz')
+        Crawler(start_urls=urls, crawl_client=WarcReplayClient(index)).run()
+    """
+
+    def __init__(self, index: WarcIndex):
+        self.index = index
+
+    def run_request(self, request: CrawlRequest, client=None) -> httpx.Response:
+        return replay_response(self.index, request)
+
+    def get_new_client(self):
+        return None
+
+
+class AsyncWarcReplayClient(AsyncHttpxClient):
+    """
+    `WarcReplayClient` for `AsyncCrawler`.
+    """
+
+    def __init__(self, index: WarcIndex):
+        self.index = index
+
+    async def run_request(self, request: CrawlRequest, client=None) -> httpx.Response:
+        return replay_response(self.index, request)
+
+    def get_new_client(self):
+        return None
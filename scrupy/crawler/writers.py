@@ -0,0 +1,233 @@
+import gzip
+import io
+import json
+import logging
+import pathlib
+import queue
+import threading
+import time
+from typing import Iterator, Optional
+
+from scrupy.utils import LazyModule
+
+zstandard = LazyModule('zstandard')
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_SUFFIXES = {
+    None: '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+def get_zstandard():
+    try:
+        zstandard.load()
+    except ImportError:
+        raise Exception('zstandard is not installed, install it with `pip install zstandard`')
+    return zstandard
+
+
+def compress(data: bytes, compression: Optional[str]) -> bytes:
+    """
+    Compresses `data` as a complete gzip member/zstd frame, they can be concatenated and
+    still be a valid gzip/zstd stream, so every flush leaves a readable file behind.
+    """
+    if compression == 'gzip':
+        return gzip.compress(data, compresslevel=6)
+    if compression == 'zstd':
+        return get_zstandard().ZstdCompressor().compress(data)
+    return data
+
+
+def decompress_stream(path: pathlib.Path):
+    """
+    Opens `path` for binary reading, transparently decompressing it based on its suffix.
+    """
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+    if path.suffix == '.zst':
+        return io.BufferedReader(get_zstandard().ZstdDecompressor().stream_reader(
+            open(path, 'rb'), read_across_frames=True, closefd=True
+        ))
+    return open(path, 'rb')
+
+
+def iter_json_lines(*paths: str | pathlib.Path) -> Iterator[dict]:
+    """
+    Iterates over the objects of one or more, optionally compressed, JSON Lines files, ie: the
+    files written by a `JsonLinesWriter`.
+    """
+    for path in paths:
+        with decompress_stream(pathlib.Path(path)) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class JsonLinesWriter:
+    """
+    Append-only JSON Lines writer.
+
+    Objects are buffered in memory and handed over to a background thread once `buffer_size`
+    bytes are buffered or every `flush_interval` seconds, whatever happens first. If the disk
+    can't keep up, `write` blocks once `max_pending_buffers` buffers are waiting, so memory
+    is bounded.
+
+    Every flush is written as a complete gzip member/zstd frame when `compression` is set, so a
+    crash only loses what was not flushed yet.
+
+    If writing fails, ie: the disk is full, the first error is raised by the next `write`,
+    `flush` or `close`.
+
+    If `max_file_size` (in bytes, after compression) is given, files are rotated
+    and numbered: `history-00000.jsonl.gz`, `history-00001.jsonl.gz`...
+    """
+    _stop = object()
+
+    def __init__(self,
+                 path: str | pathlib.Path,
+                 compression: Optional[str] = None,
+                 buffer_size: int = 1024 * 1024,
+                 flush_interval: float = 1.0,
+                 max_file_size: Optional[int] = None,
+                 max_pending_buffers: int = 8):
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f'Unknown compression {compression!r}, '
+                             f'expected one of {tuple(COMPRESSION_SUFFIXES)}')
+
+        if compression == 'zstd':
+            get_zstandard()  # Fail early rather than in the background thread.
+
+        self.path = pathlib.Path(path)
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.max_file_size = max_file_size
+
+        self.paths: list[pathlib.Path] = []
+        self._file = None
+        self._file_size = 0
+
+        self._lock = threading.Lock()
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+
+        self._pending = queue.Queue(maxsize=max_pending_buffers)
+        self._closed = False
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(target=self._run, name='JsonLinesWriter', daemon=True)
+        self._thread.start()
+
+    def _next_path(self) -> pathlib.Path:
+        suffix = COMPRESSION_SUFFIXES[self.compression]
+        path = self.path.with_name(self.path.name.removesuffix(suffix))
+
+        if self.max_file_size is not None:
+            name = path.name.removesuffix(path.suffix)
+            path = path.with_name(f'{name}-{len(self.paths):05d}{path.suffix}')
+
+        return path.with_name(path.name + suffix)
+
+    def _write_to_file(self, data: bytes) -> None:
+        if self._file is None or (self.max_file_size and self._file_size >= self.max_file_size):
+            if self._file is not None:
+                self._file.close()
+
+            path = self._next_path()
+            self.paths.append(path)
+            self._file = open(path, 'ab')
+            self._file_size = self._file.tell()
+
+        data = compress(data, self.compression)
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+
+    def _take_buffer(self) -> Optional[bytes]:
+        with self._lock:
+            if not self._buffer:
+                return None
+            data = b''.join(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+        return data
+
+    def _write(self, data: Optional[bytes]) -> None:
+        if not data:
+            return
+        try:
+            self._write_to_file(data)
+        except Exception as e:
+            logger.exception(f'Could not write to {self.path}')
+            self._error = self._error or e
+
+    def _run(self) -> None:
+        # The buffer is flushed every `flush_interval`, even while full buffers keep arriving.
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                data = self._pending.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                data = None
+
+            if data is self._stop:
+                break
+            self._write(data)
+
+            if time.monotonic() >= deadline:
+                self._write(self._take_buffer())
+                deadline = time.monotonic() + self.flush_interval
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def write(self, obj) -> None:
+        if self._closed:
+            raise ValueError('Cannot write to a closed writer')
+        self._raise_error()
+
+        line = json.dumps(obj, default=str).encode() + b'\n'
+
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered += len(line)
+            full = self._buffered >= self.buffer_size
+
+        if full and (data := self._take_buffer()):
+            self._pending.put(data)
+
+    def flush(self) -> None:
+        """
+        Hands the current buffer over to the background thread.
+        """
+        self._raise_error()
+        if data := self._take_buffer():
+            self._pending.put(data)
+
+    def close(self) -> None:
+        """
+        Flushes everything that is buffered and waits for it to be written.
+        """
+        if self._closed:
+            return
+
+        if data := self._take_buffer():
+            self._pending.put(data)
+        self._closed = True
+        self._pending.put(self._stop)
+        self._thread.join()
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
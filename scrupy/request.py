@@ -1,17 +1,61 @@
-import dataclasses
+import functools
 import json
+import time
+from collections.abc import Iterable
 from typing import Optional, Union
 
-from .typing import SECONDS
-from .utils import NOTSET, Url
+from .utils import NOTSET, LazyModule, Url
 from .mixins import HTTPSettingAwareMixin
 
+selectolax_parser = LazyModule('selectolax.parser')
+
+
+class RequestTimings:
+    """
+    Where the time of a request went, in seconds, None if it's not known or didn't happen, ie:
+    `tls` for plain http or `connect` when a pooled connection is reused.
+
+     - queue_wait: from being added to the queue to the start of the crawl.
+     - dns: resolving the host, httpx doesn't report it separately, it's part of `connect`.
+     - connect: opening the TCP connection.
+     - tls: the TLS handshake.
+     - ttfb: from sending the request to receiving the response headers.
+     - download: receiving the response body.
+     - total: the whole request, from the client's point of view.
+     - hooks: the user hooks (`on_before_crawl`, `on_crawled`...) of this request.
+     - processing: the crawler's own work on the response, ie: near-duplicate detection.
+
+    Redirects add up.
+    """
+    __slots__ = ('queue_wait', 'dns', 'connect', 'tls', 'ttfb', 'download', 'total', 'hooks',
+                 'processing')
+
+    def __init__(self, **timings: Optional[float]):
+        for attr in self.__slots__:
+            setattr(self, attr, timings.get(attr))
+
+    def add(self, attr: str, seconds: float) -> None:
+        setattr(self, attr, (getattr(self, attr) or 0) + seconds)
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        timings = ', '.join(
+            f'{k}={v * 1000:.1f}ms' for k, v in self.as_dict().items() if v is not None
+        )
+        return f'{self.__class__.__name__}({timings})'
+
 
 class CrawlRequest(HTTPSettingAwareMixin):
     """
     Represents a CrawlRequest
     """
-    __slots__ = ('url', 'method', 'headers', '_user_agent', 'cookies', 'type')
+    __slots__ = ('url', 'method', 'headers', '_user_agent', 'cookies', 'type', 'meta', 'depth',
+                 'parent', 'priority', 'queued_at', 'timings')
+
+    # Bookkeeping of the crawl, not part of the request itself.
+    __runtime_attrs__ = ('priority', 'queued_at', 'timings')
 
     def __init__(self,
                  url: str,
@@ -20,7 +64,10 @@ class CrawlRequest(HTTPSettingAwareMixin):
                  follow_redirects: bool = True,
                  user_agent: Union[str, NOTSET] = NOTSET,
                  cookies: Union[dict, NOTSET] = NOTSET,
-                 type: str = 'httpx'):
+                 type: str = 'httpx',
+                 meta: Optional[dict] = None,
+                 depth: Optional[int] = None,
+                 parent: Optional[str] = None):
         self.url: Url = Url(url)
         self.method = method
         self.headers = headers or {}
@@ -29,6 +76,20 @@ class CrawlRequest(HTTPSettingAwareMixin):
         self.cookies = cookies
         self.type = type
 
+        # Anything about the request that is not sent, ie: the `lastmod` of its sitemap entry.
+        self.meta = meta if meta is not None else {}
+
+        # Links away from the start urls, and the url of the page it was found in. If the depth is
+        # not given `add_to_queue` sets it, and the parent too unless it is given.
+        self.depth = depth
+        self.parent = parent
+
+        # Higher is crawled first by a prioritized frontier, ie: the score in a `LinkGraph`.
+        self.priority: float = 0.
+
+        self.queued_at: float = time.perf_counter()
+        self.timings: Optional[RequestTimings] = None
+
     @property
     def user_agent(self):
         return self._user_agent
@@ -38,7 +99,7 @@ class CrawlRequest(HTTPSettingAwareMixin):
         self.headers['User-Agent'] = value
 
     def as_dict(self):
-        return {k: getattr(self, k) for k in self.__slots__}
+        return {k: getattr(self, k) for k in self.__slots__ if k not in self.__runtime_attrs__}
 
     def __str__(self):
         return f'{self.__class__.__name__}(user_agent={self.user_agent})'
@@ -46,29 +107,37 @@ class CrawlRequest(HTTPSettingAwareMixin):
 
 class HtmlParser:
     def __init__(self, html: str, text: str, tag: str = 'doctype',
-                 attributes: Optional[dict] = None):
+                 attributes: Optional[dict] = None, links_dropped: bool = False):
         self.html = html
         self.text = text
         self.tag = tag
 
+        # The page is a near-duplicate whose links should not be followed, `links` is empty.
+        self.links_dropped = links_dropped
+
         self.attributes = attributes
         if not self.attributes:
             self.attributes = {}
 
     def selectolax(self):
+        return self._tree
+
+    @functools.cached_property
+    def _tree(self):
+        # Parsed once per HtmlParser, `find` and `links` can be called many times on the same node.
         try:
-            import selectolax
+            html_parser = selectolax_parser.HTMLParser
         except ImportError:
             raise Exception('selectolax is not installed')
-        return selectolax.parser.HTMLParser(self.html)
+        return html_parser(self.html)
 
     def find(self, selector: str, first=False, attributes: Optional[dict] = None) -> list[
         'HtmlParser']:
         if attributes is None:
             attributes = {}
 
-        function = self.selectolax().css_first if first else self.selectolax().css
-        from collections.abc import Iterable
+        tree = self.selectolax()
+        function = tree.css_first if first else tree.css
 
         res = function(selector)
 
@@ -93,7 +162,7 @@ class HtmlParser:
 
     @property
     def links(self):
-        if not self.html:
+        if not self.html or self.links_dropped:
             return list()
 
         links = []
@@ -136,7 +205,8 @@ class CrawlResponse:
                  http_version: str,
                  headers: dict,
                  text: Optional[str] = None,
-                 encoding: str = 'utf-8'
+                 encoding: str = 'utf-8',
+                 timings: Optional[RequestTimings] = None,
                  ):
         self.ok = raw_response and not exception
         self.raw_response = raw_response
@@ -150,6 +220,25 @@ class CrawlResponse:
 
         self.text = text
         self.encoding = encoding
+        self.timings = timings
+
+        # Set by `scrupy.crawler.dedup.NearDuplicateDetector`, the SimHash of the text and the
+        # url of the page this one is a near-duplicate of.
+        self.fingerprint: Optional[int] = None
+        self.duplicate_of: Optional[str] = None
+        self.links_dropped = False
+
+    def as_dict(self):
+        return {
+            'status_code': self.status_code,
+            'method': self.method,
+            'http_version': self.http_version,
+            'headers': dict(self.headers) if self.headers else self.headers,
+            'encoding': self.encoding,
+            'text': self.text,
+            'exception': repr(self.exception) if self.exception else None,
+            'timings': self.timings.as_dict() if self.timings else None,
+        }
 
     @property
     def is_json(self) -> bool:
@@ -168,10 +257,14 @@ class CrawlResponse:
             return 'text/html' in content_type_header
         return False
 
+    @property
+    def is_duplicate(self) -> bool:
+        return self.duplicate_of is not None
+
     @property
     def html(self) -> Optional[HtmlParser]:
-        return HtmlParser(self.text, attributes=None, tag='html',
-                          text=self.text) if self.is_html else None
+        return HtmlParser(self.text, attributes=None, tag='html', text=self.text,
+                          links_dropped=self.links_dropped) if self.is_html else None
 
     def __str__(self):
         return f'CrawlResponse(status_code={self.status_code}, exception={self.exception})'
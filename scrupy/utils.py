@@ -1,6 +1,41 @@
-import urllib
+import importlib
+import sys
+import urllib.parse
+from typing import Optional
 
-import tldextract
+from scrupy.canonical import DEFAULT_CANONICALIZER, UrlCanonicalizer
+
+
+class LazyModule:
+    """
+    Proxy to a module that is only imported the first time one of its attributes is accessed.
+
+    Used for heavy or optional dependencies so that `import scrupy` stays cheap and backends
+    that are never used are never imported, ie:
+
+        trio = LazyModule('trio')
+        trio.run(...)  # 'trio' is imported here.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, item):
+        if item in ('_name', '_module'):  # Not initialized yet, ie: while being copied.
+            raise AttributeError(item)
+        return getattr(self.load(), item)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._name!r})'
+
+
+tldextract = LazyModule('tldextract')
 
 
 class NOTSET:
@@ -23,26 +58,76 @@ NOTSET = NOTSET()
 
 
 class Url:
+    """
+    A url, equal to the urls that have the same canonical form, ie:
+    `Url('HTTP://A.com/x?b=1&a=2#frag') == 'http://a.com/x?a=2&b=1'`.
+
+    Urls are canonicalized with `Url.canonicalizer`, to change how, set it before crawling, ie:
+    `Url.canonicalizer = UrlCanonicalizer(remove_params={'sessionid'})`.
+    """
+    canonicalizer: UrlCanonicalizer = DEFAULT_CANONICALIZER
+
+    # One is built for every link found, the host, domain and fingerprint are computed on first
+    # use.
+    __slots__ = ('url', 'raw_url', '_host', '_domain', '_fingerprint')
+
     def __init__(self, url: str):
         if 'http' not in url and 'https' not in url:
             raise ValueError(f'Url <{url}> missing scheme. (http:// or https://)')
 
         self.url = urllib.parse.urlparse(url)
         self.raw_url: str = url
+        self._host: Optional[str] = None
+        self._domain: Optional[str] = None
+        self._fingerprint: Optional[bytes] = None
 
     @property
     def netloc(self):
         return self.url.netloc
 
     @property
-    def domain(self):
-        return tldextract.extract(self.raw_url).domain
+    def host(self) -> str:
+        # Cached, the frontier queues by host, it is read to add, pop and look up every request.
+        if self._host is None:
+            self._host = self.canonicalizer.host(self.url)
+        return self._host
+
+    @property
+    def domain(self) -> str:
+        # Cached, it is used for the delays, budgets and queues of every request, and interned,
+        # urls of the same domain share the string.
+        if self._domain is None:
+            self._domain = sys.intern(tldextract.extract(self.raw_url).domain)
+        return self._domain
+
+    @property
+    def canonical(self) -> str:
+        return self.canonicalizer.canonicalize(self.raw_url)
+
+    @property
+    def fingerprint(self) -> bytes:
+        if self._fingerprint is None:
+            self._fingerprint = self.canonicalizer.fingerprint(self.raw_url)
+        return self._fingerprint
 
     def __str__(self):
         return self.url.geturl()
 
     def __eq__(self, other):
-        return self.url.geturl() == other
+        if isinstance(other, Url):
+            return self.fingerprint == other.fingerprint
+        if isinstance(other, str):
+            return self.fingerprint == self.canonicalizer.fingerprint(other)
+        return NotImplemented
 
     def __hash__(self):
-        return hash(self.url.geturl())
+        return hash(self.fingerprint)
+
+
+def url_fingerprint(url: 'str | Url') -> bytes:
+    """
+    The fingerprint of the canonical form of `url`, see `Url.canonicalizer`.
+    """
+    if isinstance(url, Url):
+        return url.fingerprint
+    return Url.canonicalizer.fingerprint(url)
@@ -0,0 +1,172 @@
+import asyncio
+
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy import CrawlRequest
+from scrupy.crawler.base import CrawlerClientBase
+from scrupy.crawler.clients import AsyncHttpxClient
+from scrupy.crawler.browser import (CONTEXT_PER_DOMAIN, CONTEXT_PER_REQUEST, CONTEXT_SHARED,
+                                    AsyncBrowserClient, BrowserPool, fill_timings)
+from scrupy.request import CrawlResponse, RequestTimings
+
+
+class EchoClient(CrawlerClientBase):
+    """
+    Answers every request without any network, with its url as text.
+    """
+
+    def __init__(self):
+        self.cleaned_up = False
+
+    def run_request(self, request, client):
+        return str(request.url)
+
+    def build_response(self, request, raw_response, exception=None):
+        return CrawlResponse(request=request, raw_response=raw_response, exception=exception,
+                             method=request.method, status_code=200, http_version=None,
+                             headers={}, text=raw_response, timings=request.timings)
+
+    def get_new_client(self):
+        return None
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+
+def test_crawler_routes_request_types(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that requests are run by the client of their type, and the rest by the default one.
+    """
+    httpserver.expect_request('/plain').respond_with_data('plain')
+
+    class MyCrawler(sync_crawler):
+        def on_before_crawl(self, request: CrawlRequest) -> CrawlRequest:
+            if request.url.url.path == '/echo':
+                request.type = 'echo'
+            return request
+
+    echo = EchoClient()
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/plain'), httpserver.url_for('/echo')],
+                        delay_per_request=0, crawl_clients={'echo': echo})
+    crawler.run()
+
+    assert [row.response.text for row in crawler.history] == ['plain', httpserver.url_for('/echo')]
+    assert echo.cleaned_up
+
+
+def test_crawler_cleans_up_clients_on_error(sync_crawler):
+    """
+    Test that the clients are cleaned up even if the crawl raises.
+    """
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            raise ValueError('broken')
+
+    echo = EchoClient()
+    crawler = MyCrawler(start_urls=[CrawlRequest('https://example.com/', type='echo')],
+                        delay_per_request=0, crawl_clients={'echo': echo})
+    with pytest.raises(ValueError):
+        crawler.run()
+
+    assert echo.cleaned_up
+
+
+def test_crawler_rejects_unusable_clients(sync_crawler, async_crawler):
+    """
+    Test that async clients can't be given to the sync crawler, nor sync ones to the async one,
+    and that a request of a type without a client is not run by the default one.
+    """
+    with pytest.raises(TypeError):
+        sync_crawler(crawl_clients={'browser': AsyncHttpxClient()})
+    with pytest.raises(TypeError):
+        async_crawler(crawl_client=EchoClient())
+
+    crawler = sync_crawler(delay_per_request=0)
+    with pytest.raises(ValueError):
+        crawler._get_crawl_client(CrawlRequest('https://example.com', type='browser'))
+
+
+@pytest.mark.parametrize('policy, same_domain_key, other_domain_key', [
+    (CONTEXT_PER_DOMAIN, True, False),
+    (CONTEXT_SHARED, True, True),
+    (CONTEXT_PER_REQUEST, False, False),
+])
+def test_browser_pool_context_keys(policy, same_domain_key, other_domain_key):
+    """
+    Test that the context reuse policy decides which requests share a browser context.
+    """
+    pool = BrowserPool(context_policy=policy)
+    key = pool.context_key(CrawlRequest('https://example.com/1'))
+
+    assert (pool.context_key(CrawlRequest('https://example.com/2')) == key) is same_domain_key
+    assert (pool.context_key(CrawlRequest('https://other.com/')) == key) is other_domain_key
+
+
+def test_browser_timings():
+    """
+    Test that the resource timing of the browser is converted, missing steps are None.
+    """
+    timings = RequestTimings()
+    fill_timings(timings, {
+        'domainLookupStart': -1, 'domainLookupEnd': -1, 'connectStart': 1, 'connectEnd': 5,
+        'secureConnectionStart': -1, 'requestStart': 6, 'responseStart': 26, 'responseEnd': 30,
+    })
+
+    assert timings.dns is None
+    assert timings.connect == .004
+    assert timings.tls is None
+    assert timings.ttfb == .02
+    assert timings.download == .004
+
+
+@pytest.fixture(scope='module')
+def browser_available():
+    pytest.importorskip('playwright')
+
+    async def launch():
+        pool = BrowserPool()
+        try:
+            await pool.start()
+        finally:
+            await pool.close()
+
+    try:
+        asyncio.run(launch())
+    except Exception as e:
+        pytest.skip(f'No browser to launch: {e}')
+
+
+def test_browser_client_renders_pages(browser_available, async_crawler, httpserver: HTTPServer):
+    """
+    Test that `browser` requests are rendered, with images blocked, and the rest are not.
+    """
+    html = '''
+    <html><body>
+        <img src="/image.png">
+        <div id="app"></div>
+        <script>document.getElementById('app').innerHTML = '<p>rendered</p>'</script>
+    </body></html>
+    '''
+    httpserver.expect_request('/spa').respond_with_data(html, content_type='text/html')
+    httpserver.expect_request('/static').respond_with_data(html, content_type='text/html')
+    httpserver.expect_request('/image.png').respond_with_data(b'', content_type='image/png')
+
+    class MyCrawler(async_crawler):
+        def on_before_crawl(self, request: CrawlRequest) -> CrawlRequest:
+            if request.url.url.path == '/spa':
+                request.type = 'browser'
+            return request
+
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/spa'), httpserver.url_for('/static')],
+                        backend='asyncio', crawl_clients={'browser': AsyncBrowserClient()})
+    crawler.run()
+
+    responses = {row.request.url.url.path: row.response for row in crawler.history}
+    assert responses['/spa'].status_code == 200
+    assert '<p>rendered</p>' in responses['/spa'].text
+    assert '<p>rendered</p>' not in responses['/static'].text
+    assert responses['/spa'].html.find('#app p', first=True)[0].text == 'rendered'
+
+    assert all(request.path != '/image.png' for request, _ in httpserver.log)
@@ -1,4 +1,8 @@
+import asyncio
+import time
+
 import httpx
+import pytest
 
 
 def test_crawler_basic(async_crawler):
@@ -63,3 +67,130 @@ def test_crawler_crawls_mixed_urls(async_crawler, httpserver):
 
     assert len(crawler.history) == 2
     assert not isinstance(crawler.history[0].response.exception, httpx.ConnectError)
+
+
+def test_crawler_request_timings(async_crawler, httpserver):
+    """
+    Test that responses carry the timings of the request.
+    """
+    httpserver.expect_request('/test')
+
+    crawler = async_crawler(start_urls=[httpserver.url_for('/test')])
+    crawler.run()
+
+    timings = crawler.history[0].response.timings
+    assert timings.connect > 0
+    assert timings.ttfb > 0
+    assert timings.total > 0
+
+
+def test_crawler_finishes_when_done(async_crawler, httpserver):
+    """
+    Test that the crawler finishes as soon as the last request is crawled, without polling.
+    """
+    httpserver.expect_request('/test')
+
+    crawler = async_crawler(start_urls=[httpserver.url_for('/test')])
+
+    started = time.perf_counter()
+    crawler.run()
+
+    assert len(crawler.history) == 1
+    assert time.perf_counter() - started < .7  # The old polling interval was .75s
+
+
+def test_crawler_waits_for_added_requests(async_crawler, httpserver):
+    """
+    Test that requests added from `on_crawled` are crawled before finishing.
+    """
+    httpserver.expect_request('/first').respond_with_data(
+        f'<a href="{httpserver.url_for("/second")}">second</a>', content_type='text/html')
+    httpserver.expect_request('/second')
+
+    class MyCrawler(async_crawler):
+        async def on_crawled(self, response):
+            if response.is_html:
+                await self.add_to_queue(response.html.absolute_links)
+
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/first')])
+    crawler.run()
+
+    assert [row.request.url.url.path for row in crawler.history] == ['/first', '/second']
+    assert crawler.in_flight == 0
+    assert len(crawler.frontier) == 0
+
+
+@pytest.mark.parametrize('backend', ['trio', 'asyncio'])
+def test_crawler_waits_for_added_requests_of_new_domains(async_crawler, httpserver, backend):
+    """
+    Test that a request of a new domain added from `on_crawled`, sent straight to the waiting
+    crawl task, is crawled before finishing.
+    """
+    httpserver.expect_request('/a')
+    httpserver.expect_request('/b')
+
+    class MyCrawler(async_crawler):
+        async def on_crawled(self, response):
+            if response.request.url.url.path == '/a':
+                await self.add_to_queue(f'http://127.0.0.1:{httpserver.port}/b')
+
+    crawler = MyCrawler(start_urls=[f'http://localhost:{httpserver.port}/a'], backend=backend)
+    crawler.run()
+
+    assert [str(row.request.url) for row in crawler.history] == [
+        f'http://localhost:{httpserver.port}/a', f'http://127.0.0.1:{httpserver.port}/b'
+    ]
+    assert len(crawler.frontier) == 0
+
+
+def test_crawler_runs_in_asyncio_loop(async_crawler, httpserver):
+    """
+    Test that the crawler runs inside an existing asyncio event loop with `run_async`.
+    """
+    httpserver.expect_request('/test').respond_with_data('ok')
+
+    async def main():
+        crawler = async_crawler(start_urls=[httpserver.url_for('/test')])
+        await crawler.run_async()
+        return crawler
+
+    crawler = asyncio.run(main())
+
+    assert len(crawler.history) == 1
+    assert crawler.history[0].response.status_code == 200
+
+
+def test_crawler_asyncio_backend(async_crawler, httpserver):
+    """
+    Test that `run` can start an asyncio event loop instead of trio.
+    """
+    httpserver.expect_request('/test').respond_with_data('ok')
+
+    crawler = async_crawler(start_urls=[httpserver.url_for('/test')], backend='asyncio')
+    crawler.run()
+
+    assert len(crawler.history) == 1
+
+
+def test_crawler_add_to_queue_from_other_task(async_crawler, httpserver):
+    """
+    Test that requests added from other tasks are crawled while running forever, and that
+    `force_stop(drain=True)` waits for them.
+    """
+    httpserver.expect_request('/test').respond_with_data('ok')
+
+    async def main():
+        crawler = async_crawler()
+
+        async def producer():
+            for _ in range(3):
+                await asyncio.sleep(.05)
+                await crawler.add_to_queue(httpserver.url_for('/test'))
+            crawler.force_stop(drain=True)
+
+        await asyncio.gather(crawler.run_async(run_forever=True), producer())
+        return crawler
+
+    crawler = asyncio.run(main())
+
+    assert len(crawler.history) == 3
@@ -1,3 +1,4 @@
+import threading
 import time
 
 import httpx
@@ -288,3 +289,104 @@ def test_crawler_user_agent(sync_crawler, crawl_request):
     c.user_agent = default_user_agent
     request = c._build_request('http://otherurl')
     assert request.user_agent == default_user_agent
+
+
+def test_crawler_request_timings(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that responses and history rows carry the timings of the request.
+    """
+    httpserver.expect_request('/test').respond_with_data('<html></html>')
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response: CrawlResponse) -> None:
+            time.sleep(.05)
+
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/test')], delay_per_request=0)
+    crawler.run()
+
+    timings = crawler.history[0].response.timings
+    assert crawler.history[0].timings is timings
+
+    assert timings.queue_wait >= 0
+    assert timings.connect > 0
+    assert timings.tls is None  # Plain http.
+    assert timings.ttfb > 0
+    assert timings.download > 0
+    assert timings.total >= timings.connect + timings.ttfb
+    assert timings.hooks >= .05
+    assert crawler.history[0].as_dict()['timings']['ttfb'] == timings.ttfb
+
+
+def test_crawler_run_forever_wakes_on_new_requests(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that an idle crawler picks up requests added from another thread right away, and stops
+    when `force_stop` is called from another thread.
+    """
+    httpserver.expect_request('/test')
+
+    crawler = sync_crawler(delay_per_request=0)
+    thread = threading.Thread(target=crawler.run, kwargs={'run_forever': True})
+    thread.start()
+
+    time.sleep(.1)
+    crawler.add_to_queue(httpserver.url_for('/test'))
+
+    deadline = time.monotonic() + 5
+    while not crawler.history and time.monotonic() < deadline:
+        time.sleep(.01)
+    assert len(crawler.history) == 1
+
+    crawler.force_stop()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+
+
+def test_crawler_run_forever_idle_timeout(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that a crawler running forever stops after `idle_timeout` seconds without requests.
+    """
+    httpserver.expect_request('/test')
+
+    crawler = sync_crawler(delay_per_request=0, start_urls=[httpserver.url_for('/test')])
+
+    started = time.perf_counter()
+    crawler.run(run_forever=True, idle_timeout=.2)
+
+    assert len(crawler.history) == 1
+    assert .2 <= time.perf_counter() - started < 2
+
+
+def test_crawler_force_stop_drains(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that `force_stop(drain=True)` crawls the queued requests before stopping.
+    """
+    httpserver.expect_request('/test')
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response: CrawlResponse) -> None:
+            self.force_stop(drain=True)
+
+    crawler = MyCrawler(delay_per_request=0, start_urls=[httpserver.url_for('/test')] * 3)
+    crawler.run(run_forever=True)
+
+    assert len(crawler.history) == 3
+
+
+def test_crawler_add_to_queue_ignores_canonical_repeats(sync_crawler, httpserver):
+    """
+    Test that `ignore_repeated` drops urls with the same canonical form as queued or crawled ones.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    crawler = sync_crawler(delay_per_request=0)
+
+    crawler.add_to_queue([httpserver.url_for('/page?b=1&a=2'),
+                          httpserver.url_for('/page?a=2&b=1#top')], ignore_repeated=True)
+    assert len(crawler.frontier) == 1
+
+    crawler.add_to_queue(httpserver.url_for('/page?a=2&b=1&utm_source=x'), ignore_repeated=True)
+    assert len(crawler.frontier) == 1
+
+    crawler.run()
+    crawler.add_to_queue(httpserver.url_for('/page?b=1&a=2'), ignore_repeated=True)
+    assert len(crawler.frontier) == 0
+    assert len(crawler.history) == 1
@@ -0,0 +1,114 @@
+import random
+
+from pytest_httpserver import HTTPServer
+
+from scrupy import CrawlRequest
+from scrupy.crawler.dedup import NearDuplicateDetector, SimHashIndex, simhash
+from scrupy.crawler.metrics import CrawlMetrics
+from scrupy.request import CrawlResponse
+
+WORDS = [f'word{i}' for i in range(500)]
+
+
+def article(seed: int, words: int = 2000) -> str:
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def page(body: str, links: tuple[str, ...] = ()) -> str:
+    anchors = ''.join(f'<a href="{link}">link</a>' for link in links)
+    return (f'<html><head><style>p {{ color: red }}</style></head><body><p>{body}</p>{anchors}'
+            f'<script>var session = "{random.random()}"</script></body></html>')
+
+
+def test_simhash_distance():
+    """
+    Test that similar texts get close fingerprints and different ones far away fingerprints.
+    """
+    text = article(1)
+    edited = text.replace('word1 ', 'changed ', 1) + ' footer'
+
+    assert simhash(text) == simhash(text)
+    assert (simhash(text) ^ simhash(edited)).bit_count() <= 3
+    assert (simhash(text) ^ simhash(article(2))).bit_count() > 10
+
+
+def test_simhash_index():
+    """
+    Test that fingerprints up to `max_distance` bits away are found through their bands.
+    """
+    index = SimHashIndex(max_distance=3)
+    fingerprint = simhash(article(1))
+    index.add(fingerprint, 'a')
+
+    assert index.find(fingerprint) == 'a'
+    assert index.find(fingerprint ^ 0b1011) == 'a'
+    assert index.find(fingerprint ^ (1 << 63 | 1 << 40 | 1 << 20 | 1)) is None
+    assert index.find(simhash(article(2))) is None
+    assert len(index) == 1
+
+
+def test_recrawled_page_is_not_its_own_duplicate():
+    """
+    Test that a page checked again, ie: recrawled, is not flagged as a duplicate of itself,
+    and still is of another page.
+    """
+    dedup = NearDuplicateDetector(drop_links=True)
+    text = article(1)
+
+    def check(url: str) -> CrawlResponse:
+        response = CrawlResponse(request=CrawlRequest(url), raw_response=text, exception=None,
+                                 method='GET', status_code=200, http_version=None,
+                                 headers={'content-type': 'text/html'},
+                                 text=page(text, ('https://a.com/next',)))
+        dedup.check(response)
+        return response
+
+    assert check('https://a.com/article').duplicate_of is None
+    recrawled = check('https://A.com/article#top')
+    assert recrawled.duplicate_of is None
+    assert recrawled.html.links == ['https://a.com/next']
+    assert len(dedup.index) == 1
+
+    assert check('https://a.com/print').duplicate_of == 'https://a.com/article'
+    assert dedup.duplicates == 1
+
+
+def test_crawler_flags_near_duplicates(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that near-duplicates are flagged and their links dropped, ignoring scripts.
+    """
+    text = article(1)
+    links = (httpserver.url_for('/next'),)
+    httpserver.expect_request('/article').respond_with_data(
+        page(text, links), content_type='text/html')
+    httpserver.expect_request('/article/print').respond_with_data(
+        page(text + ' printed', links), content_type='text/html')
+    httpserver.expect_request('/other').respond_with_data(
+        page(article(2), links), content_type='text/html')
+
+    followed = []
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            followed.extend(response.html.links)
+
+    dedup = NearDuplicateDetector(drop_links=True)
+    metrics = CrawlMetrics()
+    crawler = MyCrawler(start_urls=[httpserver.url_for(path)
+                                    for path in ('/article', '/article/print', '/other')],
+                        delay_per_request=0, dedup=dedup, metrics=metrics)
+    crawler.run()
+
+    # The one crawled last is the duplicate.
+    duplicates = {row.request.url.url.path: row.response.duplicate_of
+                  for row in crawler.history if row.response.is_duplicate}
+    assert duplicates in ({'/article/print': httpserver.url_for('/article')},
+                          {'/article': httpserver.url_for('/article/print')})
+    assert dedup.duplicates == 1
+    assert followed == list(links) * 2
+
+    # Timed apart from the user hooks.
+    assert metrics.processing.count(step='dedup') == 3
+    assert metrics.hooks.count(hook='dedup') == 0
+    assert all(row.request.timings.processing > 0 for row in crawler.history)
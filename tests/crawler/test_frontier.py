@@ -0,0 +1,145 @@
+import anyio
+
+from scrupy import CrawlRequest
+from scrupy.crawler.frontier import AsyncFrontier, CrawlBudget, SyncFrontier
+from scrupy.crawler.rules import UrlRules
+
+
+def requests(*urls: str) -> list[CrawlRequest]:
+    return [CrawlRequest(url) for url in urls]
+
+
+def test_sync_frontier_round_robin():
+    """
+    Test that requests are taken from one host after the other, in order within a host.
+    """
+    frontier = SyncFrontier(requests('https://a.com/1', 'https://a.com/2', 'https://a.com/3',
+                                     'https://b.com/1', 'https://c.com/1'))
+
+    order = []
+    while (request := frontier.get_next()) is not None:
+        order.append(str(request.url))
+
+    assert order == ['https://a.com/1', 'https://b.com/1', 'https://c.com/1',
+                     'https://a.com/2', 'https://a.com/3']
+    assert len(frontier) == 0
+
+
+def test_sync_frontier_has_queued_canonical():
+    """
+    Test that queued urls are found whatever the case of the host or a default port, and share
+    the queue of their host.
+    """
+    frontier = SyncFrontier(requests('https://Example.com/a', 'https://example.com:8080/b'))
+
+    assert frontier.has_queued('https://example.com/a')
+    assert frontier.has_queued('https://EXAMPLE.com:443/a')
+    assert not frontier.has_queued('https://example.com:8080/a')
+    assert frontier.has_queued('https://example.com:8080/b')
+
+    frontier.add_to_queue(requests('https://example.com:443/c'))
+    assert list(frontier.queue) == ['example.com', 'example.com:8080']
+
+
+def test_sync_frontier_page_budget():
+    """
+    Test that a domain out of pages is evicted at once and refused afterwards.
+    """
+    budget = CrawlBudget(max_pages_per_domain=2)
+    frontier = SyncFrontier(requests(*(f'https://a.com/{i}' for i in range(5)),
+                                     'https://www.a.com/x', 'https://b.com/1'), budget=budget)
+
+    taken = [str(frontier.get_next().url) for _ in range(3)]
+    assert taken == ['https://a.com/0', 'https://www.a.com/x', 'https://b.com/1']
+    assert len(frontier) == 0
+    assert budget.dropped == 4
+
+    frontier.add_to_queue(requests('https://a.com/6', 'https://b.com/2'))
+    assert [str(request.url) for request in frontier] == ['https://b.com/2']
+    assert budget.dropped == 5
+    assert not frontier.has_queued('https://a.com/1')
+
+
+def test_sync_frontier_byte_budget():
+    """
+    Test that a domain that downloaded its bytes is evicted.
+    """
+    budget = CrawlBudget(max_bytes_per_domain=100)
+    frontier = SyncFrontier(requests('https://a.com/1', 'https://a.com/2', 'https://b.com/1'),
+                            budget=budget)
+
+    request = frontier.get_next()
+    frontier.record_download(request, 60)
+    assert len(frontier) == 2
+
+    frontier.record_download(request, 60)
+    assert [str(request.url) for request in frontier] == ['https://b.com/1']
+    assert budget.is_exhausted('a')
+    assert budget.bytes['a'] == 120
+
+
+def test_async_frontier_budget():
+    """
+    Test that requests of an evicted domain already sent to the crawler are not crawled.
+    """
+    budget = CrawlBudget(max_pages_per_domain=1)
+    frontier = AsyncFrontier(budget=budget)
+
+    async def main():
+        await frontier.add_to_queue(requests('https://a.com/1', 'https://a.com/2'))
+        receive = frontier.receive_channel
+        assert frontier.dequeued(receive.receive_nowait())
+        assert len(frontier) == 0
+        assert budget.dropped == 1
+
+    anyio.run(main)
+
+
+def test_crawler_depth_and_budget(sync_crawler, httpserver):
+    """
+    Test that links get the depth and parent of the page they are found in and that budgets
+    stop the crawl of a domain.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            request = response.request
+            if request.depth < 3:
+                self.add_to_queue(httpserver.url_for(f'/page?depth={request.depth + 1}'),
+                                  parent=request)
+
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/page')], delay_per_request=0,
+                        budget=CrawlBudget(max_pages_per_domain=3))
+    crawler.run()
+
+    rows = list(crawler.history)
+    assert [row.request.depth for row in rows] == [0, 1, 2]
+    assert rows[0].request.parent is None
+    assert rows[2].request.parent == httpserver.url_for('/page?depth=1')
+    assert crawler.budget.dropped == 1
+
+
+def test_crawler_depth_of_requests(sync_crawler):
+    """
+    Test that queued requests get the depth and parent of the page they are found in, unless
+    they have their own, and are filtered by it.
+    """
+    parent = CrawlRequest('https://example.com/', depth=2)
+    crawler = sync_crawler(delay_per_request=0, rules=UrlRules(max_depth=3))
+    crawler.add_to_queue([CrawlRequest('https://example.com/a'),
+                          CrawlRequest('https://example.com/b', depth=1),
+                          CrawlRequest('https://example.com/c', depth=4),
+                          CrawlRequest('https://example.com/e', depth=0),
+                          CrawlRequest('https://example.com/f', parent='https://example.com/x')],
+                         parent=parent)
+
+    assert [(str(request.url), request.depth, request.parent) for request in crawler.frontier] \
+        == [('https://example.com/a', 3, 'https://example.com/'),
+            ('https://example.com/b', 1, None),
+            ('https://example.com/e', 0, None),
+            ('https://example.com/f', 3, 'https://example.com/x')]
+
+    crawler.add_to_queue([CrawlRequest('https://example.com/d')],
+                         parent=CrawlRequest('https://example.com/a', depth=3))
+    assert len(crawler.frontier) == 4
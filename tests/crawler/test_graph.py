@@ -0,0 +1,128 @@
+import array
+
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy import CrawlRequest
+from scrupy.crawler.frontier import SyncFrontier
+from scrupy.crawler.graph import LinkGraph
+
+A, B, C, D = (f'https://example.com/{page}' for page in 'abcd')
+
+
+def test_link_graph_interns_urls():
+    """
+    Test that urls get one id per canonical form and links are stored once per page.
+    """
+    graph = LinkGraph(update_every=None)
+    graph.add(A, [B, C, 'https://EXAMPLE.com/b#top', A])
+
+    assert graph.urls == [A, B, C]
+    assert graph.id('https://example.com/c?utm_source=x') == 2
+    assert list(graph.edges()) == [(0, 1), (0, 2)]
+    assert list(graph.in_degree()) == [0, 1, 1]
+
+
+def test_link_graph_pagerank():
+    """
+    Test that the most linked page ranks first and the ranks add up to 1.
+    """
+    graph = LinkGraph(update_every=None)
+    graph.add(A, [C])
+    graph.add(B, [C])
+    graph.add(D, [C, A])
+    graph.update_scores()
+
+    assert sum(graph.scores) == pytest.approx(1)
+    assert [url for url, _ in graph.top(2)] == [C, A]
+    assert graph.score(C) > graph.score(B)
+    assert graph.score('https://example.com/unknown') == 0
+
+
+def test_link_graph_pagerank_is_incremental():
+    """
+    Test that the scores are updated in the background every `update_every` links, starting from
+    the previous ones.
+    """
+    graph = LinkGraph(update_every=2)
+    assert not graph.add(A, [B])
+    assert graph.add(B, [C])
+    graph.wait()
+    assert graph.scores_changed() and not graph.scores_changed()
+    first = list(graph.scores)
+
+    assert graph.add(C, [A, D])
+    graph.add(D, [B])  # Added after the update started, not in its scores.
+    graph.wait()
+    assert len(graph.scores) == 4
+    assert graph.scores[:3] != array.array('d', first)
+
+    expected = LinkGraph(update_every=None)
+    for source, target in [(A, B), (B, C), (C, A), (C, D)]:
+        expected.add(source, [target])
+    assert list(graph.scores) == pytest.approx(list(expected.pagerank()), abs=1e-5)
+
+
+def test_link_graph_memory_mapped(tmp_path):
+    """
+    Test that links moved to disk are read back the same, and exported as uint32 pairs.
+    """
+    graph = LinkGraph(tmp_path / 'edges', update_every=None, max_memory_edges=2)
+    graph.add(A, [B, C])
+    graph.add(B, [C])
+    graph.add(C, [D])
+    graph.add(D, [A])
+
+    assert graph._file_edges == 4 and graph.edge_count == 5
+    assert list(graph.edges()) == [(0, 1), (0, 2), (1, 2), (2, 3), (3, 0)]
+    assert list(graph.in_degree()) == [1, 1, 2, 1]
+
+    graph.export(tmp_path / 'export')
+    assert (tmp_path / 'export' / 'nodes.txt').read_text().split() == [A, B, C, D]
+    edges = array.array('I', (tmp_path / 'export' / 'edges.bin').read_bytes())
+    assert list(edges) == [0, 1, 0, 2, 1, 2, 2, 3, 3, 0]
+    graph.close()
+
+
+def test_prioritized_frontier():
+    """
+    Test that a prioritized frontier takes the requests of a host by priority, and reorders them
+    when they change.
+    """
+    requests = [CrawlRequest(url) for url in (A, B, C)]
+    requests[2].priority = 1
+
+    frontier = SyncFrontier(prioritized=True)
+    frontier.add_to_queue(requests)
+    assert str(frontier.get_next().url) == C
+
+    frontier.reprioritize(lambda request: 1 if str(request.url) == B else 0)
+    assert [str(frontier.get_next().url) for _ in range(2)] == [B, A]
+
+
+def test_crawler_crawls_most_linked_first(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that the crawler records the links of every page and crawls the most linked pages of a
+    host first.
+    """
+    def links(*paths):
+        return ''.join(f'<a href="{httpserver.url_for(path)}">x</a>' for path in paths)
+
+    pages = {'/': links('/a', '/b', '/c'), '/a': links('/c'), '/b': '', '/c': ''}
+    for path, body in pages.items():
+        httpserver.expect_request(path).respond_with_data(
+            f'<html><body>{body}</body></html>', content_type='text/html')
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            self.add_to_queue(response.html.absolute_links, ignore_repeated=True,
+                              parent=response.request)
+
+    # In `add`, the order of the crawl does not depend on when the background update finishes.
+    graph = LinkGraph(score_by='in_degree', update_every=1, background=False)
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/')], delay_per_request=0, graph=graph)
+    crawler.run()
+
+    assert [row.request.url.url.path for row in crawler.history] == ['/', '/a', '/c', '/b']
+    assert graph.edge_count == 4
+    assert graph.top(1) == [(httpserver.url_for('/c'), 2)]
@@ -0,0 +1,151 @@
+import threading
+
+import httpx
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy.crawler.clients import HttpxClient
+from scrupy.crawler.metrics import Counter, CrawlMetrics, Histogram, MetricsServer, RateWindow
+
+
+def test_histogram_quantiles():
+    """
+    Test that quantiles are estimated from the buckets, per labels and overall.
+    """
+    histogram = Histogram('latency', 'Latency.', ('domain',), buckets=(.1, .2, .5, 1))
+
+    for _ in range(90):
+        histogram.observe(.05, domain='a')
+    for _ in range(10):
+        histogram.observe(.7, domain='b')
+
+    assert histogram.count() == 100
+    assert histogram.count(domain='b') == 10
+    assert histogram.quantile(.5) == pytest.approx(.1 * 50 / 90)
+    assert .5 <= histogram.quantile(.99) <= 1
+    assert .5 <= histogram.quantile(.5, domain='b') <= 1
+    assert histogram.quantile(.5, domain='c') is None
+
+
+def test_rate_window():
+    """
+    Test that rates are computed over the given window, and that reading them changes nothing.
+    """
+    window = RateWindow(window=10)
+    assert window.rate(now=0) == 0
+
+    window.add(10, now=0)
+    window.add(50, now=5)
+    assert window.rate(now=5) == 10
+    window.add(50, now=10)
+    assert window.rate(now=10) == 10
+    assert window.rate(now=10) == 10
+    window.add(300, now=20)
+    assert window.rate(now=20) == pytest.approx(30)
+    assert window.rate(now=40) == 0
+
+
+def test_metrics_label_escaping():
+    """
+    Test that label values are escaped in the exposition format.
+    """
+    counter = Counter('hooks', 'Hooks.', ('hook',))
+    counter.inc(hook='a"b\\c\nd')
+
+    assert counter.render().splitlines()[-1] == 'hooks_total{hook="a\\"b\\\\c\\nd"} 1.0'
+
+
+def test_metrics_render_while_updated():
+    """
+    Test that metrics can be rendered while other threads add new series.
+    """
+    counter = Counter('requests', 'Requests.', ('domain',))
+    histogram = Histogram('latency', 'Latency.', ('domain',))
+    done = threading.Event()
+
+    def update():
+        for i in range(20000):
+            counter.inc(domain=str(i))
+            histogram.observe(.1, domain=str(i))
+        done.set()
+
+    thread = threading.Thread(target=update)
+    thread.start()
+    while not done.is_set():
+        counter.render()
+        histogram.render()
+        counter.total()
+        histogram.quantile(.5)
+    thread.join()
+
+    assert counter.total() == histogram.count() == 20000
+
+
+def test_crawler_metrics(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that a crawl is reflected in the metrics and exposed in the Prometheus format.
+    """
+    httpserver.expect_request('/ok').respond_with_data('a' * 100)
+    httpserver.expect_request('/missing').respond_with_data('', status=404)
+
+    metrics = CrawlMetrics()
+    crawler = sync_crawler(
+        start_urls=[httpserver.url_for('/ok'), httpserver.url_for('/ok'),
+                    httpserver.url_for('/missing')],
+        delay_per_request=0,
+        metrics=metrics,
+    )
+    assert metrics.snapshot()['frontier_depth'] == 3
+    crawler.run()
+
+    snapshot = metrics.snapshot()
+    assert snapshot['requests'] == 3
+    assert snapshot['in_flight'] == 0
+    assert snapshot['frontier_depth'] == 0
+    assert snapshot['latency_p50'] > 0
+
+    assert metrics.requests.get(domain='localhost', status='2xx') == 2
+    assert metrics.requests.get(domain='localhost', status='4xx') == 1
+    assert metrics.response_bytes.get(domain='localhost') == 200
+    assert metrics.hooks.count(hook='on_crawled') == 3
+
+    with MetricsServer(metrics, port=0) as server:
+        text = httpx.get(server.url).text
+
+    assert '# TYPE scrupy_requests counter' in text
+    assert 'scrupy_requests_total{domain="localhost",status="2xx"} 2.0' in text
+    assert 'scrupy_request_duration_seconds_bucket{domain="localhost",status="4xx",le="+Inf"} 1' in text
+    assert 'scrupy_hook_duration_seconds_count{hook="on_before_crawl"} 3' in text
+    assert 'scrupy_frontier_depth 0' in text
+
+
+def test_crawler_metrics_async(async_crawler, httpserver: HTTPServer):
+    """
+    Test that the async crawler keeps metrics.
+    """
+    httpserver.expect_request('/ok')
+
+    metrics = CrawlMetrics()
+    async_crawler(start_urls=[httpserver.url_for('/ok')], metrics=metrics).run()
+
+    assert metrics.requests.total() == 1
+    assert metrics.in_flight.get() == 0
+
+
+def test_crawler_metrics_in_flight_on_error(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that a request stops being in flight even if building its response raises.
+    """
+    httpserver.expect_request('/ok')
+
+    class FailingClient(HttpxClient):
+        def build_response(self, request, raw_response, exception=None):
+            raise ValueError('broken')
+
+    metrics = CrawlMetrics()
+    crawler = sync_crawler(start_urls=[httpserver.url_for('/ok')], delay_per_request=0,
+                           crawl_client=FailingClient(), metrics=metrics)
+
+    with pytest.raises(ValueError):
+        crawler.run()
+    assert metrics.in_flight.get() == 0
@@ -0,0 +1,180 @@
+import csv
+import sqlite3
+import threading
+
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy.crawler.pipeline import CsvSink, ItemPipeline, JsonLinesSink, SqliteSink
+from scrupy.crawler.writers import iter_json_lines
+
+
+def test_pipeline_processes_and_batches():
+    """
+    Test that items go through the processors in order and reach the sinks in batches.
+    """
+    batches = []
+
+    def fail_on_five(item):
+        if item['id'] == 5:
+            raise ValueError('five')
+        return item
+
+    pipeline = ItemPipeline(
+        [batches.append],
+        processors=[lambda item: item if item['id'] % 2 else None,
+                    fail_on_five,
+                    lambda item: {**item, 'processed': True}],
+        batch_size=2, flush_interval=60,
+    )
+    for i in range(10):
+        pipeline.put({'id': i})
+    pipeline.close()
+
+    assert batches == [[{'id': 1, 'processed': True}, {'id': 3, 'processed': True}],
+                       [{'id': 7, 'processed': True}, {'id': 9, 'processed': True}]]
+    assert (pipeline.written, pipeline.dropped, pipeline.failed) == (4, 5, 1)
+
+    with pytest.raises(ValueError):
+        pipeline.put({'id': 10})
+
+
+def test_pipeline_counts_failed_batches():
+    """
+    Test that a batch a sink could not write is counted as failed, not written.
+    """
+    batches = []
+
+    def fail_on_first(batch):
+        if batch[0] == 0:
+            raise OSError('full')
+
+    pipeline = ItemPipeline([batches.append, fail_on_first], batch_size=2)
+    for i in range(4):
+        pipeline.put(i)
+    pipeline.close()
+
+    assert batches == [[0, 1], [2, 3]]
+    assert (pipeline.written, pipeline.failed) == (2, 2)
+
+
+def test_pipeline_flushes_by_time():
+    """
+    Test that an incomplete batch is written after `flush_interval` without closing.
+    """
+    written = threading.Event()
+    pipeline = ItemPipeline([lambda batch: written.set()], batch_size=100, flush_interval=.05)
+    pipeline.put({'id': 1})
+
+    assert written.wait(timeout=2)
+    pipeline.close()
+
+
+def test_pipeline_sinks(tmp_path):
+    """
+    Test that the JSON Lines, CSV and SQLite sinks write every item.
+    """
+    items = [{'url': f'https://example.com/{i}', 'links': [i, i + 1]} for i in range(5)]
+
+    with ItemPipeline([JsonLinesSink(tmp_path / 'items.jsonl', compression='gzip'),
+                       CsvSink(tmp_path / 'items.csv'),
+                       SqliteSink(tmp_path / 'items.db')], batch_size=2) as pipeline:
+        for item in items:
+            pipeline.put(item)
+
+    assert list(iter_json_lines(tmp_path / 'items.jsonl.gz')) == items
+
+    with open(tmp_path / 'items.csv', newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row['url'] for row in rows] == [item['url'] for item in items]
+
+    connection = sqlite3.connect(tmp_path / 'items.db')
+    assert connection.execute('SELECT url, links FROM items').fetchall() == [
+        (item['url'], f'[{i}, {i + 1}]') for i, item in enumerate(items)]
+    connection.close()
+
+
+def test_pipeline_bounds_pending_items():
+    """
+    Test that `put` waits for room once `max_pending` items are waiting.
+    """
+    release = threading.Event()
+    pipeline = ItemPipeline([lambda batch: release.wait()], batch_size=1, max_pending=1)
+    pipeline.put(1)  # Taken by the pipeline, blocked in the sink.
+    pipeline.put(2)  # Waiting.
+
+    putter = threading.Thread(target=pipeline.put, args=(3,))
+    putter.start()
+    putter.join(timeout=.2)
+    assert putter.is_alive()
+
+    release.set()
+    putter.join(timeout=2)
+    assert not putter.is_alive()
+    pipeline.close()
+    assert pipeline.written == 3
+
+
+def test_crawler_puts_yielded_items(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that the items `on_crawled` yields reach the pipeline, which is closed after
+    `on_finish`.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    batches = []
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            yield {'url': str(response.request.url)}
+            yield {'status': response.status_code}
+
+        def on_finish(self):
+            self.pipeline.put({'finished': True})
+
+    pipeline = ItemPipeline([batches.append])
+    MyCrawler(start_urls=[httpserver.url_for('/page')], delay_per_request=0,
+              pipeline=pipeline).run()
+
+    assert batches == [[{'url': httpserver.url_for('/page')}, {'status': 200},
+                        {'finished': True}]]
+    assert pipeline._closed
+
+
+@pytest.mark.anyio
+async def test_async_crawler_puts_yielded_items(async_crawler, httpserver: HTTPServer):
+    """
+    Test that the items an async `on_crawled` yields reach the pipeline.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    batches = []
+
+    class MyCrawler(async_crawler):
+        async def on_crawled(self, response):
+            yield {'url': str(response.request.url)}
+
+    pipeline = ItemPipeline([batches.append])
+    await MyCrawler(start_urls=[httpserver.url_for('/page')], pipeline=pipeline).run_async()
+
+    assert batches == [[{'url': httpserver.url_for('/page')}]]
+    assert pipeline._closed
+
+
+def test_crawler_closes_pipeline_on_error(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that the pipeline is closed, writing what it has, even if the crawl raises.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    batches = []
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            yield {'url': str(response.request.url)}
+            raise ValueError('broken')
+
+    pipeline = ItemPipeline([batches.append])
+    with pytest.raises(ValueError):
+        MyCrawler(start_urls=[httpserver.url_for('/page')], delay_per_request=0,
+                  pipeline=pipeline).run()
+
+    assert batches == [[{'url': httpserver.url_for('/page')}]]
+    assert pipeline._closed
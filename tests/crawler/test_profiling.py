@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+
+from pytest_httpserver import HTTPServer
+
+from scrupy.crawler.profiling import HookProfiler
+from scrupy.request import CrawlResponse
+
+
+def test_profiler_times_hooks(sync_crawler, httpserver: HTTPServer, caplog):
+    """
+    Test that every hook is timed and slow ones are logged with their url.
+    """
+    httpserver.expect_request('/slow')
+    httpserver.expect_request('/fast')
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response: CrawlResponse) -> None:
+            if 'slow' in str(response.request.url):
+                time.sleep(.06)
+
+    profiler = HookProfiler(slow_hook_threshold=.05)
+    crawler = MyCrawler(start_urls=[httpserver.url_for('/slow'), httpserver.url_for('/fast')],
+                        delay_per_request=0, profiler=profiler)
+
+    with caplog.at_level(logging.WARNING):
+        crawler.run()
+
+    stats = profiler.stats()['hooks']
+    assert stats['on_crawled']['calls'] == 2
+    assert stats['on_crawled']['slow_calls'] == 1
+    assert stats['on_crawled']['max'] >= .06
+    assert stats['on_before_crawl']['calls'] == 2
+    assert stats['on_check_if_allowed']['calls'] == 2
+
+    slow_logs = [r.getMessage() for r in caplog.records if r.name == 'scrupy.crawler.profiling']
+    assert len(slow_logs) == 1
+    assert 'on_crawled' in slow_logs[0]
+    assert httpserver.url_for('/slow') in slow_logs[0]
+
+
+def test_profiler_detects_blocked_loop(async_crawler, httpserver: HTTPServer):
+    """
+    Test that a hook blocking the event loop of `AsyncCrawler` is detected.
+    """
+    httpserver.expect_request('/test')
+
+    class MyCrawler(async_crawler):
+        async def on_crawled(self, response: CrawlResponse) -> None:
+            time.sleep(.2)  # Blocking call in an async hook.
+
+    profiler = HookProfiler(loop_block_threshold=.1)
+    MyCrawler(start_urls=[httpserver.url_for('/test')], profiler=profiler).run()
+
+    assert profiler.loop_blocks >= 1
+    assert profiler.loop_blocked_max >= .1
+
+
+def test_profiler_sampling():
+    """
+    Test that the sampling profiler finds where a thread spends its time.
+    """
+
+    def busy_function():
+        deadline = time.monotonic() + .3
+        while time.monotonic() < deadline:
+            pass
+
+    thread = threading.Thread(target=busy_function)
+    thread.start()
+
+    profile = HookProfiler().sample(.2, interval=.001, thread_id=thread.ident)
+    thread.join()
+
+    assert profile.samples > 10
+    assert any('busy_function' in function for function in profile.cumulative)
+    assert 'busy_function' in profile.report()
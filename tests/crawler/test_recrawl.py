@@ -0,0 +1,191 @@
+import math
+
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy import CrawlRequest
+from scrupy.crawler.recrawl import DAY, RecrawlScheduler, estimate_change_rate
+from scrupy.request import CrawlResponse
+
+URL = 'https://example.com/page'
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def response(text, url=URL, status_code=200):
+    return CrawlResponse(request=CrawlRequest(url=url), exception=None, method='GET',
+                         status_code=status_code, http_version='HTTP/1.1', headers={}, text=text)
+
+
+def test_estimate_change_rate():
+    """
+    Test that the change rate is unknown before any check, zero without changes and corrected
+    upwards for pages that change on most checks.
+    """
+    assert estimate_change_rate(0, 0, 0) is None
+    assert estimate_change_rate(4, 0, 4 * DAY) == 0
+    assert estimate_change_rate(10, 5, 10 * DAY) > 5 / (10 * DAY)
+    assert estimate_change_rate(10, 10, 10 * DAY) > estimate_change_rate(10, 9, 10 * DAY)
+
+
+def test_recrawl_scheduler_due_and_lease():
+    """
+    Test that added urls are due at once and are not due again while leased.
+    """
+    clock = Clock()
+    scheduler = RecrawlScheduler(lease=600, clock=clock)
+    scheduler.add([URL, 'https://example.com/other'])
+    scheduler.add(['https://EXAMPLE.com/page#top'])  # Same page.
+
+    assert len(scheduler) == 2
+    assert sorted(scheduler.due()) == ['https://example.com/other', URL]
+    assert scheduler.due() == []
+
+    clock.now += 601
+    assert len(scheduler.due(limit=1)) == 1
+
+
+def test_recrawl_scheduler_adapts_to_changes():
+    """
+    Test that pages that change are crawled more often than pages that do not, within the
+    interval bounds.
+    """
+    clock = Clock()
+    scheduler = RecrawlScheduler(initial_interval=DAY, min_interval=3600,
+                                 max_interval=30 * DAY, clock=clock)
+    static, changing = 'https://example.com/static', 'https://example.com/news'
+
+    for i in range(5):
+        scheduler.record(response('same', static))
+        scheduler.record(response(f'version {i}', changing))
+        clock.now += DAY
+
+    assert scheduler.change_rate(static) == 0
+    assert scheduler.change_rate(changing) > 1
+
+    clock.now -= DAY
+    assert scheduler.due(now=clock.now + DAY / 2) == [changing]
+    assert static not in scheduler.due(now=clock.now + 29 * DAY)
+    assert static in scheduler.due(now=clock.now + 30 * DAY)
+
+
+def test_recrawl_scheduler_interval():
+    """
+    Test that the interval is the time for the page to be `staleness` likely changed.
+    """
+    scheduler = RecrawlScheduler(staleness=.5, min_interval=1, max_interval=10 * DAY)
+    rate = 1 / DAY
+
+    assert scheduler.interval(rate) == pytest.approx(math.log(2) * DAY)
+    assert scheduler.interval(0) == 10 * DAY
+    assert scheduler.interval(None) == scheduler.initial_interval
+
+
+def test_recrawl_scheduler_failed_response():
+    """
+    Test that failed crawls are tried again after `min_interval` and not counted as changes.
+    """
+    clock = Clock()
+    scheduler = RecrawlScheduler(min_interval=3600, clock=clock)
+    scheduler.record(response('page'))
+    clock.now += DAY
+    scheduler.record(response('error', status_code=500))
+
+    assert scheduler.next_due() == clock.now + 3600
+    assert scheduler.change_rate(URL) is None
+
+
+def test_recrawl_scheduler_persists(tmp_path):
+    """
+    Test that the change history is kept between schedulers on the same file.
+    """
+    clock = Clock()
+    path = tmp_path / 'recrawl.db'
+    scheduler = RecrawlScheduler(path, clock=clock)
+    scheduler.record(response('a'))
+    clock.now += DAY
+    scheduler.record(response('b'))
+    scheduler.close()
+
+    assert RecrawlScheduler(path, clock=clock).change_rate(URL) > 0
+
+
+def test_crawler_recrawls_due_urls(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that the crawler crawls the due urls and records their responses in the scheduler.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    clock = Clock()
+    scheduler = RecrawlScheduler(initial_interval=DAY, clock=clock)
+    scheduler.add([httpserver.url_for('/page')])
+
+    crawler = sync_crawler(delay_per_request=0, recrawl=scheduler)
+    crawler.run()
+
+    assert len(crawler.history) == 1
+    assert scheduler.next_due() == clock.now + DAY
+
+    crawler = sync_crawler(delay_per_request=0, recrawl=scheduler)
+    crawler.run()
+    assert len(crawler.history) == 0
+
+
+def test_crawler_recrawls_once_per_run(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that without `run_forever` the due urls are only taken when the crawl starts, not as
+    pages become due again.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    scheduler = RecrawlScheduler(initial_interval=0, min_interval=0, max_interval=0)
+    scheduler.add([httpserver.url_for('/page')])
+
+    crawler = sync_crawler(delay_per_request=0, recrawl=scheduler)
+    crawler.run()
+
+    assert len(crawler.history) == 1
+    assert scheduler.seconds_until_due() == 0
+
+
+def test_crawler_run_forever_recrawls(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that a crawler running forever crawls pages again as they become due.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    scheduler = RecrawlScheduler(initial_interval=.2, min_interval=.2, max_interval=.2)
+    scheduler.add([httpserver.url_for('/page')])
+
+    class MyCrawler(sync_crawler):
+        def on_crawled(self, response):
+            if len(self.history) == 2:
+                self.force_stop()
+
+    crawler = MyCrawler(delay_per_request=0, recrawl=scheduler)
+    crawler.run(run_forever=True, idle_timeout=5)
+
+    assert len(crawler.history) == 2
+
+
+@pytest.mark.anyio
+async def test_async_crawler_run_forever_recrawls(async_crawler, httpserver: HTTPServer):
+    """
+    Test that an async crawler running forever crawls pages again as they become due.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    scheduler = RecrawlScheduler(initial_interval=.2, min_interval=.2, max_interval=.2)
+    scheduler.add([httpserver.url_for('/page')])
+
+    class MyCrawler(async_crawler):
+        async def on_crawled(self, response):
+            if len(self.history) == 2:
+                self.force_stop()
+
+    crawler = MyCrawler(recrawl=scheduler)
+    await crawler.run_async(run_forever=True)
+
+    assert len(crawler.history) == 2
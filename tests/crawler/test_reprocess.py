@@ -0,0 +1,59 @@
+import datetime
+
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy.crawler import Crawler
+from scrupy.crawler.history import CrawlHistory
+from scrupy.crawler.reprocess import CorpusIndex, reprocess
+from scrupy.crawler.warc import WarcWriter
+from scrupy.crawler.writers import JsonLinesWriter
+from scrupy.request import CrawlResponse
+
+
+class TitleCrawler(Crawler):
+    def on_crawled(self, response: CrawlResponse):
+        for title in response.html.find('h1'):
+            yield str(response.request.url), title.text
+
+
+@pytest.fixture
+def pages(httpserver: HTTPServer):
+    urls = []
+    for i in range(5):
+        httpserver.expect_request(f'/page{i}').respond_with_data(
+            f'<html><h1>title {i}</h1></html>', headers={'Content-Type': 'text/html'}
+        )
+        urls.append(httpserver.url_for(f'/page{i}'))
+    return urls
+
+
+@pytest.mark.parametrize('filename', ['crawl.warc.gz', 'crawl.warc'])
+@pytest.mark.parametrize('processes', [0, 2])
+def test_reprocess_warc(pages, tmp_path, filename, processes):
+    """
+    Test that `on_crawled` runs over every response stored in WARC files.
+    """
+    path = tmp_path / filename
+    with WarcWriter(path) as recorder:
+        Crawler(start_urls=pages, delay_per_request=0, recorder=recorder).run()
+
+    assert len(CorpusIndex(path)) == 5
+
+    results = reprocess(TitleCrawler, path, processes=processes, batch_size=2)
+    assert sorted(results) == [(url, f'title {i}') for i, url in enumerate(pages)]
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_reprocess_history_dumps(pages, tmp_path, compression, crawl_request):
+    """
+    Test that `on_crawled` runs over every response stored in `CrawlHistory` dumps.
+    """
+    writer = JsonLinesWriter(tmp_path / 'history.jsonl', compression=compression, buffer_size=100)
+    history = CrawlHistory(writer=writer)
+    history.add(crawl_request, None, datetime.datetime.now())  # Rows without response are skipped.
+
+    Crawler(start_urls=pages, delay_per_request=0, history=history).run()  # Closes the history.
+
+    results = reprocess(TitleCrawler, *writer.paths, processes=2)
+    assert sorted(results) == [(url, f'title {i}') for i, url in enumerate(pages)]
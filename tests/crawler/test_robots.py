@@ -0,0 +1,189 @@
+import threading
+import time
+
+import anyio
+import pytest
+from pytest_httpserver import HTTPServer
+from werkzeug import Response
+
+from scrupy.crawler.robots import AsyncRobotsCache, RobotsCache, RobotsRules
+from scrupy.utils import Url
+
+ROBOTS = '''
+User-agent: otherbot
+Disallow: /
+
+User-agent: *
+Disallow: /private
+Allow: /private/public
+Disallow: /*.pdf$
+Disallow: /search?
+Crawl-delay: 2
+
+Sitemap: https://example.com/sitemap.xml
+'''
+
+
+@pytest.mark.parametrize('path, allowed', [
+    ('/', True),
+    ('/page', True),
+    ('/private', False),
+    ('/private/page', False),
+    ('/private/public/page', True),  # Longest match wins.
+    ('/docs/file.pdf', False),
+    ('/docs/file.pdf?download=1', True),  # `$` anchors the end.
+    ('/search', True),
+    ('/search?q=scrupy', False),
+    ('/robots.txt', True),
+])
+def test_robots_rules(path, allowed):
+    """
+    Test that paths are matched with the longest rule, wildcards and end anchors.
+    """
+    assert RobotsRules.parse(ROBOTS, 'scrupy').allowed(path) is allowed
+
+
+def test_robots_rules_groups():
+    """
+    Test that the group of the user agent is used, `*` otherwise, with its crawl delay.
+    """
+    rules = RobotsRules.parse(ROBOTS, 'OtherBot/1.0')
+    assert not rules.allowed('/page')
+    assert rules.crawl_delay is None
+
+    rules = RobotsRules.parse(ROBOTS, 'scrupy')
+    assert rules.crawl_delay == 2
+    assert rules.sitemaps == ['https://example.com/sitemap.xml']
+
+
+def test_robots_rules_allow_ties():
+    """
+    Test that `Allow` wins when an `Allow` and a `Disallow` rule are as long.
+    """
+    rules = RobotsRules.parse('User-agent: *\nDisallow: /page\nAllow: /page\n')
+    assert rules.allowed('/page')
+
+
+def slow_robots(text: str, delay: float = .2):
+    def handler(request):
+        time.sleep(delay)
+        return Response(text, content_type='text/plain')
+
+    return handler
+
+
+def test_robots_cache_single_flight(httpserver: HTTPServer):
+    """
+    Test that robots.txt is fetched once even if many threads ask for it at the same time.
+    """
+    httpserver.expect_request('/robots.txt').respond_with_handler(slow_robots(ROBOTS))
+    url = Url(httpserver.url_for('/private'))
+    cache = RobotsCache()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.allowed(url)))
+               for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [False] * 10
+    assert cache.fetches == 1
+    assert len(httpserver.log) == 1
+
+
+def test_async_robots_cache_single_flight(httpserver: HTTPServer):
+    """
+    Test that robots.txt is fetched once even if many tasks ask for it at the same time.
+    """
+    httpserver.expect_request('/robots.txt').respond_with_handler(slow_robots(ROBOTS))
+    url = Url(httpserver.url_for('/page'))
+    cache = AsyncRobotsCache()
+    results = []
+
+    async def main():
+        async def check():
+            results.append(await cache.allowed(url))
+
+        async with anyio.create_task_group() as task_group:
+            for _ in range(10):
+                task_group.start_soon(check)
+
+    anyio.run(main)
+
+    assert results == [True] * 10
+    assert cache.fetches == 1
+
+
+def test_robots_cache_ttl_and_lru(httpserver: HTTPServer):
+    """
+    Test that rules expire after the ttl and that the least recently used hosts are dropped.
+    """
+    httpserver.expect_request('/robots.txt').respond_with_data(ROBOTS)
+
+    now = [0.0]
+    cache = RobotsCache(ttl=10, max_hosts=1, clock=lambda: now[0])
+    url = Url(httpserver.url_for('/private'))
+
+    assert not cache.allowed(url)
+    now[0] = 5
+    assert not cache.allowed(url)
+    assert cache.fetches == 1
+
+    now[0] = 11
+    assert not cache.allowed(url)
+    assert cache.fetches == 2
+
+    other_host = Url(httpserver.url_for('/private').replace('localhost', '127.0.0.1'))
+    cache.allowed(other_host)
+    assert len(cache) == 1
+    assert cache.fetches == 3
+
+
+def test_robots_cache_missing_and_errors(httpserver: HTTPServer):
+    """
+    Test that a missing robots.txt allows everything and a server error disallows everything.
+    """
+    httpserver.expect_oneshot_request('/robots.txt').respond_with_data('', status=404)
+    url = Url(httpserver.url_for('/private'))
+    assert RobotsCache().allowed(url)
+
+    httpserver.expect_oneshot_request('/robots.txt').respond_with_data('', status=503)
+    assert not RobotsCache().allowed(url)
+
+
+def test_crawler_obeys_robots(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that disallowed urls never reach the frontier and that `Crawl-delay` sets the delay of
+    the domain.
+    """
+    httpserver.expect_request('/robots.txt').respond_with_data(ROBOTS)
+    httpserver.expect_request('/page').respond_with_data('page')
+
+    crawler = sync_crawler(robots=True, delay_per_request=0, start_urls=[
+        httpserver.url_for('/page'), httpserver.url_for('/private'),
+    ])
+
+    assert len(crawler.frontier) == 1
+    assert crawler.history.skipped_disallowed == 1
+    assert crawler.frontier.delay_rules.get_delay(next(iter(crawler.frontier)).url.domain) == 2
+
+    crawler.run()
+    assert [row.request.url.url.path for row in crawler.history] == ['/page']
+
+
+def test_async_crawler_obeys_robots(async_crawler, httpserver: HTTPServer):
+    """
+    Test that the async crawler drops disallowed urls.
+    """
+    httpserver.expect_request('/robots.txt').respond_with_data(ROBOTS)
+    httpserver.expect_request('/page').respond_with_data('page')
+
+    crawler = async_crawler(robots=True, start_urls=[
+        httpserver.url_for('/page'), httpserver.url_for('/search?q=1'),
+    ])
+    crawler.run()
+
+    assert [row.request.url.url.path for row in crawler.history] == ['/page']
+    assert crawler.history.skipped_disallowed == 1
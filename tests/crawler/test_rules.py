@@ -0,0 +1,73 @@
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy import CrawlRequest
+from scrupy.crawler.rules import DomainTrie, UrlRules
+
+
+def test_domain_trie():
+    """
+    Test that domains match themselves and their subdomains only.
+    """
+    trie = DomainTrie(['example.com', 'Other.ORG.'])
+
+    assert trie.match('example.com')
+    assert trie.match('www.example.com')
+    assert trie.match('other.org')
+    assert not trie.match('badexample.com')
+    assert not trie.match('com')
+    assert len(trie) == 2
+
+
+@pytest.mark.parametrize('url, depth, allowed', [
+    ('https://example.com/blog/post', 0, True),
+    ('https://www.example.com/blog/post', 0, True),
+    ('https://other.com/blog/post', 0, False),
+    ('https://ads.example.com/blog/post', 0, False),
+    ('https://example.com/about', 0, False),
+    ('https://example.com/docs/42', 0, True),
+    ('https://example.com/docs/latest', 0, False),
+    ('https://example.com/blog/login', 0, True),
+    ('https://example.com/blog/file.PDF', 0, False),
+    ('https://example.com/blog/post?print=1', 0, False),
+    ('https://example.com/blog/post', 3, False),
+])
+def test_url_rules(url, depth, allowed):
+    """
+    Test that domains, paths, patterns, extensions and depth are all checked.
+    """
+    rules = UrlRules(
+        allow_domains=['example.com'],
+        deny_domains=['ads.example.com'],
+        allow_paths=['/blog/'],
+        allow_patterns=[r'/docs/\d+$'],
+        deny_patterns=[r'[?&]print='],
+        max_depth=2,
+    )
+    assert rules.allowed(url, depth) is allowed
+
+
+def test_url_rules_filter():
+    """
+    Test that strings and requests are filtered in bulk and rejections counted.
+    """
+    rules = UrlRules(deny_paths=['/private'], max_depth=1)
+    urls = ['https://a.com/', 'https://a.com/private/x', CrawlRequest('https://a.com/ok')]
+
+    assert rules.filter(urls) == [urls[0], urls[2]]
+    assert rules.filter(urls, depth=2) == []
+    assert rules.rejected == 4
+
+
+def test_crawler_rules(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that urls rejected by the rules never become requests.
+    """
+    rules = UrlRules(deny_paths=['/private'], max_depth=1)
+    crawler = sync_crawler(rules=rules)
+
+    crawler.add_to_queue([httpserver.url_for('/page'), httpserver.url_for('/private')])
+    crawler.add_to_queue(httpserver.url_for('/deep'), depth=2)
+
+    assert [request.url.url.path for request in crawler.frontier] == ['/page']
+    assert rules.rejected == 2
@@ -0,0 +1,136 @@
+import gzip
+
+from pytest_httpserver import HTTPServer
+
+from scrupy.crawler.frontier import DelayRules
+from scrupy.crawler.sitemaps import AsyncSitemapSource, SitemapParser, SitemapSource
+
+SITEMAP = '''<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+    <url>
+        <loc>https://example.com/1</loc>
+        <lastmod>2024-01-01</lastmod>
+        <priority>0.8</priority>
+    </url>
+    <url><loc>https://example.com/2</loc><changefreq>daily</changefreq></url>
+    <url><loc>https://example.com/3</loc></url>
+</urlset>
+'''
+
+
+def sitemap_index(*locs: str) -> str:
+    sitemaps = ''.join(f'<sitemap><loc>{loc}</loc></sitemap>' for loc in locs)
+    return ('<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            f'{sitemaps}</sitemapindex>')
+
+
+def sitemap(*locs: str) -> str:
+    urls = ''.join(f'<url><loc>{loc}</loc></url>' for loc in locs)
+    return f'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+
+def parse_in_chunks(data: bytes, size: int = 7) -> list:
+    parser = SitemapParser()
+    entries = []
+    for i in range(0, len(data), size):
+        entries += parser.feed(data[i:i + size])
+    return entries + parser.close()
+
+
+def test_sitemap_parser_chunks():
+    """
+    Test that sitemaps are parsed when fed in small chunks, plain or gzipped.
+    """
+    expected = [
+        ('url', {'loc': 'https://example.com/1', 'lastmod': '2024-01-01', 'priority': .8}),
+        ('url', {'loc': 'https://example.com/2', 'changefreq': 'daily'}),
+        ('url', {'loc': 'https://example.com/3'}),
+    ]
+
+    assert parse_in_chunks(SITEMAP.encode()) == expected
+    assert parse_in_chunks(gzip.compress(SITEMAP.encode())) == expected
+    assert parse_in_chunks(gzip.compress(SITEMAP.encode()), size=1) == expected
+
+
+def test_sitemap_source_follows_indexes(httpserver: HTTPServer):
+    """
+    Test that sitemap indexes are followed, gzipped sitemaps read and entries kept in `meta`.
+    """
+    httpserver.expect_request('/sitemap_index.xml').respond_with_data(
+        sitemap_index(httpserver.url_for('/sitemap.xml'), httpserver.url_for('/sitemap2.xml.gz'))
+    )
+    httpserver.expect_request('/sitemap.xml').respond_with_data(SITEMAP)
+    httpserver.expect_request('/sitemap2.xml.gz').respond_with_data(
+        gzip.compress(sitemap('https://example.com/4').encode()),
+        content_type='application/gzip',
+    )
+
+    requests = list(SitemapSource(httpserver.url_for('/sitemap_index.xml')))
+
+    assert [str(request.url) for request in requests] == [
+        f'https://example.com/{i}' for i in range(1, 5)
+    ]
+    assert requests[0].meta == {'lastmod': '2024-01-01', 'priority': .8,
+                                'sitemap': httpserver.url_for('/sitemap.xml')}
+
+    requests = list(SitemapSource(httpserver.url_for('/sitemap_index.xml'), follow_indexes=False))
+    assert requests == []
+
+
+def test_sitemap_source_skips_errors(httpserver: HTTPServer):
+    """
+    Test that sitemaps that cannot be fetched or parsed are skipped.
+    """
+    httpserver.expect_request('/missing.xml').respond_with_data('', status=404)
+    httpserver.expect_request('/broken.xml').respond_with_data('<urlset><url>')
+    httpserver.expect_request('/sitemap.xml').respond_with_data(SITEMAP)
+
+    source = SitemapSource(*(httpserver.url_for(path)
+                             for path in ('/missing.xml', '/broken.xml', '/sitemap.xml')))
+    assert len(list(source)) == 3
+
+
+def test_crawler_lazy_start_urls(sync_crawler, httpserver: HTTPServer):
+    """
+    Test that a generator of start urls is consumed as the frontier has room for them.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+    frontier_sizes = []
+
+    class MyCrawler(sync_crawler):
+        seed_batch_size = 3
+
+        def on_before_crawl(self, request):
+            frontier_sizes.append(len(self.frontier))
+            return request
+
+    urls = (httpserver.url_for(f'/page?i={i}') for i in range(10))
+    crawler = MyCrawler(start_urls=urls, delay_per_request=0)
+    assert len(crawler.frontier) == 0
+
+    crawler.run()
+
+    assert len(crawler.history) == 10
+    # Refilled with a batch when it has less than one, it never holds the 10 urls at once.
+    assert max(frontier_sizes) < 2 * MyCrawler.seed_batch_size
+
+
+def test_async_crawler_sitemap_start_urls(async_crawler, httpserver: HTTPServer):
+    """
+    Test that the async crawler is seeded from an async sitemap source.
+    """
+    httpserver.expect_request('/sitemap.xml').respond_with_data(
+        sitemap(*(httpserver.url_for(f'/page?i={i}') for i in range(5)))
+    )
+    httpserver.expect_request('/page').respond_with_data('page')
+
+    class MyCrawler(async_crawler):
+        seed_batch_size = 2
+
+    crawler = MyCrawler(start_urls=AsyncSitemapSource(httpserver.url_for('/sitemap.xml')))
+    crawler.frontier.delay_rules = DelayRules(default=0)
+    crawler.run()
+
+    assert len(crawler.history) == 5
+    assert all(row.request.meta['sitemap'] == httpserver.url_for('/sitemap.xml')
+               for row in crawler.history)
@@ -0,0 +1,111 @@
+import httpx
+import pytest
+from pytest_httpserver import HTTPServer
+
+from scrupy.crawler.warc import (AsyncWarcReplayClient, ReplayMissError, WarcIndex,
+                                 WarcReplayClient, WarcWriter, iter_warc_records,
+                                 parse_http_response, parse_record)
+
+
+@pytest.fixture
+def recorded_crawl(httpserver: HTTPServer, sync_crawler, tmp_path):
+    """
+    Records a crawl of two pages, returns the urls and the path of the WARC file.
+    """
+    httpserver.expect_request('/page1').respond_with_data(
+        '<html><a href="/page2"></a></html>', headers={'Content-Type': 'text/html'}
+    )
+    httpserver.expect_request('/page2').respond_with_json({'page': 2})
+
+    urls = [httpserver.url_for('/page1'), httpserver.url_for('/page2')]
+    path = tmp_path / 'crawl.warc.gz'
+
+    with WarcWriter(path) as recorder:
+        sync_crawler(start_urls=urls, delay_per_request=0, recorder=recorder).run()
+
+    return urls, path
+
+
+def test_warc_records_responses(recorded_crawl):
+    """
+    Test that a warcinfo record and a response/request pair per crawled page are recorded.
+    """
+    urls, path = recorded_crawl
+    records = list(iter_warc_records(path))
+
+    assert [r.type for r in records] == ['warcinfo', 'response', 'request', 'response', 'request']
+    assert [r.target_uri for r in records if r.type == 'response'] == urls
+    assert records[2].headers['WARC-Concurrent-To'] == records[1].headers['WARC-Record-ID']
+    assert records[1].block.split(b' ', 1)[1].startswith(b'200 OK\r\n')
+
+
+def test_warc_records_repeated_headers(sync_crawler, httpserver: HTTPServer, tmp_path):
+    """
+    Test that repeated headers are recorded one by one and headers without a space after the
+    colon are parsed.
+    """
+    httpserver.expect_request('/cookies').respond_with_data(
+        'ok', headers=[('Set-Cookie', 'a=1'), ('Set-Cookie', 'b=2')])
+
+    path = tmp_path / 'crawl.warc'
+    with WarcWriter(path) as recorder:
+        sync_crawler(start_urls=[httpserver.url_for('/cookies')], delay_per_request=0,
+                     recorder=recorder).run()
+
+    response = next(r for r in iter_warc_records(path) if r.type == 'response')
+    _, _, headers, body = parse_http_response(response.block)
+    assert [v for k, v in headers if k.lower() == 'set-cookie'] == ['a=1', 'b=2']
+    assert body == b'ok'
+
+    assert parse_http_response(b'HTTP/1.1 200 OK\r\nContent-Type:text/html\r\n\r\nx')[2] \
+        == [('Content-Type', 'text/html')]
+    record, _ = parse_record(
+        b'WARC/1.1\r\nWARC-Type:response\r\nContent-Length: 1\r\n\r\nx\r\n\r\n')
+    assert record.headers == {'WARC-Type': 'response', 'Content-Length': '1'}
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_warc_replays_responses(recorded_crawl, sync_crawler, httpserver: HTTPServer, tmp_path,
+                                compress):
+    """
+    Test that a crawl can be replayed from the WARC files without the server.
+    """
+    urls, path = recorded_crawl
+
+    if not compress:
+        plain = tmp_path / 'crawl.warc'
+        with WarcWriter(plain) as recorder:
+            for record in iter_warc_records(path):
+                if record.type != 'warcinfo':
+                    recorder._write(record.headers, record.block)
+        path = plain
+
+    httpserver.clear()  # Anything reaching the server now would fail.
+
+    index = WarcIndex(path)
+    assert len(index) == 2
+
+    crawler = sync_crawler(start_urls=[*urls, urls[0] + '/missing'], delay_per_request=0,
+                           crawl_client=WarcReplayClient(index))
+    crawler.run()
+
+    first, second, missing = [row.response for row in crawler.history]
+    assert first.status_code == 200
+    assert first.html.links == ['/page2']
+    assert second.json == {'page': 2}
+    assert isinstance(missing.exception, ReplayMissError)
+
+
+def test_warc_replays_responses_async(recorded_crawl, async_crawler, httpserver: HTTPServer):
+    """
+    Test that `AsyncCrawler` can replay a crawl from the WARC files.
+    """
+    urls, path = recorded_crawl
+    httpserver.clear()  # Anything reaching the server now would fail.
+
+    crawler = async_crawler(start_urls=urls, crawl_client=AsyncWarcReplayClient(WarcIndex(path)))
+    crawler.run()
+
+    assert len(crawler.history) == 2
+    assert all(row.response.status_code == 200 for row in crawler.history)
+    assert not any(isinstance(row.response.exception, httpx.ConnectError) for row in crawler.history)
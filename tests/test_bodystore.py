@@ -0,0 +1,119 @@
+import datetime
+import random
+
+from scrupy import CrawlRequest
+from scrupy.crawler.bodystore import BodyStore, body_hash
+from scrupy.crawler.history import CrawlHistory
+from scrupy.request import CrawlResponse
+
+WORDS = [f'word{i}' for i in range(300)]
+
+
+def page(seed: int) -> bytes:
+    rng = random.Random(seed)
+    content = ' '.join(rng.choice(WORDS) for _ in range(200))
+    return (f'<html><head><title>Example site</title><link rel="stylesheet" href="/main.css">'
+            f'</head><body><nav><a href="/">Home</a><a href="/about">About</a></nav>'
+            f'<main><p>{content}</p></main><footer>Copyright Example</footer></body></html>'
+            ).encode()
+
+
+def response(url: str, text: str) -> CrawlResponse:
+    return CrawlResponse(request=CrawlRequest(url), exception=None, method='GET',
+                         status_code=200, http_version='HTTP/1.1', headers={}, text=text)
+
+
+def test_body_store_deduplicates(tmp_path):
+    """
+    Test that identical bodies are stored once and read back the same.
+    """
+    with BodyStore(tmp_path) as store:
+        keys = [store.put(body) for body in (page(1), page(2), page(1))]
+
+        assert keys[0] == keys[2] == body_hash(page(1))
+        assert len(store) == 2
+        assert store.get(keys[1]) == page(2)
+        assert store.size == 2 * len(page(1)) + len(page(2))
+        assert store.stored_size < len(page(1)) + len(page(2))
+
+
+def test_body_store_bounds_samples(tmp_path):
+    """
+    Test that dictionary samples are dropped, least recently sampled domain first, once they take
+    more than `max_sample_bytes`.
+    """
+    with BodyStore(tmp_path, train_dictionaries=True, dictionary_samples=10,
+                   max_sample_bytes=5000) as store:
+        for i, domain in enumerate(['a', 'a', 'b', 'a', 'c']):
+            store.put(bytes([i]) * 1000, domain)
+        assert list(store._samples) == ['b', 'a', 'c']
+
+        store.put(bytes([5]) * 1000, 'c')
+        assert list(store._samples) == ['a', 'c']
+        assert store._sample_bytes == 5000
+
+
+def test_body_store_segments_and_reopen(tmp_path):
+    """
+    Test that bodies are spread over segments and found again when the store is reopened.
+    """
+    store = BodyStore(tmp_path, segment_size=1000)
+    keys = [store.put(page(i)) for i in range(10)]
+    store.close()
+
+    assert len(list(tmp_path.glob('segment-*.bin'))) > 1
+
+    with BodyStore(tmp_path) as store:
+        assert [store.get(key) for key in keys] == [page(i) for i in range(10)]
+        key = store.put(b'new')
+        assert store.get(key) == b'new'
+
+
+def test_body_store_trains_domain_dictionaries(tmp_path):
+    """
+    Test that a dictionary is trained from the first pages of a domain and compresses the next
+    ones better.
+    """
+    plain = BodyStore(tmp_path / 'plain')
+    trained = BodyStore(tmp_path / 'trained', train_dictionaries=True, dictionary_samples=50,
+                        dictionary_size=8 * 1024)
+    for i in range(50):
+        trained.put(page(i), 'example')
+
+    assert trained.domain_dictionaries == {'example': 1}
+
+    sizes = {}
+    for name, store in (('plain', plain), ('trained', trained)):
+        before = store.stored_size
+        keys = [store.put(page(i), 'example') for i in range(100, 120)]
+        sizes[name] = store.stored_size - before
+        assert [store.get(key) for key in keys] == [page(i) for i in range(100, 120)]
+        store.close()
+
+    assert sizes['trained'] < sizes['plain']
+
+    with BodyStore(tmp_path / 'trained', train_dictionaries=True) as store:
+        assert store.get(body_hash(page(110))) == page(110)
+
+
+def test_history_moves_bodies_to_store(tmp_path):
+    """
+    Test that the history keeps the hash of the bodies and loads them on access, leaving the
+    response itself untouched.
+    """
+    store = BodyStore(tmp_path)
+    history = CrawlHistory(body_store=store)
+    crawled = response('https://example.com/', page(1).decode())
+    history.add(crawled.request, crawled, datetime.datetime.now())
+
+    row = history[0]
+    assert row.response.text is None and crawled.text == page(1).decode()
+    assert row.body_hash == body_hash(page(1))
+    assert row.body == page(1)
+    assert row.as_dict()['body_hash'] == body_hash(page(1)).hex()
+
+    metadata = CrawlHistory(retention='metadata', body_store=store)
+    metadata.add(crawled.request, crawled, datetime.datetime.now())
+    assert metadata.load_body(metadata[0]) == page(1)
+    assert len(store) == 1
+    store.close()
@@ -0,0 +1,62 @@
+import pytest
+
+from scrupy.canonical import FINGERPRINT_SIZE, UrlCanonicalizer
+from scrupy.utils import Url
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM/x', 'http://example.com/x'),
+    ('http://example.com:80/x', 'http://example.com/x'),
+    ('https://example.com:443/x', 'https://example.com/x'),
+    ('http://example.com:8080/x', 'http://example.com:8080/x'),
+    ('http://example.com', 'http://example.com/'),
+    ('http://example.com/x?b=1&a=2', 'http://example.com/x?a=2&b=1'),
+    ('http://example.com/x#frag', 'http://example.com/x'),
+    ('http://example.com/x?utm_source=a&id=1&fbclid=b&UTM_Medium=c', 'http://example.com/x?id=1'),
+    ('http://example.com/%7euser/a%2fb c', 'http://example.com/~user/a%2Fb%20c'),
+    ('http://example.com/a/./b/../c', 'http://example.com/a/c'),
+    ('http://user@example.com./x?', 'http://user@example.com/x'),
+])
+def test_canonicalize(url, expected):
+    """
+    Test that urls of the same page get the same canonical form.
+    """
+    assert UrlCanonicalizer().canonicalize(url) == expected
+
+
+def test_canonicalizer_options():
+    """
+    Test that every normalization that changes which page is requested can be turned off.
+    """
+    canonicalizer = UrlCanonicalizer(remove_params={'sessionid'}, remove_param_prefixes=(),
+                                     sort_query=False, strip_fragment=False)
+
+    assert canonicalizer.canonicalize('http://a.com/?b=1&sessionid=x&utm_source=y&a=2#f') == \
+           'http://a.com/?b=1&utm_source=y&a=2#f'
+
+
+def test_url_fingerprint():
+    """
+    Test that urls are equal, and hash the same, when they have the same canonical form.
+    """
+    url = Url('http://a.com/x?b=1&a=2')
+
+    assert len(url.fingerprint) == FINGERPRINT_SIZE
+    assert url == Url('http://A.com/x?a=2&b=1&utm_campaign=z#frag')
+    assert url == 'http://a.com:80/x?a=2&b=1'
+    assert url != Url('http://a.com/x?a=2')
+    assert len({url, Url('http://a.com/x?a=2&b=1')}) == 1
+
+
+def test_url_host_is_cached(monkeypatch):
+    """
+    Test that the canonical host of a url is computed once, it is read for every frontier lookup.
+    """
+    url = Url('http://Bücher.example.COM:80/x')
+    calls = []
+    host = Url.canonicalizer.host
+    monkeypatch.setattr(Url.canonicalizer, 'host',
+                        lambda parsed: calls.append(parsed) or host(parsed))
+
+    assert url.host == url.host == 'xn--bcher-kva.example.com'
+    assert len(calls) == 1
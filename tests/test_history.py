@@ -2,6 +2,9 @@ import datetime
 import json
 import pathlib
 
+import pytest
+
+from scrupy import CrawlRequest
 from scrupy.crawler.history import CrawlHistory
 
 
@@ -47,10 +50,92 @@ def test_history_persists(crawl_request, tmp_path):
     expected = [
         {'id': 0,
          'request': {'url': 'https://www.myfixtureurl.com', 'method': 'GET', 'headers': {},
-                     '_user_agent': 'NOTSET', 'cookies': 'NOTSET', 'type': 'httpx'},
-         'response': None, 'crawled_at': '0001-01-01 00:00:00'},
+                     '_user_agent': 'NOTSET', 'cookies': 'NOTSET', 'type': 'httpx',
+                     'meta': {}, 'depth': None, 'parent': None},
+         'response': None, 'crawled_at': '0001-01-01 00:00:00', 'timings': None},
         {'id': 1, 'request': {
             'url': 'https://www.myfixtureurl.com', 'method': 'GET', 'headers': {},
-            '_user_agent': 'NOTSET', 'cookies': 'NOTSET', 'type': 'httpx'}, 'response': 'response',
-         'crawled_at': '0002-02-02 00:00:00'}]
+            '_user_agent': 'NOTSET', 'cookies': 'NOTSET', 'type': 'httpx', 'meta': {},
+            'depth': None, 'parent': None},
+         'response': 'response',
+         'crawled_at': '0002-02-02 00:00:00', 'timings': None}]
     assert expected == res
+
+
+def test_history_retention_metadata(crawl_request, successful_response):
+    """
+    Test that with 'metadata' retention only the metadata of the response is kept.
+    """
+    successful_response.text = '<html></html>'
+
+    history = CrawlHistory(retention='metadata')
+    history.add(crawl_request, successful_response, datetime.datetime(2024, 1, 1))
+    history.add(crawl_request, None, datetime.datetime(2024, 1, 2))
+
+    assert len(history) == 2
+
+    row = history[0]
+    assert row.id == 0
+    assert row.url == 'https://www.myfixtureurl.com'
+    assert row.status_code == 200
+    assert row.size == len('<html></html>')
+    assert len(row.content_hash) == 16
+    assert row.crawled_at == datetime.datetime(2024, 1, 1)
+
+    assert history[-1].status_code is None
+    assert history[-1].content_hash is None
+    assert [row.id for row in history] == [0, 1]
+
+    assert history.exists(crawl_request.url)
+    assert not history.exists('http://urlthatdoesnotexist.com')
+
+
+def test_history_retention_ring(crawl_request):
+    """
+    Test that with 'ring' retention only the last `max_rows` are kept.
+    """
+    with pytest.raises(ValueError):
+        CrawlHistory(retention='ring')
+
+    history = CrawlHistory(retention='ring', max_rows=2)
+    for _ in range(5):
+        history.add(crawl_request, None, datetime.datetime.now())
+
+    assert len(history) == 2
+    assert [row.id for row in history] == [3, 4]
+
+
+def test_history_retention_metadata_is_compact(crawl_request, successful_response):
+    """
+    Test that metadata rows use a compact layout.
+    """
+    successful_response.text = 'a' * 10_000
+
+    history = CrawlHistory(retention='metadata')
+    for _ in range(10_000):
+        history.add(crawl_request, successful_response, datetime.datetime.now())
+
+    store = history.history
+    used = sum(len(column) * column.itemsize for column in (
+        store.url_offsets, store.status_codes, store.elapsed, store.sizes, store.crawled_at,
+        store._table
+    )) + len(store.urls) + len(store.content_hashes) + len(store.fingerprints)
+
+    assert used / len(history) < 100
+
+
+def test_history_retention_metadata_exists():
+    """
+    Test that the metadata store finds urls by their canonical form, also after its fingerprint
+    table grows.
+    """
+    history = CrawlHistory(retention='metadata')
+    for i in range(1000):
+        history.add(CrawlRequest(f'https://example.com/{i}?b=1&a=2'), None,
+                    datetime.datetime.now())
+    history.add(CrawlRequest('https://example.com/0?a=2&b=1'), None, datetime.datetime.now())
+
+    assert history._fingerprints is None
+    assert history.history._table_rows == 1000
+    assert all(history.exists(f'https://EXAMPLE.com/{i}?a=2&b=1') for i in range(1000))
+    assert not history.exists('https://example.com/1000?a=2&b=1')
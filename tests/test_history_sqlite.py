@@ -0,0 +1,122 @@
+import datetime
+import sqlite3
+
+from scrupy import CrawlRequest
+from scrupy.crawler.history_sqlite import SqliteCrawlHistory
+
+
+def test_sqlite_history_adds(crawl_request, successful_response):
+    """
+    Test that rows are added and can be read back, also before the batch is flushed.
+    """
+    history = SqliteCrawlHistory(batch_size=10)
+    history.add(crawl_request, successful_response, datetime.datetime(2024, 1, 1))
+    history.add(crawl_request, None, datetime.datetime(2024, 1, 2))
+
+    assert len(history) == 2
+    assert history[0].id == 0
+    assert history[0].url == 'https://www.myfixtureurl.com'
+    assert history[0].status_code == 200
+    assert history[-1].id == 1
+    assert history[-1].crawled_at == datetime.datetime(2024, 1, 2)
+    assert [row.id for row in history] == [0, 1]
+    assert [row.id for row in history[:1]] == [0]
+
+
+def test_sqlite_history_url_exists(crawl_request):
+    """
+    Test `SqliteCrawlHistory.exists` and `SqliteCrawlHistory.was_crawled_after`
+    """
+    history = SqliteCrawlHistory()
+    history.add(crawl_request, None, datetime.datetime(2024, 1, 1))
+
+    assert history.exists(crawl_request.url)
+    assert not history.exists('http://urlthatdoesnotexist.com')
+
+    assert history.was_crawled_after(crawl_request.url, datetime.datetime(2023, 1, 1))
+    assert not history.was_crawled_after(crawl_request.url, datetime.datetime(2024, 1, 1))
+
+
+def test_sqlite_history_query(successful_response):
+    """
+    Test querying the history by domain, status and crawl time.
+    """
+    history = SqliteCrawlHistory(batch_size=2)
+
+    for i, (url, status_code) in enumerate([
+        ('https://example.com/1', 200),
+        ('https://example.com/2', 503),
+        ('https://example.com/3', 500),
+        ('https://other.com/1', 502),
+    ]):
+        successful_response.status_code = status_code
+        history.add(CrawlRequest(url), successful_response, datetime.datetime(2024, 1, 1 + i))
+
+    assert [row.url for row in history.query(domain='example', status_class=5)] == [
+        'https://example.com/2', 'https://example.com/3'
+    ]
+    assert [row.url for row in history.query(status_code=502)] == ['https://other.com/1']
+    assert len(list(history.query(crawled_after=datetime.datetime(2024, 1, 2)))) == 2
+    assert len(list(history.query(limit=1))) == 1
+
+
+def test_sqlite_history_persists(crawl_request, tmp_path):
+    """
+    Test that the history is persisted and the numbering continues when reopened.
+    """
+    path = tmp_path / 'history.db'
+
+    history = SqliteCrawlHistory(path)
+    history.add(crawl_request, None, datetime.datetime(2024, 1, 1))
+    history.close()
+    assert history.connection is None
+    assert len(list(history.query())) == 1  # Opened again to read.
+    history.close()
+
+    history = SqliteCrawlHistory(path)
+    history.add(crawl_request, None, datetime.datetime(2024, 1, 2))
+
+    assert len(history) == 2
+    assert history[1].id == 1
+
+
+def test_sqlite_history_exists_canonical(tmp_path):
+    """
+    Test that urls are found by their canonical form, also in databases without fingerprints,
+    by `exists` and `was_crawled_after`.
+    """
+    path = tmp_path / 'history.db'
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE history (id INTEGER PRIMARY KEY, url TEXT NOT NULL,'
+                       ' domain TEXT, status_code INTEGER, elapsed REAL, size INTEGER,'
+                       ' content_hash BLOB, crawled_at REAL NOT NULL)')
+    connection.execute("INSERT INTO history VALUES (0, 'http://old.com/', 'old', 200, 1, 1, NULL, 0)")
+    connection.commit()
+    connection.close()
+
+    history = SqliteCrawlHistory(path)
+    history.add(CrawlRequest('http://a.com/x?b=1&a=2'), None, datetime.datetime(2024, 1, 1))
+
+    assert history.exists('http://old.com/')
+    assert history.exists('http://A.com/x?a=2&b=1#frag')
+    assert not history.exists('http://a.com/x?a=2')
+
+    assert history.was_crawled_after('http://old.com/', datetime.datetime(1969, 12, 31))
+    assert history.was_crawled_after('http://A.com/x?a=2&b=1#frag', datetime.datetime(2023, 1, 1))
+    assert not history.was_crawled_after('http://A.com/x?a=2&b=1', datetime.datetime(2024, 1, 1))
+
+
+def test_sqlite_history_after_crawl(sync_crawler, httpserver, tmp_path):
+    """
+    Test that the history can be read after the crawler closed it, in memory or on disk.
+    """
+    httpserver.expect_request('/page').respond_with_data('page')
+
+    for history in (SqliteCrawlHistory(), SqliteCrawlHistory(tmp_path / 'history.db')):
+        sync_crawler(start_urls=[httpserver.url_for('/page')], delay_per_request=0,
+                     history=history).run()
+
+        assert len(history) == 1
+        assert [row.url for row in history] == [httpserver.url_for('/page')]
+        assert history[0].status_code == 200
+        assert history.exists(httpserver.url_for('/page'))
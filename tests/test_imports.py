@@ -0,0 +1,37 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def imported_modules(statement: str, modules: tuple[str, ...]) -> list[str]:
+    """
+    Runs `statement` in a fresh interpreter and returns which of `modules` ended up imported.
+    """
+    code = f'import sys; {statement}; print(",".join(m for m in {modules!r} if m in sys.modules))'
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return [m for m in out.stdout.strip().split(',') if m]
+
+
+@pytest.mark.parametrize('statement, not_expected', [
+    ('import scrupy',
+     ('httpx', 'anyio', 'trio', 'tldextract', 'fake_useragent', 'selectolax')),
+    ('from scrupy import CrawlRequest; CrawlRequest("https://example.com")',
+     ('httpx', 'anyio', 'trio', 'tldextract', 'fake_useragent', 'selectolax')),
+    ('from scrupy.crawler import Crawler; Crawler(start_urls=["https://example.com"])',
+     ('tldextract', 'fake_useragent', 'selectolax')),
+])
+def test_lazy_imports(statement, not_expected):
+    """
+    Test that backends are only imported when they are used.
+    """
+    assert imported_modules(statement, not_expected) == []
+
+
+def test_lazy_imports_are_loaded_on_use():
+    """
+    Test that lazily imported backends are imported once they are actually needed.
+    """
+    statement = ('from scrupy.crawler import Crawler;'
+                 'Crawler(randomize_user_agent_per_request=True)._build_request("https://example.com")')
+    assert imported_modules(statement, ('fake_useragent',)) == ['fake_useragent']
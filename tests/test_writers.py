@@ -0,0 +1,102 @@
+import datetime
+import gzip
+import time
+
+import pytest
+
+from scrupy.crawler.history import CrawlHistory
+from scrupy.crawler.writers import JsonLinesWriter, iter_json_lines
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_writer_writes_json_lines(tmp_path, compression):
+    """
+    Test that every written object ends up in the file, with the given compression.
+    """
+    objects = [{'id': i, 'url': f'https://example.com/{i}'} for i in range(100)]
+
+    with JsonLinesWriter(tmp_path / 'out.jsonl', compression=compression, buffer_size=256) as w:
+        for obj in objects:
+            w.write(obj)
+
+    assert len(w.paths) == 1
+    assert list(iter_json_lines(*w.paths)) == objects
+
+
+def test_writer_rotates_files(tmp_path):
+    """
+    Test that files are rotated once they reach `max_file_size`.
+    """
+    writer = JsonLinesWriter(tmp_path / 'out.jsonl', compression='gzip', buffer_size=100,
+                             max_file_size=200)
+    objects = [{'id': i, 'text': str(i) * 50} for i in range(50)]
+    for obj in objects:
+        writer.write(obj)
+    writer.close()
+
+    assert len(writer.paths) > 1
+    assert writer.paths[0].name == 'out-00000.jsonl.gz'
+    assert list(iter_json_lines(*writer.paths)) == objects
+
+
+def test_writer_flushes_in_background(tmp_path):
+    """
+    Test that buffered objects are written after `flush_interval` without closing the writer.
+    """
+    writer = JsonLinesWriter(tmp_path / 'out.jsonl', compression='gzip', flush_interval=.05)
+    writer.write({'id': 1})
+
+    writer._thread.join(timeout=.3)  # Still running, gives it time to flush.
+
+    # Readable while the writer is still open.
+    assert gzip.decompress((tmp_path / 'out.jsonl.gz').read_bytes()) == b'{"id": 1}\n'
+    writer.close()
+
+
+def test_writer_flushes_while_busy(tmp_path):
+    """
+    Test that buffered objects are written every `flush_interval` even while the background
+    thread keeps getting other buffers.
+    """
+    writer = JsonLinesWriter(tmp_path / 'out.jsonl', flush_interval=.05)
+    writer.write({'id': 1})
+
+    for _ in range(15):
+        writer._pending.put(b'')  # Like full buffers arriving, more often than every 50ms.
+        time.sleep(.02)
+
+    assert (tmp_path / 'out.jsonl').read_bytes() == b'{"id": 1}\n'
+    writer.close()
+
+
+def test_writer_raises_write_errors(tmp_path):
+    """
+    Test that a failed background write is raised by the next `flush` and by `close`.
+    """
+    (tmp_path / 'out.jsonl').mkdir()  # Can't be opened for writing.
+
+    writer = JsonLinesWriter(tmp_path / 'out.jsonl', buffer_size=1)
+    writer.write({'id': 1})
+    writer._thread.join(timeout=.3)  # Still running, gives it time to fail.
+
+    with pytest.raises(IsADirectoryError):
+        writer.flush()
+    with pytest.raises(IsADirectoryError):
+        writer.close()
+
+
+def test_history_streams_to_writer(crawl_request, successful_response, tmp_path):
+    """
+    Test that history rows are streamed to the writer as they are added.
+    """
+    writer = JsonLinesWriter(tmp_path / 'history.jsonl')
+    history = CrawlHistory(writer=writer)
+    history.add(crawl_request, successful_response, datetime.datetime(2024, 1, 1))
+    history.add(crawl_request, None, datetime.datetime(2024, 1, 1))
+    history.close()
+
+    rows = list(iter_json_lines(*writer.paths))
+    assert len(rows) == 2
+    assert rows[0]['request']['url'] == 'https://www.myfixtureurl.com'
+    assert rows[0]['response']['status_code'] == 200
+    assert rows[1]['response'] is None